@@ -3,8 +3,13 @@
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from typing import Dict, Optional
+import json
+import re
 from app.config import OPENAI_API_KEY
 
+# Compiled once at import; matches JSON objects with at most one level of nesting
+JSON_OBJECT_PATTERN = re.compile(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', re.DOTALL)
+
 class EnhancementAgent:
     """Enhancement agent that improves user input with more context and details"""
     
@@ -98,12 +103,8 @@ Current date and time: {current_datetime}
             
             # Try to extract JSON from response
             try:
-                import re
-                import json
-                
                 # Look for JSON in the response with better regex
-                json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-                json_matches = re.findall(json_pattern, response.content, re.DOTALL)
+                json_matches = JSON_OBJECT_PATTERN.findall(response.content)
                 
                 for json_str in json_matches:
                     try:
@@ -6,15 +6,21 @@ from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from app.tools.gmail_tool import (
     send_email_tool,
+    send_bulk_emails_tool,
+    mail_merge_tool,
     get_emails_tool,
     read_email_tool,
+    get_thread_tool,
     search_emails_tool,
     delete_email_tool,
     reply_to_email_tool,
     forward_email_tool,
     get_labels_tool,
     mark_as_read_tool,
-    mark_as_unread_tool
+    mark_as_unread_tool,
+    bulk_modify_emails_tool,
+    trash_emails_tool,
+    get_mailbox_stats_tool
 )
 from app.tools.time_tool import extract_datetime, get_current_datetime_tool
 
@@ -29,12 +35,13 @@ llm = ChatOpenAI(
 prompt = ChatPromptTemplate.from_messages([
     ("system", """You are a helpful Gmail assistant that can help users manage their emails. You have access to various Gmail tools and can:
 
-1. Send emails to recipients
+1. Send emails to recipients, or one personalized email to a whole list (mail merge)
 2. Read and search emails
 3. Reply to and forward emails
-4. Delete emails
-5. Manage email labels and read/unread status
+4. Delete emails, or move many to Trash at once
+5. Manage email labels and read/unread status, for many emails at once with the bulk tools
 6. Get email information and details
+7. Count unread and total emails per label without listing them
 
 When working with emails:
 - Always be helpful and professional
@@ -58,8 +65,11 @@ agent = create_openai_tools_agent(
     llm=llm,
     tools=[
         send_email_tool,
+        send_bulk_emails_tool,
+        mail_merge_tool,
         get_emails_tool,
         read_email_tool,
+        get_thread_tool,
         search_emails_tool,
         delete_email_tool,
         reply_to_email_tool,
@@ -67,6 +77,9 @@ agent = create_openai_tools_agent(
         get_labels_tool,
         mark_as_read_tool,
         mark_as_unread_tool,
+        bulk_modify_emails_tool,
+        trash_emails_tool,
+        get_mailbox_stats_tool,
         extract_datetime,
         get_current_datetime_tool
     ],
@@ -78,8 +91,11 @@ gmail_agent_executor = AgentExecutor(
     agent=agent,
     tools=[
         send_email_tool,
+        send_bulk_emails_tool,
+        mail_merge_tool,
         get_emails_tool,
         read_email_tool,
+        get_thread_tool,
         search_emails_tool,
         delete_email_tool,
         reply_to_email_tool,
@@ -87,6 +103,9 @@ gmail_agent_executor = AgentExecutor(
         get_labels_tool,
         mark_as_read_tool,
         mark_as_unread_tool,
+        bulk_modify_emails_tool,
+        trash_emails_tool,
+        get_mailbox_stats_tool,
         extract_datetime,
         get_current_datetime_tool
     ],
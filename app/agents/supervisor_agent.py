@@ -6,12 +6,17 @@ from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from typing import Dict, List, Optional, Tuple
 import json
+import re
 from app.agents.calendar_agent import get_calendar_agent
 from app.agents.gmail_agent import run_gmail_agent
 from app.agents.unified_agent import run_unified_agent
 from app.agents.enhancement_agent import enhance_user_input
 from app.config import OPENAI_API_KEY
 
+# Compiled once at import; these run on every routed request
+JSON_SPAN_PATTERN = re.compile(r'\{.*\}', re.DOTALL)
+JSON_OBJECT_PATTERN = re.compile(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', re.DOTALL)
+
 class SupervisorAgent:
     """Supervisor agent that intelligently routes tasks to appropriate agents"""
     
@@ -122,8 +127,7 @@ Current date and time: {current_datetime}
             # Try to extract JSON from response
             try:
                 # Look for JSON in the response
-                import re
-                json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
+                json_match = JSON_SPAN_PATTERN.search(response.content)
                 if json_match:
                     parsed = json.loads(json_match.group())
                     # Validate the selected_agent
@@ -212,9 +216,7 @@ Examples:
             response = self.llm.invoke(enhancement_prompt)
             
             # Parse JSON response
-            import re
-            json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-            json_matches = re.findall(json_pattern, response.content, re.DOTALL)
+            json_matches = JSON_OBJECT_PATTERN.findall(response.content)
             
             for json_str in json_matches:
                 try:
@@ -15,15 +15,21 @@ from app.tools.calendar_tool import (
 )
 from app.tools.gmail_tool import (
     send_email_tool,
+    send_bulk_emails_tool,
+    mail_merge_tool,
     get_emails_tool,
     read_email_tool,
+    get_thread_tool,
     search_emails_tool,
     delete_email_tool,
     reply_to_email_tool,
     forward_email_tool,
     get_labels_tool,
     mark_as_read_tool,
-    mark_as_unread_tool
+    mark_as_unread_tool,
+    bulk_modify_emails_tool,
+    trash_emails_tool,
+    get_mailbox_stats_tool
 )
 from app.tools.time_tool import extract_datetime, get_current_datetime_tool
 from app.config import OPENAI_API_KEY
@@ -50,12 +56,15 @@ prompt = ChatPromptTemplate.from_messages([
 
 ## GMAIL CAPABILITIES:
 - Send emails with subject, body, CC, and BCC
+- Send one personalized email to a list of recipients (mail merge)
 - Read and search emails using Gmail search syntax
+- Read whole conversations in one call
 - Reply to emails with automatic threading
 - Forward emails to other recipients
-- Delete emails by ID
-- Manage email labels and read/unread status
+- Delete emails by ID, or move many to Trash at once
+- Manage email labels and read/unread status, for many emails at once with the bulk tools
 - Get email information and details
+- Count unread and total emails per label without listing them
 
 ## WORKFLOW GUIDELINES:
 1. **Understand the user's intent** - Are they asking about calendar or email operations?
@@ -93,8 +102,11 @@ all_tools = [
     
     # Gmail tools
     send_email_tool,
+    send_bulk_emails_tool,
+    mail_merge_tool,
     get_emails_tool,
     read_email_tool,
+    get_thread_tool,
     search_emails_tool,
     delete_email_tool,
     reply_to_email_tool,
@@ -102,6 +114,9 @@ all_tools = [
     get_labels_tool,
     mark_as_read_tool,
     mark_as_unread_tool,
+    bulk_modify_emails_tool,
+    trash_emails_tool,
+    get_mailbox_stats_tool,
     
     # Utility tools
     extract_datetime,
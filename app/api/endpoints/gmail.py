@@ -1,69 +1,186 @@
 # app/api/endpoints/gmail.py
 
-from fastapi import APIRouter, HTTPException
+from typing import AsyncIterator, List, Optional, Union
+from urllib.parse import quote
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.schema.gmail_schema import (
     SendEmailInput, SendEmailOutput,
+    SendBulkEmailsInput, SendBulkEmailsOutput,
+    MailMergeInput, MailMergeOutput, MailMergeResult,
     GetEmailsInput, GetEmailsOutput,
     ReadEmailInput, ReadEmailOutput,
+    GetThreadInput, GetThreadOutput,
     SearchEmailsInput, SearchEmailsOutput,
     DeleteEmailInput, DeleteEmailOutput,
     ReplyToEmailInput, ReplyToEmailOutput,
     ForwardEmailInput, ForwardEmailOutput,
     GetLabelsInput, GetLabelsOutput,
+    GetMailboxStatsInput, GetMailboxStatsOutput,
     MarkAsReadInput, MarkAsReadOutput,
-    MarkAsUnreadInput, MarkAsUnreadOutput
+    MarkAsUnreadInput, MarkAsUnreadOutput,
+    BulkModifyEmailsInput, BulkModifyEmailsOutput,
+    BulkDeleteEmailsInput, BulkDeleteEmailsOutput,
+    GetAttachmentInput,
+    GetMetricsOutput,
+    GetOutboxStatusInput, GetOutboxStatusOutput,
+    EmailStreamSummary, EmailRecord
 )
 from app.services.gmail_service import (
-    send_email,
-    get_emails,
-    read_email,
-    search_emails,
-    delete_email,
-    reply_to_email,
-    forward_email,
-    get_labels,
-    mark_as_read,
-    mark_as_unread
+    asend_email,
+    asend_emails,
+    amail_merge,
+    astream_mail_merge,
+    aget_emails,
+    astream_emails,
+    aread_email,
+    aget_thread,
+    astream_attachment,
+    asearch_emails,
+    astream_search_emails,
+    adelete_email,
+    areply_to_email,
+    aforward_email,
+    aget_labels,
+    aget_mailbox_stats,
+    amark_as_read,
+    amark_as_unread,
+    abulk_modify_emails,
+    abulk_delete_emails,
+    get_metrics,
+    get_outbox_status
 )
 
 router = APIRouter(prefix="/gmail", tags=["gmail"])
 
+def with_email_models(result):
+    """A listing or read output with its EmailRecords turned into API models"""
+    if getattr(result, "emails", None):
+        result.emails = [email_detail.to_model() for email_detail in result.emails]
+    if getattr(result, "email", None):
+        result.email = result.email.to_model()
+    return result
+
+StreamItem = Union[EmailRecord, EmailStreamSummary, MailMergeResult, MailMergeOutput]
+
+def ndjson_line(item: StreamItem) -> str:
+    """One streamed line: {"email": ...} per email or {"result": ...} per recipient, {"summary": ...} last"""
+    if isinstance(item, (EmailStreamSummary, MailMergeOutput)):
+        return f'{{"summary":{item.model_dump_json()}}}\n'
+    if isinstance(item, MailMergeResult):
+        return f'{{"result":{item.model_dump_json()}}}\n'
+    return f'{{"email":{item.to_model().model_dump_json()}}}\n'
+
+async def ndjson_response(stream: AsyncIterator[StreamItem]) -> StreamingResponse:
+    """Stream as NDJSON; a stream that fails before its first item is a 400"""
+    first = await anext(stream)
+    if isinstance(first, (EmailStreamSummary, MailMergeOutput)) and not first.success:
+        raise HTTPException(status_code=400, detail=first.message)
+    
+    async def lines():
+        try:
+            yield ndjson_line(first)
+            async for item in stream:
+                yield ndjson_line(item)
+        finally:
+            await stream.aclose()
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.post("/send", response_model=SendEmailOutput)
 async def send_email_endpoint(input: SendEmailInput):
     """Send an email"""
-    result = send_email(input)
+    result = await asend_email(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     return result
 
-@router.post("/get", response_model=GetEmailsOutput)
-async def get_emails_endpoint(input: GetEmailsInput):
-    """Get emails from Gmail"""
-    result = get_emails(input)
+@router.post("/send-bulk", response_model=SendBulkEmailsOutput)
+async def send_bulk_emails_endpoint(input: SendBulkEmailsInput):
+    """Send several emails in one request"""
+    result = await asend_emails(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     return result
 
+@router.post("/mail-merge", response_model=MailMergeOutput)
+async def mail_merge_endpoint(input: MailMergeInput, stream: bool = False):
+    """Send a template to many recipients; with ?stream=true, one NDJSON line per recipient as it is sent"""
+    if stream:
+        return await ndjson_response(astream_mail_merge(input))
+    
+    result = await amail_merge(input)
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return result
+
+@router.post("/get", response_model=GetEmailsOutput)
+async def get_emails_endpoint(input: GetEmailsInput, stream: bool = False):
+    """Get emails from Gmail; with ?stream=true, as NDJSON lines while they are fetched"""
+    if stream:
+        return await ndjson_response(astream_emails(input))
+    
+    result = await aget_emails(input)
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return with_email_models(result)
+
 @router.post("/read", response_model=ReadEmailOutput)
 async def read_email_endpoint(input: ReadEmailInput):
     """Read a specific email"""
-    result = read_email(input)
+    result = await aread_email(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
-    return result
+    return with_email_models(result)
+
+@router.post("/thread", response_model=GetThreadOutput)
+async def get_thread_endpoint(input: GetThreadInput):
+    """Read a whole conversation, oldest email first"""
+    result = await aget_thread(input)
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return with_email_models(result)
+
+@router.get("/attachments/{message_id}/{attachment_id}")
+async def get_attachment_endpoint(message_id: str, attachment_id: str):
+    """Download an attachment, streamed while it is decoded (ids come from a read email's attachments)"""
+    stream = astream_attachment(GetAttachmentInput(message_id=message_id, attachment_id=attachment_id))
+    header = await anext(stream)
+    if not header.success:
+        await stream.aclose()
+        raise HTTPException(status_code=400, detail=header.message)
+    
+    # Sent as stored: most attachments are already compressed, and gzip would drop Content-Length
+    headers = {"Content-Encoding": "identity"}
+    if header.size is not None:
+        headers["Content-Length"] = str(header.size)
+    if header.filename:
+        headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(header.filename)}"
+    
+    async def chunks():
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+    
+    return StreamingResponse(chunks(), media_type=header.mime_type, headers=headers)
 
 @router.post("/search", response_model=SearchEmailsOutput)
-async def search_emails_endpoint(input: SearchEmailsInput):
-    """Search emails"""
-    result = search_emails(input)
+async def search_emails_endpoint(input: SearchEmailsInput, stream: bool = False):
+    """Search emails; with ?stream=true, as NDJSON lines while they are fetched"""
+    if stream:
+        return await ndjson_response(astream_search_emails(input))
+    
+    result = await asearch_emails(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
-    return result
+    return with_email_models(result)
 
 @router.delete("/delete", response_model=DeleteEmailOutput)
 async def delete_email_endpoint(input: DeleteEmailInput):
     """Delete an email"""
-    result = delete_email(input)
+    result = await adelete_email(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     return result
@@ -71,7 +188,7 @@ async def delete_email_endpoint(input: DeleteEmailInput):
 @router.post("/reply", response_model=ReplyToEmailOutput)
 async def reply_to_email_endpoint(input: ReplyToEmailInput):
     """Reply to an email"""
-    result = reply_to_email(input)
+    result = await areply_to_email(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     return result
@@ -79,7 +196,7 @@ async def reply_to_email_endpoint(input: ReplyToEmailInput):
 @router.post("/forward", response_model=ForwardEmailOutput)
 async def forward_email_endpoint(input: ForwardEmailInput):
     """Forward an email"""
-    result = forward_email(input)
+    result = await aforward_email(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     return result
@@ -88,7 +205,7 @@ async def forward_email_endpoint(input: ForwardEmailInput):
 async def get_labels_endpoint():
     """Get all Gmail labels"""
     input_data = GetLabelsInput()
-    result = get_labels(input_data)
+    result = await aget_labels(input_data)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     return result
@@ -96,7 +213,7 @@ async def get_labels_endpoint():
 @router.post("/mark-read", response_model=MarkAsReadOutput)
 async def mark_as_read_endpoint(input: MarkAsReadInput):
     """Mark an email as read"""
-    result = mark_as_read(input)
+    result = await amark_as_read(input)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     return result
@@ -104,7 +221,50 @@ async def mark_as_read_endpoint(input: MarkAsReadInput):
 @router.post("/mark-unread", response_model=MarkAsUnreadOutput)
 async def mark_as_unread_endpoint(input: MarkAsUnreadInput):
     """Mark an email as unread"""
-    result = mark_as_unread(input)
+    result = await amark_as_unread(input)
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return result
+
+@router.post("/bulk-modify", response_model=BulkModifyEmailsOutput)
+async def bulk_modify_emails_endpoint(input: BulkModifyEmailsInput):
+    """Add and remove labels on many emails, selected by id or by search query"""
+    result = await abulk_modify_emails(input)
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return result
+
+@router.post("/bulk-delete", response_model=BulkDeleteEmailsOutput)
+async def bulk_delete_emails_endpoint(input: BulkDeleteEmailsInput):
+    """Permanently delete many emails, selected by id or by search query"""
+    result = await abulk_delete_emails(input)
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return result
+
+@router.get("/stats", response_model=GetMailboxStatsOutput)
+async def get_mailbox_stats_endpoint(labels: List[str] = Query(["INBOX"]), max_staleness_seconds: Optional[float] = None):
+    """Unread and total counts per label, from Gmail's label counters"""
+    input_data = GetMailboxStatsInput(labels=labels, max_staleness_seconds=max_staleness_seconds)
+    result = await aget_mailbox_stats(input_data)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
-    return result 
\ No newline at end of file
+    return result
+
+# Plain def: FastAPI runs these in its threadpool, off the event loop
+
+@router.get("/metrics", response_model=GetMetricsOutput)
+def get_metrics_endpoint():
+    """Quota units used, throttling and retries of the Gmail client"""
+    result = get_metrics()
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return result
+
+@router.get("/outbox/{outbox_id}", response_model=GetOutboxStatusOutput)
+def get_outbox_status_endpoint(outbox_id: str):
+    """Delivery state of an email queued by /send, /send-bulk, /mail-merge or the send tools"""
+    result = get_outbox_status(GetOutboxStatusInput(outbox_id=outbox_id))
+    if not result.success:
+        raise HTTPException(status_code=400, detail=result.message)
+    return result
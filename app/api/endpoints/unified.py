@@ -77,15 +77,18 @@ async def get_capabilities():
         },
         "gmail_operations": {
             "send_email": "Send emails with subject, body, CC, and BCC",
+            "mail_merge": "Send one personalized email to a list of recipients",
             "get_emails": "Get recent emails with filtering",
             "read_email": "Read specific emails by ID",
+            "get_thread": "Read whole conversations in one call",
             "search_emails": "Search emails using Gmail search syntax",
             "reply_to_email": "Reply to emails with automatic threading",
             "forward_email": "Forward emails to other recipients",
             "delete_email": "Delete emails by ID",
             "mark_as_read": "Mark emails as read",
             "mark_as_unread": "Mark emails as unread",
-            "get_labels": "Get all Gmail labels"
+            "get_labels": "Get all Gmail labels",
+            "get_mailbox_stats": "Count unread and total emails per label"
         },
         "combined_workflows": {
             "calendar_to_email": "Check calendar and send email summaries",
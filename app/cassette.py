@@ -0,0 +1,399 @@
+# app/cassette.py
+
+"""
+Record/replay harness for outbound HTTP traffic.
+
+Every service talks to Google through httpx, and ChatOpenAI talks to OpenAI
+through the openai SDK, which is itself built on httpx. Patching
+``httpx.Client.send`` and ``httpx.AsyncClient.send`` therefore captures every
+LLM call and every Google API call made while handling a request.
+
+In record mode each exchange (request, response, timing) is appended to a
+gzip-compressed JSON-lines cassette. Streamed responses (attachment
+downloads) are passed through to their reader unchanged, teed a chunk at a
+time into a spool file, and written to the cassette once the stream closes. In replay mode the recorded responses are
+served back in order without touching the network, optionally sleeping for
+the recorded latency, so a slow production trace can be profiled and
+optimizations compared on identical workloads.
+
+Enable it with environment variables (see app/config.py):
+
+    CASSETTE_MODE=record CASSETTE_PATH=traces/slow.jsonl.gz uvicorn app.main:app
+    CASSETTE_MODE=replay CASSETTE_PATH=traces/slow.jsonl.gz CASSETTE_LATENCY_SCALE=1 ...
+
+or from a script:
+
+    with cassette.replaying("traces/slow.jsonl.gz"):
+        run_supervisor_agent("...")
+
+Summarize a cassette with ``python -m app.cassette traces/slow.jsonl.gz``.
+
+Calls made through googleapiclient (reschedule_event) use httplib2 and are
+not captured.
+"""
+
+import asyncio
+import atexit
+import base64
+import gzip
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import IO, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY_SCALE
+
+logger = logging.getLogger(__name__)
+
+LLM_HOSTS = ("api.openai.com",)
+MODES = ("off", "record", "replay")
+
+# Headers that describe the stored (already decoded) body or would leak credentials
+_DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+# Streamed bodies are stored as received, so they keep their Content-Encoding
+_DROPPED_STREAM_HEADERS = _DROPPED_RESPONSE_HEADERS - {"content-encoding"}
+# Streamed bodies past this are spooled to disk while they are recorded
+_SPOOL_MAX_BYTES = 1024 * 1024
+# Bytes base64 encoded at a time when a spooled body is written out (a multiple of 3)
+_ENCODE_BYTES = 3 * 256 * 1024
+
+_original_send = httpx.Client.send
+_original_async_send = httpx.AsyncClient.send
+_active: Optional["Cassette"] = None
+
+
+class CassetteMissError(RuntimeError):
+    """Raised in replay mode when a request has no recorded response left"""
+
+
+def _encode_body(content: bytes) -> Tuple[str, str]:
+    try:
+        return content.decode("utf-8"), "text"
+    except UnicodeDecodeError:
+        return base64.b64encode(content).decode("ascii"), "base64"
+
+
+def _decode_body(data: str, encoding: str) -> bytes:
+    if encoding == "base64":
+        return base64.b64decode(data)
+    return data.encode("utf-8")
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    """A recording of HTTP exchanges, either being written or being replayed"""
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._seq = 0
+        self._file = None
+        self._by_url: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+        self._by_path: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+
+        if mode == "record":
+            self._file = _open(path, "w")
+            atexit.register(self.close)
+        else:
+            for entry in load_entries(path):
+                self._by_url[(entry["method"], entry["url"])].append(entry)
+                self._by_path[(entry["method"], urlsplit(entry["url"]).path)].append(entry)
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def install(self) -> "Cassette":
+        global _active
+        if _active is not None and _active is not self:
+            raise RuntimeError("Another cassette is already installed")
+        _active = self
+        httpx.Client.send = _patched_send
+        httpx.AsyncClient.send = _patched_async_send
+        return self
+
+    def uninstall(self):
+        global _active
+        if _active is self:
+            httpx.Client.send = _original_send
+            httpx.AsyncClient.send = _original_async_send
+            _active = None
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> "Cassette":
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    # -- recording -----------------------------------------------------------
+
+    def _entry(self, request: httpx.Request, response: httpx.Response, started: float, elapsed: float,
+               dropped: set) -> dict:
+        try:
+            request_body, request_encoding = _encode_body(request.content)
+        except httpx.RequestNotRead:
+            # Streamed uploads are not kept; only their response matters for replay
+            request_body, request_encoding = "", "text"
+        return {
+            "seq": 0,
+            "kind": "llm" if request.url.host in LLM_HOSTS else "http",
+            "method": request.method,
+            "url": str(request.url),
+            "started": round(started - self._started, 6),
+            "elapsed": round(elapsed, 6),
+            "request": {
+                "content_type": request.headers.get("content-type"),
+                "body": request_body,
+                "encoding": request_encoding,
+            },
+            "response": {
+                "status": response.status_code,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() not in dropped},
+            },
+        }
+
+    def record(self, request: httpx.Request, response: httpx.Response, started: float, elapsed: float):
+        entry = self._entry(request, response, started, elapsed, _DROPPED_RESPONSE_HEADERS)
+        entry["response"]["body"], entry["response"]["encoding"] = _encode_body(response.content)
+        with self._lock:
+            if self._file is None:
+                return
+            self._seq += 1
+            entry["seq"] = self._seq
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def record_spooled(self, request: httpx.Request, response: httpx.Response, started: float, body: IO[bytes]):
+        """Record a streamed response whose raw body was teed into body, encoding it a piece at a time"""
+        entry = self._entry(request, response, started, time.perf_counter() - started, _DROPPED_STREAM_HEADERS)
+        body.seek(0)
+        with self._lock:
+            if self._file is None:
+                return
+            self._seq += 1
+            entry["seq"] = self._seq
+            # The response object is the entry's last key, so its closing braces can be reopened for the body
+            head = json.dumps(entry, separators=(",", ":"))
+            self._file.write(head[:-2] + ',"encoding":"base64","body":"')
+            for chunk in iter(lambda: body.read(_ENCODE_BYTES), b""):
+                self._file.write(base64.b64encode(chunk).decode("ascii"))
+            self._file.write('"}}\n')
+            self._file.flush()
+
+    # -- replay --------------------------------------------------------------
+
+    def next_entry(self, request: httpx.Request) -> dict:
+        """Pop the next recorded exchange for this request.
+
+        Requests are matched on method and full URL first, then on method and
+        path, in recording order. Bodies are not compared because LLM prompts
+        embed the current time and would never match exactly.
+        """
+        with self._lock:
+            entry = _pop_unserved(self._by_url.get((request.method, str(request.url))))
+            if entry is None:
+                entry = _pop_unserved(self._by_path.get((request.method, request.url.path)))
+            if entry is None:
+                raise CassetteMissError(f"No recorded response for {request.method} {request.url}")
+            return entry
+
+    def build_response(self, request: httpx.Request, entry: dict, stream: bool = False) -> httpx.Response:
+        recorded = entry["response"]
+        body = _decode_body(recorded["body"], recorded["encoding"])
+        response = httpx.Response(
+            recorded["status"],
+            headers=recorded["headers"],
+            # A streamed reader expects a body it has not read yet
+            **({"stream": httpx.ByteStream(body)} if stream else {"content": body}),
+            request=request,
+        )
+        response.elapsed = timedelta(seconds=entry["elapsed"])
+        return response
+
+    def replay_delay(self, entry: dict) -> float:
+        return entry["elapsed"] * self.latency_scale
+
+
+def _pop_unserved(queue: Optional[Deque[dict]]) -> Optional[dict]:
+    # Each entry sits in two indexes; the flag makes sure it is served only once
+    while queue:
+        entry = queue.popleft()
+        if not entry.get("_served"):
+            entry["_served"] = True
+            return entry
+    return None
+
+
+class _TeeStream(httpx.SyncByteStream):
+    """A response stream that copies each chunk into a spool file as its reader consumes it"""
+
+    def __init__(self, stream: httpx.SyncByteStream, on_close: Callable[[IO[bytes]], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._spool.write(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+            self._on_close(self._spool)
+        finally:
+            self._spool.close()
+
+
+class _AsyncTeeStream(httpx.AsyncByteStream):
+    """A response stream that copies each chunk into a spool file as its reader consumes it"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[IO[bytes]], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            self._spool.write(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+            self._on_close(self._spool)
+        finally:
+            self._spool.close()
+
+
+def _patched_send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+    cassette = _active
+    if cassette is None:
+        return _original_send(self, request, **kwargs)
+
+    if cassette.mode == "replay":
+        entry = cassette.next_entry(request)
+        delay = cassette.replay_delay(entry)
+        if delay:
+            time.sleep(delay)
+        return cassette.build_response(request, entry, stream=kwargs.get("stream", False))
+
+    started = time.perf_counter()
+    response = _original_send(self, request, **kwargs)
+    if kwargs.get("stream"):
+        response.stream = _TeeStream(response.stream,
+                                     lambda body: cassette.record_spooled(request, response, started, body))
+        return response
+    response.read()
+    cassette.record(request, response, started, time.perf_counter() - started)
+    return response
+
+
+async def _patched_async_send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+    cassette = _active
+    if cassette is None:
+        return await _original_async_send(self, request, **kwargs)
+
+    if cassette.mode == "replay":
+        entry = cassette.next_entry(request)
+        delay = cassette.replay_delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        return cassette.build_response(request, entry, stream=kwargs.get("stream", False))
+
+    started = time.perf_counter()
+    response = await _original_async_send(self, request, **kwargs)
+    if kwargs.get("stream"):
+        response.stream = _AsyncTeeStream(response.stream,
+                                          lambda body: cassette.record_spooled(request, response, started, body))
+        return response
+    await response.aread()
+    cassette.record(request, response, started, time.perf_counter() - started)
+    return response
+
+
+def load_entries(path: str) -> List[dict]:
+    """Read every exchange stored in a cassette, in recording order"""
+    with _open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recording(path: str) -> Cassette:
+    """Cassette that records every exchange to `path` while installed"""
+    return Cassette(path, "record")
+
+
+def replaying(path: str, latency_scale: float = 0.0) -> Cassette:
+    """Cassette that serves the exchanges recorded in `path`.
+
+    latency_scale: 0 replays instantly, 1 reproduces the recorded latencies.
+    """
+    return Cassette(path, "replay", latency_scale=latency_scale)
+
+
+def install_from_config() -> Optional[Cassette]:
+    """Install the cassette described by CASSETTE_MODE/CASSETTE_PATH, if any"""
+    if CASSETTE_MODE in ("", "off"):
+        return None
+    if CASSETTE_MODE not in MODES:
+        raise RuntimeError(f"Unknown CASSETTE_MODE '{CASSETTE_MODE}' (use one of: {', '.join(MODES)})")
+    if not CASSETTE_PATH:
+        raise RuntimeError("CASSETTE_PATH must be set when CASSETTE_MODE is enabled")
+    if CASSETTE_MODE == "record":
+        cassette = recording(CASSETTE_PATH)
+    else:
+        cassette = replaying(CASSETTE_PATH, latency_scale=CASSETTE_LATENCY_SCALE)
+    logger.warning("Cassette %s mode: %s", CASSETTE_MODE, CASSETTE_PATH)
+    return cassette.install()
+
+
+def summarize(path: str) -> str:
+    """Human-readable timing summary of a cassette"""
+    entries = load_entries(path)
+    if not entries:
+        return "📭 Empty cassette"
+
+    totals: Dict[str, List[float]] = defaultdict(list)
+    for entry in entries:
+        parts = urlsplit(entry["url"])
+        totals[f"{entry['kind']:<4} {entry['method']:<6} {parts.netloc}"].append(entry["elapsed"])
+
+    wall = max(e["started"] + e["elapsed"] for e in entries)
+    lines = [f"📼 {len(entries)} calls, {wall:.2f}s wall clock", ""]
+    for key, times in sorted(totals.items(), key=lambda kv: -sum(kv[1])):
+        lines.append(f"{key:<50} {len(times):>5} calls {sum(times):>8.2f}s total")
+    lines.append("")
+    lines.append("🐢 Slowest calls:")
+    for entry in sorted(entries, key=lambda e: -e["elapsed"])[:10]:
+        lines.append(f"  #{entry['seq']:<5} {entry['elapsed']:>7.3f}s {entry['method']} {entry['url'][:100]}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m app.cassette <cassette-path>")
+        sys.exit(1)
+    print(summarize(sys.argv[1]))
@@ -8,3 +8,72 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_CALENDAR_TOKEN = os.getenv("GOOGLE_CALENDAR_TOKEN")
 GOOGLE_GMAIL_TOKEN = os.getenv("GOOGLE_GMAIL_TOKEN")
+
+# Record/replay of outbound HTTP traffic (see app/cassette.py)
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()  # off | record | replay
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "")
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "0"))
+
+# Pooled Gmail HTTP client (see app/services/gmail_client.py)
+GMAIL_HTTP2 = os.getenv("GMAIL_HTTP2", "true").lower() == "true"
+GMAIL_MAX_CONNECTIONS = int(os.getenv("GMAIL_MAX_CONNECTIONS", "20"))
+GMAIL_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GMAIL_MAX_KEEPALIVE_CONNECTIONS", "10"))
+GMAIL_KEEPALIVE_EXPIRY = float(os.getenv("GMAIL_KEEPALIVE_EXPIRY", "60"))
+GMAIL_TIMEOUT = float(os.getenv("GMAIL_TIMEOUT", "30"))
+GMAIL_CONNECT_TIMEOUT = float(os.getenv("GMAIL_CONNECT_TIMEOUT", "10"))
+
+# Gmail batch endpoint for message details (see app/services/gmail_batch.py)
+GMAIL_BATCH_ENABLED = os.getenv("GMAIL_BATCH_ENABLED", "true").lower() == "true"
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+
+# In-flight detail fetches on the async read path used by the API
+GMAIL_MAX_CONCURRENCY = int(os.getenv("GMAIL_MAX_CONCURRENCY", "10"))
+
+# On-disk mailbox cache (see app/services/mail_cache.py); an empty path disables it
+MAIL_CACHE_PATH = os.getenv("MAIL_CACHE_PATH", "")
+MAIL_CACHE_MAX_MESSAGES = int(os.getenv("MAIL_CACHE_MAX_MESSAGES", "5000"))
+MAIL_CACHE_MAX_BODY_BYTES = int(os.getenv("MAIL_CACHE_MAX_BODY_BYTES", str(100 * 1024 * 1024)))
+MAIL_CACHE_MAX_STALENESS = float(os.getenv("MAIL_CACHE_MAX_STALENESS", "60"))
+
+# Seconds the sender address from users/me/profile is reused for sends
+GMAIL_PROFILE_TTL = float(os.getenv("GMAIL_PROFILE_TTL", "3600"))
+
+# Seconds the label directory from users/me/labels is used before it is reloaded in the background
+GMAIL_LABELS_TTL = float(os.getenv("GMAIL_LABELS_TTL", "300"))
+
+# Seconds the per-label message counters from users/me/labels/{id} are reused by /api/gmail/stats
+GMAIL_STATS_TTL = float(os.getenv("GMAIL_STATS_TTL", "30"))
+
+# Largest decoded email body returned, in bytes; longer bodies are cut with a marker (0 = no limit)
+MAIL_BODY_MAX_BYTES = int(os.getenv("MAIL_BODY_MAX_BYTES", str(1024 * 1024)))
+
+# Attachment downloads (see app/services/gmail_attachments.py); an empty directory disables the disk cache
+ATTACHMENT_CACHE_DIR = os.getenv("ATTACHMENT_CACHE_DIR", "")
+ATTACHMENT_CACHE_MAX_BYTES = int(os.getenv("ATTACHMENT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Background prefetch of the full messages of the first emails of a listing (see app/services/gmail_prefetch.py); 0 disables it
+GMAIL_PREFETCH_COUNT = int(os.getenv("GMAIL_PREFETCH_COUNT", "0"))
+GMAIL_PREFETCH_TTL = float(os.getenv("GMAIL_PREFETCH_TTL", "120"))
+GMAIL_PREFETCH_MAX_BYTES = int(os.getenv("GMAIL_PREFETCH_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Outgoing attachments (see app/services/gmail_upload.py): files are only read from this directory; empty disables them
+ATTACHMENT_UPLOAD_DIR = os.getenv("ATTACHMENT_UPLOAD_DIR", "")
+# Bytes per request of a resumable upload, rounded down to a multiple of 256 KiB
+GMAIL_UPLOAD_CHUNK_BYTES = int(os.getenv("GMAIL_UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+
+# Gmail per-user quota and retries (see app/services/gmail_quota.py); 0 units per second disables the limiter
+GMAIL_QUOTA_UNITS_PER_SECOND = float(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "250"))
+GMAIL_QUOTA_BURST = float(os.getenv("GMAIL_QUOTA_BURST", "250"))
+GMAIL_MAX_RETRIES = int(os.getenv("GMAIL_MAX_RETRIES", "5"))
+GMAIL_RETRY_BASE_DELAY = float(os.getenv("GMAIL_RETRY_BASE_DELAY", "0.5"))
+GMAIL_RETRY_MAX_DELAY = float(os.getenv("GMAIL_RETRY_MAX_DELAY", "32"))
+
+# API response compression; bodies smaller than GZIP_MIN_SIZE bytes, and clients that do not accept gzip, get plain JSON
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+# Outbox for send_email (see app/services/gmail_outbox.py); an empty path sends right away
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "")
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "5"))
@@ -0,0 +1,33 @@
+# app/fastjson.py
+
+"""
+JSON decoding and encoding for Google payloads and the mailbox cache.
+
+Uses orjson when it is installed (several times faster than the json module
+on message resources and batch responses) and falls back to the standard
+library otherwise. Both raise ValueError subclasses on malformed input, so
+callers handle errors the same way either way.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+if ORJSON_AVAILABLE:
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> str:
+        """Compact JSON text"""
+        return orjson.dumps(obj).decode("utf-8")
+else:
+    loads = json.loads
+
+    def dumps(obj: Any) -> str:
+        """Compact JSON text"""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
@@ -1,6 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from app import cassette
+from app.config import GZIP_LEVEL, GZIP_MIN_SIZE
 from app.api.endpoints import router as api_router
+from app.services import gmail_client, gmail_outbox, gmail_service
 
-app = FastAPI(title="Multi-Agent Supervisor System")
+cassette.install_from_config()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the pooled Gmail clients on the server loop and release them on shutdown
+    gmail_client.get_client()
+    gmail_client.get_async_client()
+    # Deliver whatever a previous run left in the outbox
+    gmail_outbox.start_workers(gmail_service.send_queued_email)
+    yield
+    gmail_outbox.stop_workers()
+    await gmail_client.aclose_clients()
+
+
+app = FastAPI(title="Multi-Agent Supervisor System", lifespan=lifespan)
+# Large listings compress several-fold; small answers are not worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
 
 app.include_router(api_router, prefix="/api")
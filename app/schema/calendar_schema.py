@@ -1,5 +1,6 @@
 # app/schema/calendar_schema.py
 
+from dataclasses import dataclass
 from pydantic import BaseModel, Field
 from typing import Optional, List, Union
 
@@ -10,6 +11,18 @@ class Event(BaseModel):
     location: Optional[str] = None
 
 
+@dataclass(slots=True)
+class EventRecord:
+    """Internal form of an Event, as get_events builds it for the tools (see EmailRecord)"""
+    title: str
+    date: str
+    time: str
+    location: Optional[str] = None
+
+    def to_model(self) -> Event:
+        return Event.model_construct(title=self.title, date=self.date, time=self.time, location=self.location)
+
+
 class ScheduleEventInput(BaseModel):
     title: str
     date: str  # Format: "YYYY-MM-DD"
@@ -38,7 +51,7 @@ class GetEventsInput(BaseModel):
 class GetEventsOutput(BaseModel):
     success: bool
     message: str
-    events: Optional[List[Event]] = None  # ✅ Fix here
+    events: Optional[List[Event]] = None  # EventRecords from get_events; to_model() converts
 
 
 
@@ -1,17 +1,75 @@
 # app/schema/gmail_schema.py
 
+from dataclasses import dataclass
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
+
+class Attachment(BaseModel):
+    attachment_id: str
+    filename: str = ""  # empty for inline parts such as embedded images
+    mime_type: str = "application/octet-stream"
+    size: int = 0
 
 class Email(BaseModel):
     id: str
+    thread_id: Optional[str] = None
     subject: str
     sender: str
     recipient: str
-    body: str
+    body: Optional[str] = None  # None in listings; fetched on read, reply and forward
+    snippet: Optional[str] = None
     date: str
+    internal_date: Optional[int] = None  # Gmail's receive time, epoch milliseconds
     labels: Optional[List[str]] = None
     has_attachments: bool = False
+    attachments: Optional[List[Attachment]] = None  # full messages only; download via /attachments
+    message_id: Optional[str] = None  # the Message-ID header
+    references: Optional[List[str]] = None  # Message-IDs this email answers (In-Reply-To and References)
+
+# Internal records
+#
+# The services, the mailbox cache and the tools pass emails around as these
+# slotted dataclasses, which cost a fraction of a validated model to build and
+# hold. Outputs carrying them are built with model_construct; the API endpoints
+# turn the records into the models above with to_model() and FastAPI validates
+# the response on its way out.
+
+@dataclass(slots=True)
+class AttachmentRecord:
+    attachment_id: str
+    filename: str = ""
+    mime_type: str = "application/octet-stream"
+    size: int = 0
+
+    def to_model(self) -> Attachment:
+        return Attachment.model_construct(attachment_id=self.attachment_id, filename=self.filename,
+                                          mime_type=self.mime_type, size=self.size)
+
+@dataclass(slots=True)
+class EmailRecord:
+    id: str
+    subject: str
+    sender: str
+    recipient: str
+    date: str
+    thread_id: Optional[str] = None
+    body: Optional[str] = None
+    snippet: Optional[str] = None
+    internal_date: Optional[int] = None
+    labels: Optional[List[str]] = None
+    has_attachments: bool = False
+    attachments: Optional[List[AttachmentRecord]] = None
+    message_id: Optional[str] = None
+    references: Optional[List[str]] = None
+
+    def to_model(self) -> Email:
+        return Email.model_construct(
+            id=self.id, thread_id=self.thread_id, subject=self.subject, sender=self.sender,
+            recipient=self.recipient, body=self.body, snippet=self.snippet, date=self.date,
+            internal_date=self.internal_date, labels=self.labels, has_attachments=self.has_attachments,
+            attachments=[a.to_model() for a in self.attachments] if self.attachments is not None else None,
+            message_id=self.message_id, references=self.references,
+        )
 
 class SendEmailInput(BaseModel):
     to: str
@@ -19,21 +77,75 @@ class SendEmailInput(BaseModel):
     body: str
     cc: Optional[str] = None
     bcc: Optional[str] = None
+    thread_id: Optional[str] = None  # Gmail thread to send into
+    in_reply_to: Optional[str] = None  # Message-ID of the email replied to
+    references: Optional[str] = None  # Message-IDs of the thread so far, oldest first
+    attachments: Optional[List[str]] = None  # files under ATTACHMENT_UPLOAD_DIR
 
 class SendEmailOutput(BaseModel):
     success: bool
     message: str
     email_id: Optional[str] = None
+    outbox_id: Optional[str] = None  # set instead of email_id when the email was queued (see /outbox/{id})
+
+class SendBulkEmailsInput(BaseModel):
+    emails: List[SendEmailInput]
+
+class SendBulkEmailsOutput(BaseModel):
+    success: bool
+    message: str
+    sent: int = 0  # sent, or queued when the outbox is on
+    failed: int = 0
+    results: Optional[List[SendEmailOutput]] = None  # one per input email, in order
+
+class MailMergeRecipient(BaseModel):
+    to: str
+    variables: Dict[str, str] = {}  # values for the template's {{name}} placeholders; {{to}} is the address
+    cc: Optional[str] = None
+    bcc: Optional[str] = None
+
+class MailMergeInput(BaseModel):
+    subject: str  # template, e.g. "Welcome, {{first_name}}"
+    body: str  # template
+    recipients: List[MailMergeRecipient]
+    attachments: Optional[List[str]] = None  # files under ATTACHMENT_UPLOAD_DIR, sent to everyone
+
+class MailMergeResult(BaseModel):
+    """Outcome for one recipient; also one line of a streamed mail merge"""
+    index: int  # position in recipients
+    to: str
+    success: bool
+    email_id: Optional[str] = None
+    outbox_id: Optional[str] = None  # set instead of email_id when the email was queued
+    error: Optional[str] = None
+
+class MailMergeOutput(BaseModel):
+    success: bool
+    message: str
+    sent: int = 0  # sent, or queued when the outbox is on
+    failed: int = 0
+    results: Optional[List[MailMergeResult]] = None  # one per recipient, in order; not set on a stream's trailer
 
 class GetEmailsInput(BaseModel):
     query: Optional[str] = None
     max_results: int = 10
-    label: Optional[str] = None
+    label: Optional[str] = None  # label name or id, e.g. "Receipts" or "Label_12"
+    cursor: Optional[str] = None  # next_cursor of the previous page
+    max_staleness_seconds: Optional[float] = None  # mailbox cache freshness bound; None uses MAIL_CACHE_MAX_STALENESS
 
 class GetEmailsOutput(BaseModel):
     success: bool
     message: str
-    emails: Optional[List[Email]] = None
+    emails: Optional[List[Email]] = None  # EmailRecords until the endpoint converts them
+    next_cursor: Optional[str] = None  # set when more emails follow
+
+class EmailStreamSummary(BaseModel):
+    """Trailer line of a streamed listing"""
+    success: bool
+    message: str
+    count: int = 0
+    next_cursor: Optional[str] = None
+    source: Optional[str] = None  # searches only: "local" index or "remote" Gmail search
 
 class ReadEmailInput(BaseModel):
     email_id: str
@@ -41,16 +153,45 @@ class ReadEmailInput(BaseModel):
 class ReadEmailOutput(BaseModel):
     success: bool
     message: str
-    email: Optional[Email] = None
+    email: Optional[Email] = None  # an EmailRecord until the endpoint converts it
+
+class GetThreadInput(BaseModel):
+    thread_id: Optional[str] = None
+    email_id: Optional[str] = None  # any email of the conversation, when the thread id is not known
+    max_staleness_seconds: Optional[float] = None  # mailbox cache freshness bound; None uses MAIL_CACHE_MAX_STALENESS
+
+class GetThreadOutput(BaseModel):
+    success: bool
+    message: str
+    thread_id: Optional[str] = None
+    emails: Optional[List[Email]] = None  # oldest first; EmailRecords until the endpoint converts them
+    source: Optional[str] = None  # "local" cache or "remote" threads.get
 
 class SearchEmailsInput(BaseModel):
     query: str
     max_results: int = 10
+    cursor: Optional[str] = None  # next_cursor of the previous page
+    max_staleness_seconds: Optional[float] = None  # mailbox cache freshness bound; None uses MAIL_CACHE_MAX_STALENESS
 
 class SearchEmailsOutput(BaseModel):
     success: bool
     message: str
-    emails: Optional[List[Email]] = None
+    emails: Optional[List[Email]] = None  # EmailRecords until the endpoint converts them
+    next_cursor: Optional[str] = None  # set when more emails follow
+    source: Optional[str] = None  # "local" index or "remote" Gmail search
+
+class GetAttachmentInput(BaseModel):
+    message_id: str
+    attachment_id: str
+
+class GetAttachmentOutput(BaseModel):
+    """Header of an attachment download; the bytes follow it in the stream"""
+    success: bool
+    message: str
+    size: Optional[int] = None  # known up front only for cached attachments
+    cached: bool = False
+    filename: Optional[str] = None  # from the message's part metadata
+    mime_type: str = "application/octet-stream"
 
 class DeleteEmailInput(BaseModel):
     email_id: str
@@ -62,6 +203,7 @@ class DeleteEmailOutput(BaseModel):
 class ReplyToEmailInput(BaseModel):
     email_id: str
     reply_body: str
+    quote_original: bool = False  # quote the original body below the reply (downloads the full message)
 
 class ReplyToEmailOutput(BaseModel):
     success: bool
@@ -85,6 +227,24 @@ class GetLabelsOutput(BaseModel):
     success: bool
     message: str
     labels: Optional[List[str]] = None
+    label_ids: Optional[Dict[str, str]] = None  # name -> id
+
+class GetMailboxStatsInput(BaseModel):
+    labels: List[str] = ["INBOX"]  # label names or ids
+    max_staleness_seconds: Optional[float] = None  # counter freshness bound; None uses GMAIL_STATS_TTL
+
+class LabelStats(BaseModel):
+    id: str
+    name: str
+    messages_total: int = 0
+    messages_unread: int = 0
+    threads_total: int = 0
+    threads_unread: int = 0
+
+class GetMailboxStatsOutput(BaseModel):
+    success: bool
+    message: str
+    labels: Optional[List[LabelStats]] = None  # in the order asked for
 
 class MarkAsReadInput(BaseModel):
     email_id: str
@@ -98,4 +258,79 @@ class MarkAsUnreadInput(BaseModel):
 
 class MarkAsUnreadOutput(BaseModel):
     success: bool
-    message: str 
\ No newline at end of file
+    message: str
+
+class BulkEmailResult(BaseModel):
+    email_id: str
+    success: bool
+    error: Optional[str] = None
+
+class BulkModifyEmailsInput(BaseModel):
+    email_ids: Optional[List[str]] = None
+    query: Optional[str] = None  # Gmail search selecting the emails when no ids are given
+    max_emails: int = 1000  # most emails a query may select
+    add_labels: List[str] = []  # label ids, e.g. ["STARRED"]
+    remove_labels: List[str] = []  # label ids, e.g. ["UNREAD"] to mark as read
+
+class BulkModifyEmailsOutput(BaseModel):
+    success: bool
+    message: str
+    succeeded: int = 0
+    failed: int = 0
+    results: Optional[List[BulkEmailResult]] = None  # one per selected email
+
+class BulkDeleteEmailsInput(BaseModel):
+    email_ids: Optional[List[str]] = None
+    query: Optional[str] = None  # Gmail search selecting the emails when no ids are given
+    max_emails: int = 1000  # most emails a query may select
+
+class BulkDeleteEmailsOutput(BaseModel):
+    success: bool
+    message: str
+    succeeded: int = 0
+    failed: int = 0
+    results: Optional[List[BulkEmailResult]] = None  # one per selected email
+
+class QuotaMetrics(BaseModel):
+    requests: int = 0  # attempts sent, retries included
+    units: int = 0  # quota units charged for them
+    retries: int = 0
+    throttled: int = 0  # 429 and rate-limit 403 answers
+    server_errors: int = 0  # 5xx answers
+    gave_up: int = 0  # failures handed back after the last retry, or not retried at all
+    wait_seconds: float = 0.0  # spent waiting on the token bucket
+    backoff_seconds: float = 0.0  # spent backing off before retries
+    available_units: float = 0.0  # negative while requests queue on the bucket
+    units_per_second: float = 0.0
+    burst_units: float = 0.0
+
+class PrefetchMetrics(BaseModel):
+    hits: int = 0  # full-message fetches served from a prefetch
+    misses: int = 0  # full-message fetches that went to Gmail
+    hit_rate: float = 0.0
+    prefetched: int = 0  # emails fetched ahead of use
+    skipped: int = 0  # emails not prefetched because the quota bucket was short
+    evicted: int = 0  # dropped unused to stay within GMAIL_PREFETCH_MAX_BYTES
+    expired: int = 0  # asked for after GMAIL_PREFETCH_TTL
+    held: int = 0
+    held_bytes: int = 0
+
+class GetMetricsOutput(BaseModel):
+    success: bool
+    message: str
+    quota: Optional[QuotaMetrics] = None
+    prefetch: Optional[PrefetchMetrics] = None  # set when GMAIL_PREFETCH_COUNT is on
+
+class GetOutboxStatusInput(BaseModel):
+    outbox_id: str
+
+class GetOutboxStatusOutput(BaseModel):
+    success: bool
+    message: str
+    outbox_id: Optional[str] = None
+    status: Optional[str] = None  # queued, sending, sent, failed, or unknown when Gmail may have sent it
+    attempts: int = 0
+    email_id: Optional[str] = None  # Gmail id once sent
+    error: Optional[str] = None  # last delivery error
+    to: Optional[str] = None
+    subject: Optional[str] = None
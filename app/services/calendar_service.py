@@ -10,8 +10,9 @@ from app.schema.calendar_schema import (
     ScheduleEventInput, ScheduleEventOutput,
     DeleteEventInput, DeleteEventOutput,
     GetEventsInput, GetEventsOutput,
-    Event, RescheduleEventInput,
+    EventRecord, RescheduleEventInput,
 )
+from app import fastjson
 from app.config import GOOGLE_CALENDAR_TOKEN
 
 
@@ -41,7 +42,7 @@ def get_events(input: GetEventsInput) -> GetEventsOutput:
     try:
         response = httpx.get(url, headers=headers, params=params)
         response.raise_for_status()
-        events_raw = response.json().get("items", [])
+        events_raw = fastjson.loads(response.content).get("items", [])
 
         if not events_raw:
             return GetEventsOutput(success=True, message="📭 No events found in the given date range.")
@@ -58,7 +59,7 @@ def get_events(input: GetEventsInput) -> GetEventsOutput:
                 continue
 
             dt = datetime.fromisoformat(start.replace("Z", "+00:00"))
-            structured_event = Event(
+            structured_event = EventRecord(
                 title=title,
                 date=dt.strftime("%Y-%m-%d"),
                 time=dt.strftime("%H:%M"),
@@ -67,7 +68,7 @@ def get_events(input: GetEventsInput) -> GetEventsOutput:
             structured_events.append(structured_event)
             message_lines.append(f"- {title} at {structured_event.time} on {structured_event.date}")
 
-        return GetEventsOutput(
+        return GetEventsOutput.model_construct(
             success=True,
             message="\n".join(message_lines),
             events=structured_events
@@ -102,7 +103,7 @@ def schedule_event(input: ScheduleEventInput) -> ScheduleEventOutput:
     try:
         response = httpx.post(url, headers=headers, json=event_payload)
         response.raise_for_status()
-        event_data = response.json()
+        event_data = fastjson.loads(response.content)
 
         return ScheduleEventOutput(
             success=True,
@@ -136,7 +137,7 @@ def delete_event(input: DeleteEventInput) -> DeleteEventOutput:
             "orderBy": "startTime"
         })
         list_response.raise_for_status()
-        events = list_response.json().get("items", [])
+        events = fastjson.loads(list_response.content).get("items", [])
 
         for event in events:
             event_title = event.get("summary", "")
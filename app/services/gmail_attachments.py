@@ -0,0 +1,194 @@
+# app/services/gmail_attachments.py
+
+"""
+Attachment downloads.
+
+``messages.attachments.get`` answers with JSON whose ``data`` field holds the
+whole attachment, base64url encoded. ``DataFieldDecoder`` picks that field out
+of the response bytes as they arrive and decodes it piece by piece, so a
+download never holds more than one network chunk at a time.
+
+With ATTACHMENT_CACHE_DIR set, finished downloads are also kept on disk, one
+file per attachment, and repeat downloads are served from a memory map of
+that file. The attachment's filename and MIME type are kept next to it, so a
+repeat needs no call to Gmail. Past ATTACHMENT_CACHE_MAX_BYTES the least
+recently used files are deleted.
+"""
+
+import binascii
+import hashlib
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from app.config import ATTACHMENT_CACHE_DIR, ATTACHMENT_CACHE_MAX_BYTES
+
+# Bytes read from Gmail or from a cached file per step
+CHUNK_BYTES = 64 * 1024
+
+_DATA_START = re.compile(rb'"data"\s*:\s*"')
+# Unmatched input kept between chunks, so a key split across two chunks is still found
+_KEY_TAIL = 64
+
+# Suffixes of files in the cache directory that are not finished attachments
+_PARTIAL_SUFFIX = ".part"
+_METADATA_SUFFIX = ".meta"
+
+
+def _decode(data: bytes) -> bytes:
+    data = data.replace(b"-", b"+").replace(b"_", b"/")
+    return binascii.a2b_base64(data + b"=" * (-len(data) % 4))
+
+
+class DataFieldDecoder:
+    """Incremental decoder for the base64url ``data`` field of a JSON response"""
+
+    def __init__(self):
+        self._pending = b""
+        self._in_data = False
+        self.done = False
+        self.size = 0
+
+    def feed(self, chunk: bytes) -> bytes:
+        """Decoded bytes that became available with this chunk (possibly none)"""
+        if self.done:
+            return b""
+        if not self._in_data:
+            buffer = self._pending + chunk
+            match = _DATA_START.search(buffer)
+            if match is None:
+                self._pending = buffer[-_KEY_TAIL:]
+                return b""
+            self._in_data = True
+            self._pending = b""
+            chunk = buffer[match.end():]
+
+        # base64url has no characters that need JSON escaping, so the next quote ends the field
+        end = chunk.find(b'"')
+        if end >= 0:
+            chunk = chunk[:end]
+            self.done = True
+        data = self._pending + chunk
+        # Decode whole 4-character groups only; the rest waits for the next chunk
+        cut = len(data) if self.done else len(data) - len(data) % 4
+        self._pending = data[cut:]
+        decoded = _decode(data[:cut]) if cut else b""
+        self.size += len(decoded)
+        return decoded
+
+    def close(self):
+        if not self.done:
+            raise ValueError("response ended before the attachment data did")
+
+
+def read_chunks(path: str, chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """A file's contents in chunks, read through a memory map"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, size, chunk_bytes):
+                yield mapped[start:start + chunk_bytes]
+
+
+class AttachmentCache:
+    def __init__(self, directory: str, max_bytes: int = ATTACHMENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, message_id: str, attachment_id: str) -> str:
+        # Attachment ids are long and not filename-safe; hash them into a fixed-length name
+        key = hashlib.sha256(f"{message_id}/{attachment_id}".encode()).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def get(self, message_id: str, attachment_id: str) -> Optional[str]:
+        """Path of the cached attachment, or None; a hit counts as a use for eviction"""
+        path = self.path(message_id, attachment_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def metadata(self, message_id: str, attachment_id: str) -> Optional[dict]:
+        """Filename and MIME type stored with a cached attachment, or None"""
+        try:
+            with open(self.path(message_id, attachment_id) + _METADATA_SUFFIX, "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def begin(self) -> Tuple[BinaryIO, str]:
+        """A temporary file to write a download to, and its path"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=_PARTIAL_SUFFIX)
+        return os.fdopen(fd, "wb"), temp_path
+
+    def commit(self, f: BinaryIO, temp_path: str, message_id: str, attachment_id: str,
+               metadata: Optional[dict] = None):
+        """Make a finished download visible under its attachment's name"""
+        f.close()
+        path = self.path(message_id, attachment_id)
+        if metadata is not None:
+            with open(path + _METADATA_SUFFIX, "w", encoding="utf-8") as meta:
+                json.dump(metadata, meta)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def discard(self, f: BinaryIO, temp_path: str):
+        """Drop an unfinished download"""
+        f.close()
+        os.unlink(temp_path)
+
+    @contextmanager
+    def writer(self, message_id: str, attachment_id: str, metadata: Optional[dict] = None) -> Iterator[BinaryIO]:
+        """File to write a download to; it only becomes visible if the block completes"""
+        f, temp_path = self.begin()
+        try:
+            yield f
+        except BaseException:
+            self.discard(f, temp_path)
+            raise
+        self.commit(f, temp_path, message_id, attachment_id, metadata)
+
+    def evict(self):
+        """Delete least recently used files until the cache fits max_bytes"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith((_PARTIAL_SUFFIX, _METADATA_SUFFIX)):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for stale in (path, path + _METADATA_SUFFIX):
+                    try:
+                        os.unlink(stale)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+
+_cache: Optional[AttachmentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_attachment_cache() -> Optional[AttachmentCache]:
+    """The process-wide attachment cache, or None when ATTACHMENT_CACHE_DIR is not set"""
+    global _cache
+    if not ATTACHMENT_CACHE_DIR:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AttachmentCache(ATTACHMENT_CACHE_DIR)
+    return _cache
@@ -0,0 +1,122 @@
+# app/services/gmail_batch.py
+
+"""
+Gmail batch requests (https://developers.google.com/gmail/api/guides/batch).
+
+Up to MAX_BATCH_SIZE API calls are packed into one ``multipart/mixed`` POST to
+the batch endpoint, and the multipart response is split back into one JSON
+document per call. Each inner call carries its own status, so a failure is
+reported per message instead of failing the whole batch.
+"""
+
+import uuid
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from app import fastjson
+from app.services.gmail_client import GMAIL_API_BASE, get_client
+
+GMAIL_BATCH_URL = "https://gmail.googleapis.com/batch/gmail/v1"
+
+# Hard limit of the batch endpoint; Gmail recommends staying at 50 or below
+MAX_BATCH_SIZE = 100
+
+_API_PATH = urlsplit(GMAIL_API_BASE).path
+
+
+def build_batch_body(paths: List[str], boundary: str) -> bytes:
+    """Encode GET requests for the given API paths as a multipart/mixed body"""
+    lines = []
+    for index, path in enumerate(paths):
+        lines.extend([
+            f"--{boundary}",
+            "Content-Type: application/http",
+            f"Content-ID: <item-{index}>",
+            "",
+            f"GET {path}",
+            "",
+        ])
+    lines.append(f"--{boundary}--")
+    return "\r\n".join(lines).encode("utf-8")
+
+
+def _boundary_from(content_type: str) -> str:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            return value.strip('"')
+    raise ValueError(f"No boundary in batch response content type: {content_type}")
+
+
+def parse_batch_response(content: bytes, content_type: str) -> Dict[int, Tuple[int, Optional[dict]]]:
+    """Split a batch response into {request index: (status, JSON body)}"""
+    delimiter = b"--" + _boundary_from(content_type).encode("ascii")
+    results: Dict[int, Tuple[int, Optional[dict]]] = {}
+
+    for part in content.split(delimiter):
+        part = part.strip(b"\r\n")
+        if not part or part == b"--":
+            continue
+
+        # Outer MIME headers, then the embedded HTTP response
+        outer_headers, _, http_response = part.partition(b"\r\n\r\n")
+        index = None
+        for line in outer_headers.split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-id":
+                # Google answers <item-N> with <response-item-N>
+                index = int(value.strip().strip(b"<>").rsplit(b"-", 1)[-1])
+        if index is None:
+            continue
+
+        head, _, body = http_response.partition(b"\r\n\r\n")
+        status_line = head.split(b"\r\n", 1)[0]
+        status = int(status_line.split()[1])
+        body = body.strip()
+        try:
+            data = fastjson.loads(body) if body else None
+        except ValueError:
+            data = None
+        results[index] = (status, data)
+
+    return results
+
+
+def get_messages(email_ids: List[str], headers: dict, params: Optional[dict] = None) -> Tuple[Dict[str, dict], Dict[str, int]]:
+    """Fetch up to MAX_BATCH_SIZE messages in a single round-trip.
+
+    Returns the message resources by id and the HTTP status of every id that
+    failed (ids missing from the response are reported with status 0).
+    """
+    query = f"?{urlencode(params, doseq=True)}" if params else ""
+    return _get_resources([f"messages/{email_id}{query}" for email_id in email_ids], email_ids, headers)
+
+
+def get_labels(label_ids: List[str], headers: dict) -> Tuple[Dict[str, dict], Dict[str, int]]:
+    """Fetch up to MAX_BATCH_SIZE label resources (with their counters) in a single round-trip"""
+    return _get_resources([f"labels/{label_id}" for label_id in label_ids], label_ids, headers)
+
+
+def _get_resources(paths: List[str], ids: List[str], headers: dict) -> Tuple[Dict[str, dict], Dict[str, int]]:
+    """GET one resource per id, relative to the users/me API path; (resources by id, failed statuses by id)"""
+    if len(paths) > MAX_BATCH_SIZE:
+        raise ValueError(f"A Gmail batch holds at most {MAX_BATCH_SIZE} requests")
+
+    boundary = f"batch_{uuid.uuid4().hex}"
+    batch_headers = {k: v for k, v in headers.items() if k.lower() != "content-type"}
+    batch_headers["Content-Type"] = f"multipart/mixed; boundary={boundary}"
+
+    body = build_batch_body([f"{_API_PATH}/{path}" for path in paths], boundary)
+    response = get_client().post(GMAIL_BATCH_URL, headers=batch_headers, content=body)
+    response.raise_for_status()
+    parsed = parse_batch_response(response.content, response.headers.get("content-type", ""))
+
+    resources: Dict[str, dict] = {}
+    failures: Dict[str, int] = {}
+    for index, resource_id in enumerate(ids):
+        status, data = parsed.get(index, (0, None))
+        if status == 200 and data is not None:
+            resources[resource_id] = data
+        else:
+            failures[resource_id] = status
+    return resources, failures
@@ -0,0 +1,122 @@
+# app/services/gmail_client.py
+
+"""
+Process-wide pooled HTTP clients for the Gmail API.
+
+Module-level ``httpx.get``/``httpx.post`` build a throwaway client per call,
+so every request paid for a new TCP+TLS handshake with gmail.googleapis.com.
+The clients here are created once, keep connections alive between calls and
+multiplex over HTTP/2 when the ``h2`` package is installed.
+
+The FastAPI app opens them on startup and closes them on shutdown (see
+app/main.py); scripts and agents get them lazily on first use.
+
+Network traffic goes through the quota layer in gmail_quota (rate limiting
+and retries). Transports installed with ``use_transport`` are used as given.
+"""
+
+import threading
+from typing import Optional
+
+import httpx
+
+from app.config import (
+    GMAIL_HTTP2,
+    GMAIL_MAX_CONNECTIONS,
+    GMAIL_MAX_KEEPALIVE_CONNECTIONS,
+    GMAIL_KEEPALIVE_EXPIRY,
+    GMAIL_TIMEOUT,
+    GMAIL_CONNECT_TIMEOUT,
+)
+from app.services.gmail_quota import AsyncQuotaTransport, QuotaTransport
+
+GMAIL_API_BASE = "https://gmail.googleapis.com/gmail/v1/users/me"
+GMAIL_UPLOAD_BASE = "https://gmail.googleapis.com/upload/gmail/v1/users/me"
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.BaseTransport] = None
+_async_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def _transport_options() -> dict:
+    # Pool settings belong to the transport: a client given its own transport ignores them
+    return {
+        "http2": GMAIL_HTTP2 and HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=GMAIL_MAX_CONNECTIONS,
+            max_keepalive_connections=GMAIL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=GMAIL_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+def _client_options() -> dict:
+    return {"timeout": httpx.Timeout(GMAIL_TIMEOUT, connect=GMAIL_CONNECT_TIMEOUT)}
+
+
+def get_client() -> httpx.Client:
+    """Shared synchronous client, created on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        with _lock:
+            if _client is None or _client.is_closed:
+                transport = _transport or QuotaTransport(httpx.HTTPTransport(**_transport_options()))
+                _client = httpx.Client(transport=transport, **_client_options())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared asynchronous client, created on first use.
+
+    The client is bound to the event loop it first runs on; the app creates it
+    during startup so it lives on the server loop.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        with _lock:
+            if _async_client is None or _async_client.is_closed:
+                transport = _async_transport or AsyncQuotaTransport(httpx.AsyncHTTPTransport(**_transport_options()))
+                _async_client = httpx.AsyncClient(transport=transport, **_client_options())
+    return _async_client
+
+
+def close_client():
+    """Close the synchronous client and drop its pooled connections"""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+async def aclose_clients():
+    """Close both clients; used on application shutdown"""
+    global _async_client
+    with _lock:
+        async_client, _async_client = _async_client, None
+    if async_client is not None:
+        await async_client.aclose()
+    close_client()
+
+
+def use_transport(transport: Optional[httpx.BaseTransport] = None,
+                  async_transport: Optional[httpx.AsyncBaseTransport] = None):
+    """Route the shared clients through the given transports (e.g. a local fake).
+
+    Existing clients are discarded; pass no arguments to go back to the network.
+    """
+    global _transport, _async_transport, _client, _async_client
+    with _lock:
+        _transport, _async_transport = transport, async_transport
+        client, _client = _client, None
+        _async_client = None
+    if client is not None:
+        client.close()
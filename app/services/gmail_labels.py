@@ -0,0 +1,196 @@
+# app/services/gmail_labels.py
+
+"""
+Label directory cache.
+
+Gmail filters by label id ("Label_12"), while people and the agent speak of
+label names ("Receipts"). The account's labels are loaded from
+``users/me/labels`` once per access token and kept for GMAIL_LABELS_TTL
+seconds. An expired directory is still served while a background thread
+reloads it, so only the very first lookup waits on Gmail. A name that is not
+in the directory triggers one early reload, in case the label was just
+created. A 401/403 drops the entry.
+
+The message and thread counters of single labels (``users/me/labels/{id}``)
+are cached separately for GMAIL_STATS_TTL seconds, since they change with
+every new or read email. Changes made through this service drop them early.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from app import fastjson
+from app.config import GMAIL_LABELS_TTL
+from app.services.gmail_client import GMAIL_API_BASE, get_client, get_async_client
+from app.services.gmail_profile import AUTH_ERROR_STATUSES
+
+# A lookup miss reloads the directory at most this often, in seconds
+MISS_RELOAD_INTERVAL = 30.0
+
+# Label names quoted in an unknown-label error
+_SUGGESTED_NAMES = 30
+
+
+class LabelDirectory:
+    """An account's labels, by id and by case-insensitive name"""
+
+    __slots__ = ("names", "_ids", "loaded_at")
+
+    def __init__(self, labels: List[dict]):
+        self.names: Dict[str, str] = {label["id"]: label.get("name", label["id"]) for label in labels}  # id -> name
+        self._ids = {name.lower(): label_id for label_id, name in self.names.items()}
+        self.loaded_at = time.monotonic()
+
+    def resolve(self, label: str) -> Optional[str]:
+        """The id of a label given by id or by name; None when there is no such label"""
+        if label in self.names:
+            return label
+        return self._ids.get(label.strip().lower())
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+_directories: Dict[str, LabelDirectory] = {}  # Authorization header -> directory
+_counts: Dict[Tuple[str, str], Tuple[float, dict]] = {}  # (Authorization header, label id) -> (fetched at, label resource)
+_reloading: set = set()
+_lock = threading.Lock()
+
+
+def _key(headers: dict) -> str:
+    return headers.get("Authorization", "")
+
+
+def _store(headers: dict, response: httpx.Response) -> LabelDirectory:
+    if response.status_code in AUTH_ERROR_STATUSES:
+        invalidate_labels(headers)
+    response.raise_for_status()
+
+    directory = LabelDirectory(fastjson.loads(response.content).get("labels", []))
+    with _lock:
+        _directories[_key(headers)] = directory
+    return directory
+
+
+def load_labels(headers: dict) -> LabelDirectory:
+    """Fetch the account's labels from Gmail and cache them"""
+    return _store(headers, get_client().get(f"{GMAIL_API_BASE}/labels", headers=headers))
+
+
+async def aload_labels(headers: dict) -> LabelDirectory:
+    """Fetch the account's labels from Gmail and cache them"""
+    return _store(headers, await get_async_client().get(f"{GMAIL_API_BASE}/labels", headers=headers))
+
+
+def _reload_in_background(headers: dict):
+    key = _key(headers)
+    with _lock:
+        if key in _reloading:
+            return
+        _reloading.add(key)
+
+    def reload():
+        try:
+            load_labels(headers)
+        except Exception as e:
+            print(f"Error reloading labels: {str(e)}")
+        finally:
+            with _lock:
+                _reloading.discard(key)
+
+    threading.Thread(target=reload, name="gmail-labels-reload", daemon=True).start()
+
+
+def _cached(headers: dict) -> Optional[LabelDirectory]:
+    directory = _directories.get(_key(headers))
+    if directory is not None and directory.age() > GMAIL_LABELS_TTL:
+        _reload_in_background(headers)
+    return directory
+
+
+def get_labels_directory(headers: dict) -> LabelDirectory:
+    """The account's label directory, loaded from Gmail on first use"""
+    return _cached(headers) or load_labels(headers)
+
+
+async def aget_labels_directory(headers: dict) -> LabelDirectory:
+    """The account's label directory, loaded from Gmail on first use"""
+    return _cached(headers) or await aload_labels(headers)
+
+
+def _unknown_label(label: str, directory: LabelDirectory) -> ValueError:
+    names = sorted(directory.names.values(), key=str.lower)
+    shown = ", ".join(names[:_SUGGESTED_NAMES]) + (", …" if len(names) > _SUGGESTED_NAMES else "")
+    return ValueError(f"Unknown label '{label}' (labels: {shown})")
+
+
+def resolve_label(headers: dict, label: Optional[str]) -> Optional[str]:
+    """The id of a label given by id or name; raises ValueError for a label the account does not have"""
+    if not label:
+        return label
+    directory = get_labels_directory(headers)
+    label_id = directory.resolve(label)
+    if label_id is None and directory.age() > MISS_RELOAD_INTERVAL:
+        directory = load_labels(headers)
+        label_id = directory.resolve(label)
+    if label_id is None:
+        raise _unknown_label(label, directory)
+    return label_id
+
+
+async def aresolve_label(headers: dict, label: Optional[str]) -> Optional[str]:
+    """The id of a label given by id or name; raises ValueError for a label the account does not have"""
+    if not label:
+        return label
+    directory = await aget_labels_directory(headers)
+    label_id = directory.resolve(label)
+    if label_id is None and directory.age() > MISS_RELOAD_INTERVAL:
+        directory = await aload_labels(headers)
+        label_id = directory.resolve(label)
+    if label_id is None:
+        raise _unknown_label(label, directory)
+    return label_id
+
+
+def cached_counts(headers: dict, label_ids: Iterable[str], max_age: float) -> Dict[str, dict]:
+    """Label resources (with their counters) fetched at most max_age seconds ago, by label id"""
+    key = _key(headers)
+    now = time.monotonic()
+    found = {}
+    for label_id in label_ids:
+        entry = _counts.get((key, label_id))
+        if entry is not None and now - entry[0] <= max_age:
+            found[label_id] = entry[1]
+    return found
+
+
+def store_counts(headers: dict, resources: Dict[str, dict]):
+    key = _key(headers)
+    now = time.monotonic()
+    with _lock:
+        for label_id, resource in resources.items():
+            _counts[(key, label_id)] = (now, resource)
+
+
+def invalidate_label_counts(headers: Optional[dict] = None):
+    """Forget the label counters for these headers' token, after mail was changed, or every counter"""
+    with _lock:
+        if headers is None:
+            _counts.clear()
+        else:
+            key = _key(headers)
+            for entry in [entry for entry in _counts if entry[0] == key]:
+                del _counts[entry]
+
+
+def invalidate_labels(headers: Optional[dict] = None):
+    """Forget the label directory and counters for these headers' token, or all of them"""
+    with _lock:
+        if headers is None:
+            _directories.clear()
+        else:
+            _directories.pop(_key(headers), None)
+    invalidate_label_counts(headers)
@@ -0,0 +1,208 @@
+# app/services/gmail_mime.py
+
+"""
+Body extraction from Gmail message payloads.
+
+The payload tree is walked iteratively, so nesting depth does not matter. The
+first readable text/plain part wins, and the first text/html part (tags
+stripped) is the fallback. Parts are decoded in fixed-size chunks straight
+into one preallocated buffer, and decoding stops at max_bytes. A huge body
+therefore costs at most max_bytes plus one chunk, never its full size.
+"""
+
+import binascii
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional, Tuple
+
+# base64 characters per decode step; a multiple of 4 so chunks decode on their own
+DECODE_CHUNK = 64 * 1024
+
+TRUNCATION_MARKER = "\n\n[… message truncated after {limit} bytes]"
+_TRUNCATED = re.compile(re.escape(TRUNCATION_MARKER).replace(r"\{limit\}", r"\d+") + r"\Z")
+
+TEXT_TYPES = frozenset({"text/plain", "text/html"})
+
+
+def _standard(chunk: str) -> str:
+    # str.replace runs at memcpy speed; str.translate maps one character at a time
+    return chunk.replace("-", "+").replace("_", "/")
+
+
+def decoded_size(data: str) -> int:
+    """Bytes a base64 string decodes to"""
+    # Count padding by hand: rstrip would copy the whole string
+    padding = 2 if data.endswith("==") else 1 if data.endswith("=") else 0
+    return (len(data) - padding) * 3 // 4
+
+
+def decode_base64url(data: str, max_bytes: Optional[int] = None) -> Tuple[memoryview, bool]:
+    """Decode base64url data, at most max_bytes of it.
+
+    Returns a view of the decoded bytes and whether the data was cut short.
+    """
+    total = decoded_size(data)
+    limit = total if max_bytes is None else min(total, max_bytes)
+    # Only decode as many characters as the kept bytes need (4 chars -> 3 bytes)
+    needed = min(len(data), -(-limit // 3) * 4)
+
+    if needed <= DECODE_CHUNK:
+        # Typical bodies fit one chunk: decode once, no staging buffer
+        chunk = _standard(data[:needed])
+        decoded = binascii.a2b_base64(chunk + "=" * (-len(chunk) % 4))
+        return memoryview(decoded)[:limit], limit < total
+
+    buffer = bytearray(limit)
+    view = memoryview(buffer)
+    written = 0
+    for start in range(0, needed, DECODE_CHUNK):
+        chunk = _standard(data[start:start + DECODE_CHUNK])
+        if len(chunk) % 4:
+            chunk += "=" * (-len(chunk) % 4)
+        decoded = binascii.a2b_base64(chunk)
+        take = min(len(decoded), limit - written)
+        view[written:written + take] = decoded[:take]
+        written += take
+        if written >= limit:
+            break
+
+    return view[:written], limit < total
+
+
+def _header(part: dict, name: str) -> str:
+    name = name.lower()
+    return next((h.get("value", "") for h in part.get("headers", []) if h.get("name", "").lower() == name), "")
+
+
+def _charset(part: dict) -> str:
+    for param in _header(part, "Content-Type").split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset" and value:
+            return value.strip('"')
+    return "utf-8"
+
+
+def _is_attachment(part: dict) -> bool:
+    return bool(part.get("filename")) or _header(part, "Content-Disposition").lower().startswith("attachment")
+
+
+def walk_parts(payload: dict) -> Iterator[dict]:
+    """Every part of a payload, depth first in document order, without recursion"""
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        yield part
+        stack.extend(reversed(part.get("parts") or []))
+
+
+def attachment_parts(payload: dict) -> Iterator[dict]:
+    """Parts whose data Gmail keeps separately, to be fetched by attachmentId"""
+    return (part for part in walk_parts(payload) if part.get("body", {}).get("attachmentId"))
+
+
+def find_text_parts(payload: dict) -> Tuple[Optional[dict], Optional[dict]]:
+    """The first inline text/plain and text/html parts that carry data"""
+    plain = html = None
+    # Same order as walk_parts, inlined with one iterator per level: this runs
+    # for every message read, and most parts are skipped on their mimeType
+    stack = [iter((payload,))]
+    while stack and plain is None:
+        for part in stack[-1]:
+            # Gmail reports mimeType lowercased, so one lookup rejects most leaves
+            mime_type = part.get("mimeType")
+            if mime_type not in TEXT_TYPES:
+                if part.get("parts"):
+                    stack.append(iter(part["parts"]))
+                    break
+                if mime_type is not None:
+                    continue
+                mime_type = "text/plain"
+            if not part.get("body", {}).get("data") or _is_attachment(part):
+                continue
+            if mime_type == "text/plain":
+                plain = part
+                break
+            if html is None:
+                html = part
+        else:
+            stack.pop()
+    return plain, html
+
+
+def decode_part(part: dict, max_bytes: Optional[int] = None) -> Tuple[str, bool]:
+    """Text of a part in its declared charset, and whether it was cut short"""
+    data, truncated = decode_base64url(part["body"]["data"], max_bytes)
+    charset = _charset(part)
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        charset = "utf-8"
+    if not truncated:
+        return str(data, charset, "replace"), False
+    # A cut can split a multi-byte character; leave its head undecoded
+    return codecs.getincrementaldecoder(charset)(errors="replace").decode(data, final=False), True
+
+
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "head", "title"}
+    BLOCK = {"p", "div", "br", "li", "tr", "table", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6", "hr"}
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[str] = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag in self.BLOCK:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in self.BLOCK:
+            self.chunks.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.chunks.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Readable text of an HTML body: tags, scripts and styles removed, whitespace tidied"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+
+    lines = (" ".join(line.split()) for line in "".join(parser.chunks).splitlines())
+    text, blank = [], False
+    for line in lines:
+        if line:
+            text.append(line)
+            blank = False
+        elif not blank and text:
+            text.append("")
+            blank = True
+    return "\n".join(text).strip()
+
+
+def extract_body(payload: dict, max_bytes: Optional[int] = None) -> Optional[str]:
+    """Best readable text of a payload, or None if it has none"""
+    plain, html = find_text_parts(payload)
+    part = plain or html
+    if part is None:
+        return None
+
+    text, truncated = decode_part(part, max_bytes)
+    if part is html:
+        text = html_to_text(text)
+    if truncated:
+        text += TRUNCATION_MARKER.format(limit=max_bytes)
+    return text
+
+
+def is_truncated(text: str) -> bool:
+    """Whether extract_body cut this text short"""
+    return _TRUNCATED.search(text) is not None
@@ -0,0 +1,264 @@
+# app/services/gmail_outbox.py
+
+"""
+Outbox for send_email: a durable queue with background delivery.
+
+With OUTBOX_PATH set, send_email writes the email to a SQLite queue and
+returns its outbox id right away, so the agent does not wait on Gmail (or on
+the sender lookup). OUTBOX_WORKERS threads deliver queued emails oldest first
+through the shared client, drawing on the same quota bucket as every other
+call (see gmail_quota). The state of every email is served by
+/api/gmail/outbox/{id}.
+
+A delivery that never reached Gmail (a 429, or a connection that could not be
+opened) is retried with exponential backoff up to OUTBOX_MAX_ATTEMPTS times.
+One Gmail refused outright (any other 4xx) is failed. After a 5xx, a timeout
+waiting for the answer or a dropped connection, Gmail may have sent the email
+anyway, and messages.send has no idempotency key, so the email is marked
+unknown rather than sent a second time. So are emails that were being
+delivered when the process stopped.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+import httpx
+
+from app.config import OUTBOX_PATH, OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY
+from app.schema.gmail_schema import SendEmailInput
+from app.services.gmail_quota import RETRY_STATUSES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    gmail_id TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox(status, next_attempt);
+"""
+
+QUEUED, SENDING, SENT, FAILED, UNKNOWN = "queued", "sending", "sent", "failed", "unknown"
+
+# Longest a worker sleeps before looking at the queue again
+_IDLE_WAIT = 1.0
+
+
+class Outbox:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            # Deliveries cut short by a restart may have reached Gmail
+            conn.execute("UPDATE outbox SET status = ?, error = ?, updated = ? WHERE status = ?",
+                         (UNKNOWN, "Interrupted by a restart while being sent", time.time(), SENDING))
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; the default synchronous mode makes every enqueue durable
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, email: SendEmailInput) -> str:
+        """Store an email for delivery; returns its outbox id"""
+        outbox_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO outbox (id, email, status, next_attempt, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (outbox_id, email.model_dump_json(exclude_none=True), QUEUED, now, now, now),
+            )
+        return outbox_id
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        """Take the oldest email that is due, marking it as being sent; None when nothing is due"""
+        now = time.time()
+        with self._connection() as conn:
+            # A single statement, so two workers (or two processes) never claim the same email
+            return conn.execute(
+                """
+                UPDATE outbox SET status = ?, attempts = attempts + 1, updated = ?
+                WHERE id = (SELECT id FROM outbox WHERE status = ? AND next_attempt <= ?
+                            ORDER BY next_attempt, rowid LIMIT 1)
+                RETURNING id, email, attempts
+                """,
+                (SENDING, now, QUEUED, now),
+            ).fetchone()
+
+    def mark_sent(self, outbox_id: str, gmail_id: Optional[str]):
+        self._update(outbox_id, status=SENT, gmail_id=gmail_id, error=None)
+
+    def mark_failed(self, outbox_id: str, error: str):
+        self._update(outbox_id, status=FAILED, error=error)
+
+    def mark_unknown(self, outbox_id: str, error: str):
+        self._update(outbox_id, status=UNKNOWN, error=error)
+
+    def retry_later(self, outbox_id: str, error: str, delay: float):
+        self._update(outbox_id, status=QUEUED, error=error, next_attempt=time.time() + delay)
+
+    def _update(self, outbox_id: str, **values):
+        values["updated"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._connection() as conn:
+            conn.execute(f"UPDATE outbox SET {assignments} WHERE id = ?", (*values.values(), outbox_id))
+
+    def get(self, outbox_id: str) -> Optional[sqlite3.Row]:
+        return self._connection().execute("SELECT * FROM outbox WHERE id = ?", (outbox_id,)).fetchone()
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the next queued email is due (0 if one is due now), None when the queue is empty"""
+        row = self._connection().execute(
+            "SELECT MIN(next_attempt) AS due FROM outbox WHERE status = ?", (QUEUED,)
+        ).fetchone()
+        return max(0.0, row["due"] - time.time()) if row["due"] is not None else None
+
+    def counts(self) -> dict:
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status")
+        return dict.fromkeys((QUEUED, SENDING, SENT, FAILED, UNKNOWN), 0) | {row["status"]: row["n"] for row in rows}
+
+
+# Transport errors raised before the request left, so Gmail never saw it
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class SendFailed(Exception):
+    """Raised by deliver, from the error of the messages.send request itself.
+
+    Only these failures can have reached Gmail; anything else deliver raises
+    (a failed sender lookup, say) happened before the email was sent.
+    """
+
+
+def is_permanent(error: Exception) -> bool:
+    """Whether Gmail refused the email itself, or the email is unusable, so sending it again cannot help"""
+    if isinstance(error, ValueError):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code not in RETRY_STATUSES
+
+
+def may_have_sent(error: Exception) -> bool:
+    """Whether Gmail may have accepted the email despite the error: a 5xx, or a request lost after it went out"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError) and not isinstance(error, _NOT_SENT_ERRORS)
+
+
+class OutboxWorkers:
+    """Threads delivering queued emails with deliver, which returns the Gmail id or raises (SendFailed once it sent)"""
+
+    def __init__(self, outbox: Outbox, deliver: Callable[[SendEmailInput], Optional[str]],
+                 workers: int = OUTBOX_WORKERS, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 retry_delay: float = OUTBOX_RETRY_DELAY):
+        self.outbox = outbox
+        self.deliver = deliver
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"gmail-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Let in-flight deliveries finish; queued emails stay queued for the next start"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def notify(self):
+        """Wake the workers after an enqueue"""
+        self._wake.set()
+
+    def run_once(self) -> bool:
+        """Deliver the next due email, if any; returns whether there was one"""
+        row = self.outbox.claim()
+        if row is None:
+            return False
+
+        try:
+            gmail_id = self.deliver(SendEmailInput.model_validate_json(row["email"]))
+        except Exception as e:
+            error = str(e)
+            cause = e.__cause__ if isinstance(e, SendFailed) and e.__cause__ is not None else e
+            if isinstance(e, SendFailed) and may_have_sent(cause):
+                self.outbox.mark_unknown(row["id"], error)
+            elif row["attempts"] >= self.max_attempts or is_permanent(cause):
+                self.outbox.mark_failed(row["id"], error)
+            else:
+                self.outbox.retry_later(row["id"], error, self.retry_delay * 2 ** (row["attempts"] - 1))
+        else:
+            self.outbox.mark_sent(row["id"], gmail_id)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+                due = self.outbox.next_due()
+            except Exception as e:
+                print(f"Outbox worker error: {str(e)}")
+                due = None
+            self._wake.wait(_IDLE_WAIT if due is None else min(due, _IDLE_WAIT))
+            self._wake.clear()
+
+
+_outbox: Optional[Outbox] = None
+_workers: Optional[OutboxWorkers] = None
+_lock = threading.Lock()
+
+
+def get_outbox() -> Optional[Outbox]:
+    """The process-wide outbox, or None when OUTBOX_PATH is not set"""
+    global _outbox
+    if not OUTBOX_PATH:
+        return None
+    if _outbox is None:
+        with _lock:
+            if _outbox is None:
+                _outbox = Outbox(OUTBOX_PATH)
+    return _outbox
+
+
+def start_workers(deliver: Callable[[SendEmailInput], Optional[str]]) -> Optional[OutboxWorkers]:
+    """The outbox's delivery threads, started on first use; None when OUTBOX_PATH is not set"""
+    global _workers
+    outbox = get_outbox()
+    if outbox is None:
+        return None
+    if _workers is None:
+        with _lock:
+            if _workers is None:
+                workers = OutboxWorkers(outbox, deliver)
+                workers.start()
+                _workers = workers
+    return _workers
+
+
+def stop_workers():
+    global _workers
+    with _lock:
+        workers, _workers = _workers, None
+    if workers is not None:
+        workers.stop()
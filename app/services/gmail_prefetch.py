@@ -0,0 +1,173 @@
+# app/services/gmail_prefetch.py
+
+"""
+Prefetch of listed emails.
+
+After a listing, the next step is usually ``read``, ``reply`` or ``forward``
+on one of the emails just listed, and each of those starts by fetching the
+full message. With GMAIL_PREFETCH_COUNT set, the first emails of every
+listing are fetched in the background (one batch request) as soon as the
+listing is answered, and kept per access token for GMAIL_PREFETCH_TTL
+seconds. A later full fetch of one of them (``get_email_details``) is served
+from memory, or waits for the prefetch under way instead of asking Gmail a
+second time. A served entry is dropped; the mailbox cache keeps it from then
+on when it is enabled.
+
+Prefetches only use spare capacity: they are skipped while the shared quota
+bucket could not pay for them at once, so they never hold up a request
+someone is waiting on. Bodies past GMAIL_PREFETCH_MAX_BYTES are evicted,
+oldest first, and a change made through this service drops the token's
+entries, since their labels may no longer be right.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import GMAIL_PREFETCH_COUNT, GMAIL_PREFETCH_MAX_BYTES, GMAIL_PREFETCH_TTL, GMAIL_TIMEOUT
+from app.schema.gmail_schema import EmailRecord
+from app.services.gmail_quota import BATCH_PART_COST, default_bucket
+
+# Prefetches running at once; later ones wait their turn
+_WORKERS = 2
+
+
+def _key(headers: dict) -> str:
+    return headers.get("Authorization", "")
+
+
+def _idle(count: int) -> bool:
+    """Whether the quota bucket can pay for count message fetches without anyone waiting"""
+    return default_bucket.rate <= 0 or default_bucket.available() >= count * BATCH_PART_COST
+
+
+class Prefetcher:
+    """Full messages fetched ahead of use, per access token"""
+
+    def __init__(self, count: int = GMAIL_PREFETCH_COUNT, max_bytes: int = GMAIL_PREFETCH_MAX_BYTES,
+                 ttl: float = GMAIL_PREFETCH_TTL, workers: int = _WORKERS):
+        self.count = count  # emails prefetched from the top of each listing
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # (token, email id) -> (fetched at, body bytes, email), oldest first
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, int, EmailRecord]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._generations: Dict[str, int] = {}  # token -> number of times its entries were dropped
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gmail-prefetch")
+        self.counts = {"hits": 0, "misses": 0, "prefetched": 0, "skipped": 0, "evicted": 0, "expired": 0}
+
+    def schedule(self, headers: dict, email_ids: List[str],
+                 fetch: Callable[[List[str]], List[EmailRecord]]) -> Optional[Future]:
+        """Fetch these emails in the background, except those held or under way; nothing while quota is short"""
+        key = _key(headers)
+        with self._lock:
+            ids = [email_id for email_id in dict.fromkeys(email_ids)
+                   if (key, email_id) not in self._entries and (key, email_id) not in self._pending]
+            if not ids:
+                return None
+            if not _idle(len(ids)):
+                self.counts["skipped"] += len(ids)
+                return None
+            future = self._executor.submit(self._run, key, ids, fetch, self._generations.get(key, 0))
+            for email_id in ids:
+                self._pending[(key, email_id)] = future
+        return future
+
+    def _run(self, key: str, ids: List[str], fetch: Callable[[List[str]], List[EmailRecord]], generation: int):
+        emails = []
+        try:
+            emails = fetch(ids)
+        except Exception as e:
+            print(f"Error prefetching emails: {str(e)}")
+
+        with self._lock:
+            for email_id in ids:
+                self._pending.pop((key, email_id), None)
+            if self._generations.get(key, 0) != generation:
+                return  # changed while the fetch was under way
+            now = time.monotonic()
+            for email in emails:
+                size = len(email.body.encode("utf-8")) if email.body is not None else 0
+                self._entries[(key, email.id)] = (now, size, email)
+                self._bytes += size
+            self.counts["prefetched"] += len(emails)
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.counts["evicted"] += 1
+
+    def _take(self, key: Tuple[str, str]) -> Optional[EmailRecord]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+                if time.monotonic() - entry[0] > self.ttl:
+                    self.counts["expired"] += 1
+                    entry = None
+            self.counts["hits" if entry is not None else "misses"] += 1
+        return entry[2] if entry is not None else None
+
+    def get(self, headers: dict, email_id: str) -> Optional[EmailRecord]:
+        """A prefetched full message, waiting for its prefetch if one is under way; None on a miss"""
+        key = (_key(headers), email_id)
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            wait([future], timeout=GMAIL_TIMEOUT)
+        return self._take(key)
+
+    async def aget(self, headers: dict, email_id: str) -> Optional[EmailRecord]:
+        """A prefetched full message, waiting for its prefetch if one is under way; None on a miss"""
+        key = (_key(headers), email_id)
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            await asyncio.wait([asyncio.wrap_future(future)], timeout=GMAIL_TIMEOUT)
+        return self._take(key)
+
+    def forget(self, headers: dict):
+        """Drop a token's entries, and the results of its prefetches under way"""
+        key = _key(headers)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            for entry in [entry for entry in self._entries if entry[0] == key]:
+                self._bytes -= self._entries.pop(entry)[1]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            lookups = self.counts["hits"] + self.counts["misses"]
+            return dict(
+                self.counts,
+                hit_rate=round(self.counts["hits"] / lookups, 3) if lookups else 0.0,
+                held=sum(1 for fetched_at, _, _ in self._entries.values() if now - fetched_at <= self.ttl),
+                held_bytes=self._bytes,
+            )
+
+
+_prefetcher: Optional[Prefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Optional[Prefetcher]:
+    """The process-wide prefetcher, or None when GMAIL_PREFETCH_COUNT is 0"""
+    global _prefetcher
+    if GMAIL_PREFETCH_COUNT <= 0:
+        return None
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher(count=GMAIL_PREFETCH_COUNT)
+    return _prefetcher
+
+
+def forget_prefetched(headers: dict):
+    """Drop the prefetched emails of these headers' token, after mail was changed"""
+    prefetcher = get_prefetcher()
+    if prefetcher is not None:
+        prefetcher.forget(headers)
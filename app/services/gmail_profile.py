@@ -0,0 +1,79 @@
+# app/services/gmail_profile.py
+
+"""
+Sender profile cache.
+
+Sending needs the account's address, which only ``users/me/profile`` knows.
+It is fetched once per access token and kept for GMAIL_PROFILE_TTL seconds;
+a 401/403 from Gmail drops the entry, since the token behind it is no longer
+good.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app import fastjson
+from app.config import GMAIL_PROFILE_TTL
+from app.services.gmail_client import GMAIL_API_BASE, get_client, get_async_client
+
+# Statuses that mean the token (and so the cached profile) is no longer valid
+AUTH_ERROR_STATUSES = {401, 403}
+
+_profiles: Dict[str, Tuple[float, str]] = {}  # Authorization header -> (expires at, address)
+_lock = threading.Lock()
+
+
+def _key(headers: dict) -> str:
+    return headers.get("Authorization", "")
+
+
+def _cached(headers: dict) -> Optional[str]:
+    entry = _profiles.get(_key(headers))
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _store(headers: dict, response: httpx.Response) -> Optional[str]:
+    check_auth(response, headers)
+    response.raise_for_status()
+
+    sender_email = fastjson.loads(response.content).get("emailAddress")
+    if sender_email:
+        with _lock:
+            _profiles[_key(headers)] = (time.monotonic() + GMAIL_PROFILE_TTL, sender_email)
+    return sender_email
+
+
+def get_sender_email(headers: dict) -> Optional[str]:
+    """The account's email address, from the cache or users/me/profile"""
+    sender_email = _cached(headers)
+    if sender_email:
+        return sender_email
+    return _store(headers, get_client().get(f"{GMAIL_API_BASE}/profile", headers=headers))
+
+
+async def aget_sender_email(headers: dict) -> Optional[str]:
+    """The account's email address, from the cache or users/me/profile"""
+    sender_email = _cached(headers)
+    if sender_email:
+        return sender_email
+    return _store(headers, await get_async_client().get(f"{GMAIL_API_BASE}/profile", headers=headers))
+
+
+def check_auth(response: httpx.Response, headers: dict):
+    """Drop the cached profile when Gmail rejects the token"""
+    if response.status_code in AUTH_ERROR_STATUSES:
+        invalidate_profile(headers)
+
+
+def invalidate_profile(headers: Optional[dict] = None):
+    """Forget the profile for these headers' token, or every profile"""
+    with _lock:
+        if headers is None:
+            _profiles.clear()
+        else:
+            _profiles.pop(_key(headers), None)
@@ -0,0 +1,292 @@
+# app/services/gmail_quota.py
+
+"""
+Gmail per-user quota and retries, as an httpx transport layer.
+
+Gmail charges every call in quota units (a send costs 100, a messages.get 5)
+and allows about 250 units per second per user. ``QuotaTransport`` and
+``AsyncQuotaTransport`` sit under the pooled clients and:
+
+- take each request's cost from a token bucket shared by every thread and
+  task, waiting when it runs dry. Reservations are made in arrival order and
+  the bucket may go into debt, so waiters are served first come, first served.
+- retry 429s, rate-limit 403s and 5xx responses with jittered exponential
+  backoff, honouring ``Retry-After``. A rate-limit answer pauses the whole
+  bucket, since the quota is shared. Sends are retried only when Gmail
+  refused them outright, so a retry can never deliver a message twice.
+- count requests, units, waits and retries for /api/gmail/metrics.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+from app import fastjson
+from app.config import (
+    GMAIL_QUOTA_UNITS_PER_SECOND, GMAIL_QUOTA_BURST, GMAIL_MAX_RETRIES, GMAIL_RETRY_BASE_DELAY, GMAIL_RETRY_MAX_DELAY
+)
+
+# Units per call (https://developers.google.com/gmail/api/reference/quota); first match wins
+QUOTA_COSTS = [
+    ("POST", re.compile(r"/messages/send$"), 100),
+    ("POST", re.compile(r"/drafts/send$"), 100),
+    ("PUT", re.compile(r"^/upload/.*/messages/send$"), 0),  # resumable upload chunks; the send was charged when it started
+    ("POST", re.compile(r"/messages/(batchModify|batchDelete)$"), 50),
+    ("POST", re.compile(r"/messages(/import)?$"), 25),
+    ("POST", re.compile(r"/drafts$"), 10),
+    ("DELETE", re.compile(r"/messages/[^/]+$"), 10),
+    ("GET", re.compile(r"/threads(/[^/]+)?$"), 10),
+    ("POST", re.compile(r"/threads/[^/]+/modify$"), 10),
+    ("GET", re.compile(r"/history$"), 2),
+    ("GET", re.compile(r"/(profile|labels(/[^/]+)?)$"), 1),
+]
+DEFAULT_COST = 5  # messages.get/list/modify, attachments.get and the rest
+BATCH_PART_COST = 5  # each request inside a batch is charged on its own
+
+# POSTs that must not be repeated once Gmail may have acted on them (send, import, insert)
+NON_IDEMPOTENT = re.compile(r"/(messages|drafts)/send$|/messages(/import)?$")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def request_cost(request: httpx.Request) -> int:
+    """Quota units Gmail charges for a request"""
+    path = request.url.path
+    if path.startswith("/batch/"):
+        return BATCH_PART_COST * max(1, request.content.count(b"Content-ID:"))
+    for method, pattern, cost in QUOTA_COSTS:
+        if request.method == method and pattern.search(path):
+            return cost
+    return DEFAULT_COST
+
+
+class TokenBucket:
+    """Quota units refilling at rate per second, up to burst"""
+
+    def __init__(self, rate: float = GMAIL_QUOTA_UNITS_PER_SECOND, burst: float = GMAIL_QUOTA_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, cost: float) -> float:
+        """Take cost units now; returns how long to wait before using them"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Going into debt books this request behind everyone already waiting
+            self._tokens -= cost
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float):
+        """Hold back every request for a while, after Gmail said the quota is spent"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class QuotaStats:
+    FIELDS = ("requests", "units", "retries", "throttled", "server_errors", "gave_up")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(self.FIELDS, 0)
+            self.wait_seconds = 0.0
+            self.backoff_seconds = 0.0
+
+    def add(self, wait: float = 0.0, backoff: float = 0.0, **counts: int):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+            self.wait_seconds += wait
+            self.backoff_seconds += backoff
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts, wait_seconds=round(self.wait_seconds, 3),
+                        backoff_seconds=round(self.backoff_seconds, 3))
+
+
+def _is_non_idempotent(request: httpx.Request) -> bool:
+    return request.method == "POST" and NON_IDEMPOTENT.search(request.url.path) is not None
+
+
+def _is_rate_limited(response: httpx.Response) -> bool:
+    if response.status_code == 429:
+        return True
+    if response.status_code != 403:
+        return False
+    try:
+        errors = fastjson.loads(response.content).get("error", {}).get("errors", [])
+    except ValueError:
+        return False
+    return any(e.get("reason") in RATE_LIMIT_REASONS for e in errors)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After"""
+    if retry_after is not None:
+        # A little jitter on top keeps clients told the same instant from returning together
+        return retry_after + random.uniform(0, GMAIL_RETRY_BASE_DELAY)
+    return random.uniform(0, min(GMAIL_RETRY_MAX_DELAY, GMAIL_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+class _QuotaPolicy:
+    """What the sync and async transports share: costs, the bucket and retry decisions"""
+
+    def __init__(self, bucket: Optional[TokenBucket], stats: Optional[QuotaStats], max_retries: Optional[int]):
+        self.bucket = bucket if bucket is not None else default_bucket
+        self.stats = stats if stats is not None else default_stats
+        self.max_retries = GMAIL_MAX_RETRIES if max_retries is None else max_retries
+
+    def admit(self, request: httpx.Request) -> float:
+        cost = request_cost(request)
+        wait = self.bucket.reserve(cost)
+        self.stats.add(wait=wait, requests=1, units=cost)
+        return wait
+
+    def retry_delay(self, request: httpx.Request, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None to hand the response back"""
+        rate_limited = _is_rate_limited(response)
+        server_error = response.status_code in RETRY_STATUSES and not rate_limited
+        if not rate_limited and not server_error:
+            return None
+        self.stats.add(throttled=int(rate_limited), server_errors=int(server_error))
+        # A 5xx send may already have gone out; only a refusal is safe to repeat
+        if attempt >= self.max_retries or (server_error and _is_non_idempotent(request)):
+            self.stats.add(gave_up=1)
+            return None
+
+        delay = backoff_delay(attempt, _retry_after(response))
+        if rate_limited:
+            self.bucket.pause(delay)
+        self.stats.add(backoff=delay, retries=1)
+        return delay
+
+    def error_delay(self, request: httpx.Request, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after a connection error, or None to raise it"""
+        if attempt >= self.max_retries or _is_non_idempotent(request):
+            self.stats.add(gave_up=1)
+            return None
+        delay = backoff_delay(attempt)
+        self.stats.add(backoff=delay, retries=1)
+        return delay
+
+
+class QuotaTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.BaseTransport, bucket: Optional[TokenBucket] = None,
+                 stats: Optional[QuotaStats] = None, max_retries: Optional[int] = None):
+        self.transport = transport
+        self.policy = _QuotaPolicy(bucket, stats, max_retries)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            wait = self.policy.admit(request)
+            if wait:
+                time.sleep(wait)
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                delay = self.policy.error_delay(request, attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code < 403:
+                    return response
+                response.read()
+                delay = self.policy.retry_delay(request, response, attempt)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncQuotaTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, bucket: Optional[TokenBucket] = None,
+                 stats: Optional[QuotaStats] = None, max_retries: Optional[int] = None):
+        self.transport = transport
+        self.policy = _QuotaPolicy(bucket, stats, max_retries)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            wait = self.policy.admit(request)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError:
+                delay = self.policy.error_delay(request, attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code < 403:
+                    return response
+                await response.aread()
+                delay = self.policy.retry_delay(request, response, attempt)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# One bucket for the process: the sync and async clients draw on the same user quota
+default_bucket = TokenBucket()
+default_stats = QuotaStats()
+
+
+def get_quota_stats() -> dict:
+    """Counters of the pooled clients' quota layer, plus the bucket's current state"""
+    return dict(
+        default_stats.snapshot(),
+        available_units=round(default_bucket.available(), 1),
+        units_per_second=default_bucket.rate,
+        burst_units=default_bucket.burst,
+    )
@@ -1,26 +1,88 @@
 # app/services/gmail_service.py
 
+import asyncio
 import base64
 import email
+import hashlib
+import json
+import os
+import re
+import time
+import weakref
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, List
-import httpx
+from typing import AsyncIterator, Awaitable, Dict, Iterator, Optional, List, Tuple, TypeVar, Union
 from datetime import datetime
 from app.schema.gmail_schema import (
     SendEmailInput, SendEmailOutput,
+    SendBulkEmailsInput, SendBulkEmailsOutput,
+    MailMergeInput, MailMergeOutput, MailMergeResult,
     GetEmailsInput, GetEmailsOutput,
     ReadEmailInput, ReadEmailOutput,
+    GetThreadInput, GetThreadOutput,
     SearchEmailsInput, SearchEmailsOutput,
     DeleteEmailInput, DeleteEmailOutput,
     ReplyToEmailInput, ReplyToEmailOutput,
     ForwardEmailInput, ForwardEmailOutput,
     GetLabelsInput, GetLabelsOutput,
+    GetMailboxStatsInput, GetMailboxStatsOutput, LabelStats,
     MarkAsReadInput, MarkAsReadOutput,
     MarkAsUnreadInput, MarkAsUnreadOutput,
-    Email
+    BulkModifyEmailsInput, BulkModifyEmailsOutput,
+    BulkDeleteEmailsInput, BulkDeleteEmailsOutput,
+    BulkEmailResult,
+    GetAttachmentInput, GetAttachmentOutput,
+    GetMetricsOutput, QuotaMetrics, PrefetchMetrics,
+    GetOutboxStatusInput, GetOutboxStatusOutput,
+    EmailStreamSummary,
+    AttachmentRecord, EmailRecord
+)
+from app.config import (
+    GOOGLE_GMAIL_TOKEN, GMAIL_BATCH_ENABLED, GMAIL_BATCH_SIZE, GMAIL_MAX_CONCURRENCY, MAIL_CACHE_MAX_STALENESS,
+    MAIL_BODY_MAX_BYTES, GMAIL_STATS_TTL
+)
+from app import fastjson
+from app.services import gmail_batch, gmail_mime, gmail_upload, mail_index
+from app.services.gmail_attachments import (
+    CHUNK_BYTES, AttachmentCache, DataFieldDecoder, get_attachment_cache, read_chunks
 )
-from app.config import GOOGLE_GMAIL_TOKEN
+from app.services.gmail_client import GMAIL_API_BASE, get_client, get_async_client
+from app.services.gmail_labels import (
+    get_labels_directory, aget_labels_directory, resolve_label, aresolve_label, cached_counts, store_counts, invalidate_label_counts
+)
+from app.services.gmail_outbox import SendFailed, get_outbox, start_workers
+from app.services.gmail_prefetch import forget_prefetched, get_prefetcher
+from app.services.gmail_quota import get_quota_stats
+from app.services.gmail_profile import get_sender_email, aget_sender_email, check_auth
+from app.services.mail_cache import MailCache, get_mail_cache
+
+# Statuses worth retrying on their own after failing inside a batch
+RETRYABLE_STATUSES = {0, 429, 500, 502, 503, 504}
+
+# Listings only show subject, sender and date: request headers, not bodies (the
+# threading headers let the mailbox cache rebuild conversations)
+LISTING_PARAMS = {
+    "format": "metadata",
+    "metadataHeaders": ["Subject", "From", "To", "Date", "Message-ID", "References", "In-Reply-To"],
+    "fields": "id,threadId,labelIds,snippet,internalDate,payload(mimeType,headers)",
+}
+
+# What a reply needs from the original: its headers only, so the body is never downloaded
+REPLY_PARAMS = {
+    "format": "metadata",
+    "metadataHeaders": ["Subject", "From", "Reply-To", "Date", "Message-ID", "References"],
+    "fields": "id,threadId,payload(headers)",
+}
+
+# Only the thread id, to look up the conversation of an email the cache does not know
+THREAD_ID_PARAMS = {"format": "minimal", "fields": "threadId"}
+# Full messages asked for explicitly, so the fetch bypasses the prefetched ones
+FULL_PARAMS = {"format": "full"}
+
+# Largest page messages.list and history.list hand out
+LIST_PAGE_SIZE = 500
 
 def get_gmail_service():
     """Get Gmail API service instance"""
@@ -30,8 +92,9 @@ def get_gmail_service():
     }
     return headers
 
-def create_message(sender: str, to: str, subject: str, body: str, cc: Optional[str] = None, bcc: Optional[str] = None) -> str:
-    """Create a message for an email"""
+def mime_message(sender: str, to: str, subject: str, body: str, cc: Optional[str] = None, bcc: Optional[str] = None,
+                 in_reply_to: Optional[str] = None, references: Optional[str] = None) -> MIMEMultipart:
+    """Build the MIME message for an email"""
     message = MIMEMultipart()
     message['to'] = to
     message['from'] = sender
@@ -41,145 +104,530 @@ def create_message(sender: str, to: str, subject: str, body: str, cc: Optional[s
         message['cc'] = cc
     if bcc:
         message['bcc'] = bcc
+    if in_reply_to:
+        message['In-Reply-To'] = in_reply_to
+    if references:
+        message['References'] = references
     
     msg = MIMEText(body)
     message.attach(msg)
     
+    return message
+
+def create_message(sender: str, to: str, subject: str, body: str, cc: Optional[str] = None, bcc: Optional[str] = None,
+                   in_reply_to: Optional[str] = None, references: Optional[str] = None) -> str:
+    """Create a message for an email"""
+    message = mime_message(sender, to, subject, body, cc, bcc, in_reply_to, references)
     return base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
 
+def build_send_payload(sender_email: str, input: SendEmailInput) -> dict:
+    """Create the messages.send request body for an email"""
+    raw_message = create_message(
+        sender=sender_email,
+        to=input.to,
+        subject=input.subject,
+        body=input.body,
+        cc=input.cc,
+        bcc=input.bcc,
+        in_reply_to=input.in_reply_to,
+        references=input.references
+    )
+    
+    payload = {"raw": raw_message}
+    if input.thread_id:
+        payload["threadId"] = input.thread_id
+    return payload
+
+def uses_upload(input: SendEmailInput) -> bool:
+    """Whether an email is spooled to a file and sent by gmail_upload rather than as a JSON raw field"""
+    return bool(input.attachments) or len(input.body) > gmail_upload.SIMPLE_UPLOAD_MAX_BYTES
+
+def post_email(sender_email: str, input: SendEmailInput, headers: dict) -> Optional[str]:
+    """messages.send for an email; returns the Gmail id and raises on failure"""
+    if uses_upload(input):
+        message = mime_message(sender_email, input.to, input.subject, input.body, input.cc, input.bcc,
+                               input.in_reply_to, input.references)
+        return gmail_upload.send_message(message, input.attachments or [], headers, input.thread_id)
+    
+    url = f"{GMAIL_API_BASE}/messages/send"
+    
+    payload = build_send_payload(sender_email, input)
+    response = get_client().post(url, headers=headers, json=payload)
+    check_auth(response, headers)
+    response.raise_for_status()
+    
+    return fastjson.loads(response.content).get("id")
+
+def deliver_email(sender_email: str, input: SendEmailInput, headers: dict) -> SendEmailOutput:
+    """Send an email once the sender address is known"""
+    try:
+        email_id = post_email(sender_email, input, headers)
+        return SendEmailOutput(
+            success=True,
+            message=f"✅ Email sent successfully to {input.to}",
+            email_id=email_id
+        )
+        
+    except Exception as e:
+        return SendEmailOutput(success=False, message=f"❌ Error sending email: {str(e)}")
+
 def send_email(input: SendEmailInput) -> SendEmailOutput:
-    """Send an email using Gmail API"""
+    """Send an email using Gmail API, or queue it in the outbox when OUTBOX_PATH is set"""
     try:
-        headers = get_gmail_service()
-        url = "https://gmail.googleapis.com/gmail/v1/users/me/messages/send"
+        if get_outbox() is not None:
+            return queue_email(input)
+        
+        return send_email_now(input)
         
-        # Get user's email address
-        user_info_url = "https://gmail.googleapis.com/gmail/v1/users/me/profile"
-        user_response = httpx.get(user_info_url, headers=headers)
-        user_response.raise_for_status()
-        sender_email = user_response.json().get("emailAddress")
+    except Exception as e:
+        return SendEmailOutput(success=False, message=f"❌ Error sending email: {str(e)}")
+
+def send_email_now(input: SendEmailInput) -> SendEmailOutput:
+    """Send an email and wait for Gmail to accept it"""
+    try:
+        headers = get_gmail_service()
         
+        # Get user's email address (cached per token)
+        sender_email = get_sender_email(headers)
         if not sender_email:
             return SendEmailOutput(success=False, message="❌ Could not retrieve sender email address")
         
-        # Create message
-        raw_message = create_message(
-            sender=sender_email,
-            to=input.to,
-            subject=input.subject,
-            body=input.body,
-            cc=input.cc,
-            bcc=input.bcc
-        )
+        return deliver_email(sender_email, input, headers)
         
-        payload = {"raw": raw_message}
-        response = httpx.post(url, headers=headers, json=payload)
-        response.raise_for_status()
+    except Exception as e:
+        return SendEmailOutput(success=False, message=f"❌ Error sending email: {str(e)}")
+
+def queue_email(input: SendEmailInput) -> SendEmailOutput:
+    """Store an email in the outbox and wake the delivery workers"""
+    for path in input.attachments or []:
+        gmail_upload.attachment_path(path)
+    outbox_id = get_outbox().enqueue(input)
+    start_workers(send_queued_email).notify()
+    return SendEmailOutput(
+        success=True,
+        message=f"📤 Email to {input.to} queued for delivery (outbox id: {outbox_id})",
+        outbox_id=outbox_id
+    )
+
+def send_queued_email(input: SendEmailInput) -> Optional[str]:
+    """Deliver an email from the outbox; errors propagate so the outbox can decide on a retry.
+    
+    Everything that can fail before messages.send (attachments, the sender
+    lookup) runs first, so only the send's own errors are raised as SendFailed.
+    """
+    headers = get_gmail_service()
+    for path in input.attachments or []:
+        gmail_upload.attachment_path(path)
+    sender_email = get_sender_email(headers)
+    if not sender_email:
+        raise RuntimeError("Could not retrieve sender email address")
+    try:
+        return post_email(sender_email, input, headers)
+    except Exception as e:
+        raise SendFailed(str(e)) from e
+
+def get_outbox_status(input: GetOutboxStatusInput) -> GetOutboxStatusOutput:
+    """Delivery state of an email queued in the outbox"""
+    try:
+        outbox = get_outbox()
+        if outbox is None:
+            return GetOutboxStatusOutput(success=False, message="❌ The outbox is not enabled (set OUTBOX_PATH)")
         
-        email_id = response.json().get("id")
-        return SendEmailOutput(
+        row = outbox.get(input.outbox_id)
+        if row is None:
+            return GetOutboxStatusOutput(success=False, message=f"❌ No queued email with id {input.outbox_id}")
+        
+        email = SendEmailInput.model_validate_json(row["email"])
+        icons = {"queued": "⏳", "sending": "📤", "sent": "✅", "failed": "❌"}
+        if row["status"] == "unknown":
+            message = f"❓ Email to {email.to} may or may not have been sent; check Sent before sending it again"
+        else:
+            message = f"{icons.get(row['status'], '📤')} Email to {email.to} is {row['status']} after {row['attempts']} attempts"
+        return GetOutboxStatusOutput(
             success=True,
-            message=f"✅ Email sent successfully to {input.to}",
-            email_id=email_id
+            message=message,
+            outbox_id=row["id"],
+            status=row["status"],
+            attempts=row["attempts"],
+            email_id=row["gmail_id"],
+            error=row["error"],
+            to=email.to,
+            subject=email.subject
         )
         
     except Exception as e:
-        return SendEmailOutput(success=False, message=f"❌ Error sending email: {str(e)}")
+        return GetOutboxStatusOutput(success=False, message=f"❌ Error reading outbox: {str(e)}")
 
-def get_emails(input: GetEmailsInput) -> GetEmailsOutput:
-    """Get emails from Gmail"""
+def bulk_send_output(results: List[SendEmailOutput], queued: bool = False) -> SendBulkEmailsOutput:
+    """Summarize the per-email results of a bulk send"""
+    sent = sum(1 for r in results if r.success)
+    failed = len(results) - sent
+    message = f"{'📤 Queued' if queued else '✅ Sent'} {sent} of {len(results)} emails"
+    if failed:
+        message += f" ({failed} failed)"
+    
+    return SendBulkEmailsOutput(success=True, message=message, sent=sent, failed=failed, results=results)
+
+def send_emails(input: SendBulkEmailsInput) -> SendBulkEmailsOutput:
+    """Send several emails, resolving the sender address once for the whole batch (or queue them in the outbox)"""
     try:
+        if get_outbox() is not None:
+            # send_email queues each one, reporting a bad attachment as a failure
+            return bulk_send_output([send_email(email_input) for email_input in input.emails], queued=True)
+        
         headers = get_gmail_service()
-        url = "https://gmail.googleapis.com/gmail/v1/users/me/messages"
+        sender_email = get_sender_email(headers)
+        if not sender_email:
+            return SendBulkEmailsOutput(success=False, message="❌ Could not retrieve sender email address")
         
-        params = {
-            "maxResults": input.max_results
-        }
+        return bulk_send_output([deliver_email(sender_email, email_input, headers) for email_input in input.emails])
+        
+    except Exception as e:
+        return SendBulkEmailsOutput(success=False, message=f"❌ Error sending emails: {str(e)}")
+
+# Mail merge
+#
+# One template rendered locally for every recipient. The rendered emails go
+# out like a bulk send: the sender address is looked up once, at most
+# GMAIL_MAX_CONCURRENCY sends are in flight and each is paced by the shared
+# quota bucket. A recipient missing a variable fails on its own and is not sent.
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+def compile_template(template: str) -> List[str]:
+    """A template split into literal text (even positions) and variable names (odd positions)"""
+    return _PLACEHOLDER.split(template)
+
+def render_template(parts: List[str], variables: Dict[str, str]) -> str:
+    """Fill in a compiled template; raises ValueError naming a missing variable"""
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            out.append(part)
+        elif part in variables:
+            out.append(variables[part])
+        else:
+            raise ValueError(f"Missing variable '{part}'")
+    return "".join(out)
+
+def merge_emails(input: MailMergeInput) -> List[Union[SendEmailInput, ValueError]]:
+    """Each recipient's rendered email, or the error that kept it from rendering"""
+    subject, body = compile_template(input.subject), compile_template(input.body)
+    emails = []
+    for recipient in input.recipients:
+        variables = {"to": recipient.to, **recipient.variables}
+        try:
+            emails.append(SendEmailInput(
+                to=recipient.to,
+                subject=render_template(subject, variables),
+                body=render_template(body, variables),
+                cc=recipient.cc,
+                bcc=recipient.bcc,
+                attachments=input.attachments
+            ))
+        except ValueError as e:
+            emails.append(e)
+    return emails
+
+def merge_result(index: int, to: str, result: Union[SendEmailOutput, ValueError]) -> MailMergeResult:
+    """One recipient's outcome from its send (or queue) result, or its rendering error"""
+    if isinstance(result, ValueError):
+        return MailMergeResult(index=index, to=to, success=False, error=str(result))
+    return MailMergeResult(
+        index=index,
+        to=to,
+        success=result.success,
+        email_id=result.email_id,
+        outbox_id=result.outbox_id,
+        error=None if result.success else result.message
+    )
+
+def mail_merge_output(results: List[MailMergeResult], queued: bool = False,
+                      include_results: bool = True) -> MailMergeOutput:
+    """Summarize the per-recipient results of a mail merge"""
+    sent = sum(1 for r in results if r.success)
+    failed = len(results) - sent
+    message = f"{'📤 Queued' if queued else '✅ Sent'} {sent} of {len(results)} emails"
+    if failed:
+        message += f" ({failed} failed)"
+    
+    return MailMergeOutput(
+        success=True,
+        message=message,
+        sent=sent,
+        failed=failed,
+        results=sorted(results, key=lambda r: r.index) if include_results else None
+    )
+
+def mail_merge(input: MailMergeInput) -> MailMergeOutput:
+    """Render a template for every recipient and send the emails concurrently (or queue them in the outbox)"""
+    try:
+        if not input.recipients:
+            return MailMergeOutput(success=False, message="❌ Give at least one recipient")
+        
+        emails = merge_emails(input)
+        queued = get_outbox() is not None
+        if not queued:
+            headers = get_gmail_service()
+            sender_email = get_sender_email(headers)
+            if not sender_email:
+                return MailMergeOutput(success=False, message="❌ Could not retrieve sender email address")
+        
+        def send_one(index: int) -> MailMergeResult:
+            email_input = emails[index]
+            if isinstance(email_input, ValueError):
+                result = email_input
+            elif queued:
+                result = send_email(email_input)  # queues it, reporting a bad attachment as a failure
+            else:
+                result = deliver_email(sender_email, email_input, headers)
+            return merge_result(index, input.recipients[index].to, result)
         
-        if input.query:
-            params["q"] = input.query
-        if input.label:
-            params["labelIds"] = input.label
+        with ThreadPoolExecutor(max_workers=GMAIL_MAX_CONCURRENCY, thread_name_prefix="gmail-merge") as pool:
+            results = list(pool.map(send_one, range(len(emails))))
+        return mail_merge_output(results, queued=queued)
         
-        response = httpx.get(url, headers=headers, params=params)
+    except Exception as e:
+        return MailMergeOutput(success=False, message=f"❌ Error sending mail merge: {str(e)}")
+
+def get_emails_params(input: GetEmailsInput) -> dict:
+    """Query parameters of the messages.list call behind get_emails"""
+    params = {
+        "maxResults": input.max_results
+    }
+    
+    if input.query:
+        params["q"] = input.query
+    if input.label:
+        params["labelIds"] = input.label
+    
+    return params
+
+def iter_message_pages(headers: dict, params: dict, limit: Optional[int] = None,
+                       page_token: Optional[str] = None) -> Iterator[Tuple[List[str], Optional[str]]]:
+    """Walk messages.list, yielding (message ids, next page token) one page at a time.
+    
+    Stops after limit ids (None walks the whole listing); only one page is held at a time.
+    """
+    client = get_client()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_params = dict(params, maxResults=LIST_PAGE_SIZE if remaining is None else min(LIST_PAGE_SIZE, remaining))
+        if page_token:
+            page_params["pageToken"] = page_token
+        response = client.get(f"{GMAIL_API_BASE}/messages", headers=headers, params=page_params)
         response.raise_for_status()
+        data = fastjson.loads(response.content)
         
-        messages = response.json().get("messages", [])
-        if not messages:
-            return GetEmailsOutput(success=True, message="📭 No emails found")
+        ids = [msg["id"] for msg in data.get("messages", [])]
+        page_token = data.get("nextPageToken")
+        if remaining is not None:
+            remaining -= len(ids)
+        yield ids, page_token
+        if not page_token:
+            return
+
+def listing_scope(query: Optional[str], label: Optional[str] = None) -> str:
+    """Fingerprint of a listing, so a cursor is only accepted by the listing that issued it"""
+    return hashlib.sha1(json.dumps([query, label]).encode("utf-8")).hexdigest()[:12]
+
+def encode_cursor(position: Optional[dict], scope: str) -> Optional[str]:
+    """Opaque cursor for a listing position ({"p": page token} or {"o": offset})"""
+    if not position:
+        return None
+    raw = json.dumps(dict(position, s=scope), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], scope: str) -> dict:
+    """Listing position of a cursor; the start of the listing when there is none"""
+    if not cursor:
+        return {}
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict) or position.pop("s", None) != scope:
+        raise ValueError("Cursor does not belong to this listing")
+    return position
+
+def list_emails_page(headers: dict, params: dict, limit: int, position: dict,
+                     max_staleness: Optional[float] = None) -> Tuple[List[EmailRecord], Optional[dict]]:
+    """One page of a listing from Gmail: the emails and the position after them"""
+    page_token = position.get("p")
+    skip = position.get("o", 0)  # offsets come from cache-served pages
+    emails = []
+    next_token = None
+    
+    for ids, next_token in iter_message_pages(headers, params, limit + skip, page_token):
+        if skip:
+            dropped = min(skip, len(ids))
+            ids, skip = ids[dropped:], skip - dropped
+        emails.extend(get_listing_details(ids, headers, max_staleness))
+    
+    return emails, ({"p": next_token} if next_token else None)
+
+def listing_message(header: str, emails: List[EmailRecord], next_cursor: Optional[str]) -> str:
+    """One line per email, plus the cursor to continue from when there are more"""
+    message_lines = [header]
+    for email_detail in emails:
+        message_lines.append(f"- {email_detail.subject} from {email_detail.sender} ({email_detail.date})")
+    if next_cursor:
+        message_lines.append(f"➡️ More emails available (cursor: {next_cursor})")
+    return "\n".join(message_lines)
+
+def prefetch_listing(headers: dict, emails: List[EmailRecord]):
+    """Start fetching the full messages of a listing's first emails in the background, when prefetch is on"""
+    prefetcher = get_prefetcher()
+    if prefetcher is None:
+        return
+    ids = [email_detail.id for email_detail in emails[:prefetcher.count] if email_detail.body is None]
+    if ids:
+        prefetcher.schedule(headers, ids, lambda ids: get_emails_details(ids, headers, FULL_PARAMS))
+
+def get_emails(input: GetEmailsInput) -> GetEmailsOutput:
+    """Get emails from Gmail"""
+    try:
+        headers = get_gmail_service()
+        input = input.model_copy(update={"label": resolve_label(headers, input.label)})
+        scope = listing_scope(input.query, input.label)
+        position = decode_cursor(input.cursor, scope)
+        page = get_cached_listing(input, headers, position)
         
-        # Get detailed information for each email
-        emails = []
-        message_lines = ["📧 Recent emails:"]
+        if page is None:
+            page = list_emails_page(headers, get_emails_params(input), input.max_results, position,
+                                    input.max_staleness_seconds)
         
-        for msg in messages:
-            email_detail = get_email_details(msg["id"], headers)
-            if email_detail:
-                emails.append(email_detail)
-                message_lines.append(f"- {email_detail.subject} from {email_detail.sender} ({email_detail.date})")
+        emails, next_position = page
+        if not emails:
+            return GetEmailsOutput(success=True, message="📭 No emails found")
         
-        return GetEmailsOutput(
+        prefetch_listing(headers, emails)
+        next_cursor = encode_cursor(next_position, scope)
+        return GetEmailsOutput.model_construct(
             success=True,
-            message="\n".join(message_lines),
-            emails=emails
+            message=listing_message("📧 Recent emails:", emails, next_cursor),
+            emails=emails,
+            next_cursor=next_cursor
         )
         
     except Exception as e:
         return GetEmailsOutput(success=False, message=f"❌ Error fetching emails: {str(e)}")
 
-def get_email_details(email_id: str, headers: dict) -> Optional[Email]:
-    """Get detailed information for a specific email"""
+def get_email_details(email_id: str, headers: dict, params: Optional[dict] = None) -> Optional[EmailRecord]:
+    """Get detailed information for a specific email (the full message unless params say otherwise)"""
     try:
-        url = f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{email_id}"
-        response = httpx.get(url, headers=headers)
-        response.raise_for_status()
+        prefetcher = get_prefetcher() if params is None else None
+        prefetched = prefetcher.get(headers, email_id) if prefetcher is not None else None
+        if prefetched is not None:
+            return prefetched
         
-        msg_data = response.json()
-        headers_data = msg_data.get("payload", {}).get("headers", [])
-        
-        # Extract header information
-        subject = next((h["value"] for h in headers_data if h["name"] == "Subject"), "No Subject")
-        sender = next((h["value"] for h in headers_data if h["name"] == "From"), "Unknown")
-        recipient = next((h["value"] for h in headers_data if h["name"] == "To"), "Unknown")
-        date = next((h["value"] for h in headers_data if h["name"] == "Date"), "")
-        
-        # Extract body
-        body = extract_email_body(msg_data.get("payload", {}))
-        
-        # Check for attachments
-        has_attachments = "parts" in msg_data.get("payload", {})
-        
-        # Extract labels
-        labels = msg_data.get("labelIds", [])
+        url = f"{GMAIL_API_BASE}/messages/{email_id}"
+        response = get_client().get(url, headers=headers, params=params)
+        response.raise_for_status()
         
-        return Email(
-            id=email_id,
-            subject=subject,
-            sender=sender,
-            recipient=recipient,
-            body=body,
-            date=date,
-            labels=labels,
-            has_attachments=has_attachments
-        )
+        return parse_email(email_id, fastjson.loads(response.content))
         
     except Exception as e:
         print(f"Error getting email details: {str(e)}")
         return None
 
+def get_emails_details(email_ids: List[str], headers: dict, params: Optional[dict] = None) -> List[EmailRecord]:
+    """Get detailed information for several emails through the Gmail batch endpoint, in list order"""
+    if not GMAIL_BATCH_ENABLED or len(email_ids) <= 1:
+        details = [get_email_details(email_id, headers, params) for email_id in email_ids]
+        return [email_detail for email_detail in details if email_detail]
+    
+    batch_size = max(1, min(GMAIL_BATCH_SIZE, gmail_batch.MAX_BATCH_SIZE))
+    emails = []
+    for start in range(0, len(email_ids), batch_size):
+        chunk = email_ids[start:start + batch_size]
+        # One round-trip per chunk; per-message failures that may succeed on
+        # their own are retried individually, as is a chunk whose batch failed
+        try:
+            messages, failures = gmail_batch.get_messages(chunk, headers, params)
+        except Exception as e:
+            print(f"Error in batch request, fetching individually: {str(e)}")
+            messages, failures = {}, {email_id: 0 for email_id in chunk}
+        
+        for email_id in chunk:
+            if email_id in messages:
+                email_detail = parse_email(email_id, messages[email_id])
+            elif failures.get(email_id) in RETRYABLE_STATUSES:
+                email_detail = get_email_details(email_id, headers, params)
+            else:
+                print(f"Error getting email details: {email_id} returned status {failures.get(email_id)}")
+                email_detail = None
+            if email_detail:
+                emails.append(email_detail)
+    
+    return emails
+
+def parse_email(email_id: str, msg_data: dict) -> EmailRecord:
+    """Build an EmailRecord from a Gmail message resource (full or metadata format)"""
+    payload = msg_data.get("payload", {})
+    headers_data = payload.get("headers", [])
+    
+    # Extract header information
+    subject = next((h["value"] for h in headers_data if h["name"] == "Subject"), "No Subject")
+    sender = next((h["value"] for h in headers_data if h["name"] == "From"), "Unknown")
+    recipient = next((h["value"] for h in headers_data if h["name"] == "To"), "Unknown")
+    date = next((h["value"] for h in headers_data if h["name"] == "Date"), "")
+    
+    # Threading headers; Gmail reports "Message-Id" as often as "Message-ID"
+    message_id = None
+    references = []
+    for h in headers_data:
+        name = h["name"].lower()
+        if name == "message-id":
+            message_id = h["value"].strip()
+        elif name in ("references", "in-reply-to"):
+            references.extend(h["value"].split())
+    
+    # Extract body and attachments; metadata-format messages carry neither, they are fetched when needed
+    full = "body" in payload or "parts" in payload
+    body = extract_email_body(payload) if full else None
+    attachments = [
+        AttachmentRecord(
+            attachment_id=part["body"]["attachmentId"],
+            filename=part.get("filename") or "",
+            mime_type=part.get("mimeType") or "application/octet-stream",
+            size=part["body"].get("size", 0),
+        )
+        for part in gmail_mime.attachment_parts(payload)
+    ] if full else None
+    
+    # Check for attachments
+    has_attachments = bool(attachments) or payload.get("mimeType") == "multipart/mixed" or any(
+        part.get("filename") for part in payload.get("parts", [])
+    )
+    
+    # Extract labels
+    labels = msg_data.get("labelIds", [])
+    
+    internal_date = msg_data.get("internalDate")
+    
+    return EmailRecord(
+        id=email_id,
+        thread_id=msg_data.get("threadId"),
+        subject=subject,
+        sender=sender,
+        recipient=recipient,
+        body=body,
+        snippet=msg_data.get("snippet"),
+        date=date,
+        internal_date=int(internal_date) if internal_date is not None else None,  # Gmail sends a string
+        labels=labels,
+        has_attachments=has_attachments,
+        attachments=attachments,
+        message_id=message_id,
+        references=list(dict.fromkeys(references))
+    )
+
 def extract_email_body(payload: dict) -> str:
-    """Extract email body from payload"""
+    """Extract email body from payload (text/plain at any depth, else stripped HTML)"""
     try:
-        if "body" in payload and payload["body"].get("data"):
-            return base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
-        
-        if "parts" in payload:
-            for part in payload["parts"]:
-                if part.get("mimeType") == "text/plain":
-                    if part["body"].get("data"):
-                        return base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8")
-        
-        return "No readable content"
+        body = gmail_mime.extract_body(payload, MAIL_BODY_MAX_BYTES if MAIL_BODY_MAX_BYTES > 0 else None)
+        return body if body is not None else "No readable content"
         
     except Exception as e:
         return f"Error extracting body: {str(e)}"
@@ -188,12 +636,12 @@ def read_email(input: ReadEmailInput) -> ReadEmailOutput:
     """Read a specific email by ID"""
     try:
         headers = get_gmail_service()
-        email_detail = get_email_details(input.email_id, headers)
+        email_detail = get_full_email(input.email_id, headers)
         
         if not email_detail:
             return ReadEmailOutput(success=False, message="❌ Email not found or could not be read")
         
-        return ReadEmailOutput(
+        return ReadEmailOutput.model_construct(
             success=True,
             message=f"📧 Email: {email_detail.subject}",
             email=email_detail
@@ -202,38 +650,98 @@ def read_email(input: ReadEmailInput) -> ReadEmailOutput:
     except Exception as e:
         return ReadEmailOutput(success=False, message=f"❌ Error reading email: {str(e)}")
 
-def search_emails(input: SearchEmailsInput) -> SearchEmailsOutput:
-    """Search emails using Gmail search syntax"""
+def thread_output(thread_id: str, emails: List[EmailRecord], source: str) -> GetThreadOutput:
+    """The conversation, oldest first, with every email's sender, date and body"""
+    message_lines = [f"🧵 Conversation: {emails[0].subject} ({len(emails)} emails)"]
+    for email_detail in emails:
+        message_lines.append(f"\n--- {email_detail.sender} ({email_detail.date}) [id: {email_detail.id}]")
+        message_lines.append(email_detail.body if email_detail.body is not None else email_detail.snippet or "")
+    return GetThreadOutput.model_construct(
+        success=True,
+        message="\n".join(message_lines),
+        thread_id=thread_id,
+        emails=emails,
+        source=source
+    )
+
+def parse_thread(thread_data: dict) -> List[EmailRecord]:
+    """The emails of a users.threads.get resource, oldest first"""
+    emails = [parse_email(msg["id"], msg) for msg in thread_data.get("messages", [])]
+    emails.sort(key=lambda e: e.internal_date or 0)
+    return emails
+
+def fetch_thread(thread_id: str, headers: dict) -> List[EmailRecord]:
+    """Every email of a thread, bodies included, in one users.threads.get call; empty if there is no such thread"""
+    response = get_client().get(f"{GMAIL_API_BASE}/threads/{thread_id}", headers=headers)
+    if response.status_code == 404:
+        return []
+    response.raise_for_status()
+    return parse_thread(fastjson.loads(response.content))
+
+def find_thread_id(email_id: str, headers: dict, cache: Optional[MailCache]) -> Optional[str]:
+    """The thread an email belongs to, from the cache when it knows the email"""
+    thread_id = cache.thread_id_of(email_id) if cache is not None else None
+    if thread_id:
+        return thread_id
+    response = get_client().get(f"{GMAIL_API_BASE}/messages/{email_id}", headers=headers, params=THREAD_ID_PARAMS)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return fastjson.loads(response.content).get("threadId")
+
+def get_thread(input: GetThreadInput) -> GetThreadOutput:
+    """Get a whole conversation: from the mailbox cache when it holds all of it, else one threads.get call"""
     try:
+        if not input.thread_id and not input.email_id:
+            return GetThreadOutput(success=False, message="❌ Give a thread_id or an email_id")
+        
         headers = get_gmail_service()
-        url = "https://gmail.googleapis.com/gmail/v1/users/me/messages"
+        cache = get_fresh_mail_cache(headers, input.max_staleness_seconds)
+        thread_id = input.thread_id or find_thread_id(input.email_id, headers, cache)
         
-        params = {
-            "q": input.query,
-            "maxResults": input.max_results
-        }
+        emails = get_cached_thread(cache, thread_id) if cache is not None and thread_id else None
+        source = "local"
+        if emails is None:
+            emails = fetch_thread(thread_id, headers) if thread_id else []
+            source = "remote"
+            if emails and cache is not None:
+                cache.upsert(emails)
         
-        response = httpx.get(url, headers=headers, params=params)
-        response.raise_for_status()
+        if not emails:
+            return GetThreadOutput(success=False, message="❌ Thread not found")
+        return thread_output(thread_id, emails, source)
         
-        messages = response.json().get("messages", [])
-        if not messages:
-            return SearchEmailsOutput(success=True, message=f"🔍 No emails found for query: {input.query}")
+    except Exception as e:
+        return GetThreadOutput(success=False, message=f"❌ Error fetching thread: {str(e)}")
+
+def search_emails(input: SearchEmailsInput) -> SearchEmailsOutput:
+    """Search emails using Gmail search syntax"""
+    try:
+        headers = get_gmail_service()
+        scope = listing_scope(input.query)
+        position = decode_cursor(input.cursor, scope)
         
-        # Get detailed information for each email
-        emails = []
-        message_lines = [f"🔍 Search results for '{input.query}':"]
+        page = get_indexed_search(input, headers, position)
+        source = "local"
+        if page is None:
+            params = {
+                "q": input.query
+            }
+            page = list_emails_page(headers, params, input.max_results, position, input.max_staleness_seconds)
+            source = "remote"
         
-        for msg in messages:
-            email_detail = get_email_details(msg["id"], headers)
-            if email_detail:
-                emails.append(email_detail)
-                message_lines.append(f"- {email_detail.subject} from {email_detail.sender} ({email_detail.date})")
+        emails, next_position = page
+        if not emails:
+            return SearchEmailsOutput(success=True, message=f"🔍 No emails found for query: {input.query}", source=source)
         
-        return SearchEmailsOutput(
+        prefetch_listing(headers, emails)
+        next_cursor = encode_cursor(next_position, scope)
+        return SearchEmailsOutput.model_construct(
             success=True,
-            message="\n".join(message_lines),
-            emails=emails
+            message=listing_message(f"🔍 Search results for '{input.query}':", emails, next_cursor),
+            emails=emails,
+            next_cursor=next_cursor,
+            source=source
         )
         
     except Exception as e:
@@ -243,43 +751,107 @@ def delete_email(input: DeleteEmailInput) -> DeleteEmailOutput:
     """Delete an email by ID"""
     try:
         headers = get_gmail_service()
-        url = f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{input.email_id}"
+        url = f"{GMAIL_API_BASE}/messages/{input.email_id}"
         
-        response = httpx.delete(url, headers=headers)
+        response = get_client().delete(url, headers=headers)
         response.raise_for_status()
         
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        cache = get_mail_cache()
+        if cache is not None:
+            cache.remove([input.email_id])
+        
         return DeleteEmailOutput(success=True, message="✅ Email deleted successfully")
         
     except Exception as e:
         return DeleteEmailOutput(success=False, message=f"❌ Error deleting email: {str(e)}")
 
+def parse_reply_context(msg_data: dict) -> dict:
+    """The parts of a message (fetched with REPLY_PARAMS) that a reply to it needs"""
+    # Header names are matched case-insensitively: Gmail reports "Message-Id" as often as "Message-ID"
+    headers_data = {h["name"].lower(): h["value"] for h in msg_data.get("payload", {}).get("headers", [])}
+    sender = headers_data.get("from", "Unknown")
+    
+    return {
+        "thread_id": msg_data.get("threadId"),
+        "subject": headers_data.get("subject", ""),
+        "sender": sender,
+        "reply_to": headers_data.get("reply-to") or sender,
+        "date": headers_data.get("date", ""),
+        "message_id": headers_data.get("message-id"),
+        "references": headers_data.get("references"),
+    }
+
+def get_reply_context(email_id: str, headers: dict) -> Optional[dict]:
+    """Headers and thread of the email being replied to, or None if it does not exist"""
+    response = get_client().get(f"{GMAIL_API_BASE}/messages/{email_id}", headers=headers, params=REPLY_PARAMS)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return parse_reply_context(fastjson.loads(response.content))
+
+def quote_body(context: dict, body: str) -> str:
+    """The original body as a quoted attribution block"""
+    quoted = "\n".join(f"> {line}" if line else ">" for line in body.splitlines())
+    return f"On {context['date']}, {context['sender']} wrote:\n{quoted}"
+
+def build_reply_input(context: dict, input: ReplyToEmailInput, original_body: Optional[str] = None) -> SendEmailInput:
+    """Create the reply message for an email, in its thread; the original is quoted only when given"""
+    subject = context["subject"]
+    reply_subject = subject if subject.lower().startswith("re:") else f"Re: {subject}"
+    reply_body = input.reply_body
+    if original_body is not None:
+        reply_body += "\n\n" + quote_body(context, original_body)
+    references = " ".join(r for r in (context["references"], context["message_id"]) if r)
+    
+    return SendEmailInput(
+        to=context["reply_to"],
+        subject=reply_subject,
+        body=reply_body,
+        thread_id=context["thread_id"],
+        in_reply_to=context["message_id"],
+        references=references or None
+    )
+
+def build_forward_input(original_email: EmailRecord, input: ForwardEmailInput) -> SendEmailInput:
+    """Create the forward message for an email"""
+    forward_subject = f"Fwd: {original_email.subject}"
+    forward_body = f"""
+--- Forwarded message ---
+From: {original_email.sender}
+Date: {original_email.date}
+Subject: {original_email.subject}
+
+{original_email.body}
+
+{input.additional_message or ""}
+"""
+    
+    return SendEmailInput(
+        to=input.forward_to,
+        subject=forward_subject,
+        body=forward_body
+    )
+
 def reply_to_email(input: ReplyToEmailInput) -> ReplyToEmailOutput:
     """Reply to an email"""
     try:
         headers = get_gmail_service()
         
-        # First, get the original email details
-        original_email = get_email_details(input.email_id, headers)
-        if not original_email:
+        # First, get the original email's headers (and its body only if it is to be quoted)
+        context = get_reply_context(input.email_id, headers)
+        if not context:
             return ReplyToEmailOutput(success=False, message="❌ Original email not found")
-        
-        # Create reply message
-        reply_subject = f"Re: {original_email.subject}" if not original_email.subject.startswith("Re:") else original_email.subject
-        reply_body = f"\n\n--- Original Message ---\n{original_email.body}\n\n{input.reply_body}"
+        original_email = get_full_email(input.email_id, headers) if input.quote_original else None
         
         # Send the reply
-        reply_input = SendEmailInput(
-            to=original_email.sender,
-            subject=reply_subject,
-            body=reply_body
-        )
-        
-        reply_result = send_email(reply_input)
+        reply_result = send_email_now(build_reply_input(context, input, original_email.body if original_email else None))
         
         if reply_result.success:
             return ReplyToEmailOutput(
                 success=True,
-                message=f"✅ Reply sent successfully to {original_email.sender}",
+                message=f"✅ Reply sent successfully to {context['reply_to']}",
                 reply_id=reply_result.email_id
             )
         else:
@@ -294,31 +866,12 @@ def forward_email(input: ForwardEmailInput) -> ForwardEmailOutput:
         headers = get_gmail_service()
         
         # Get the original email details
-        original_email = get_email_details(input.email_id, headers)
+        original_email = get_full_email(input.email_id, headers)
         if not original_email:
             return ForwardEmailOutput(success=False, message="❌ Original email not found")
         
-        # Create forward message
-        forward_subject = f"Fwd: {original_email.subject}"
-        forward_body = f"""
---- Forwarded message ---
-From: {original_email.sender}
-Date: {original_email.date}
-Subject: {original_email.subject}
-
-{original_email.body}
-
-{input.additional_message or ""}
-"""
-        
         # Send the forward
-        forward_input = SendEmailInput(
-            to=input.forward_to,
-            subject=forward_subject,
-            body=forward_body
-        )
-        
-        forward_result = send_email(forward_input)
+        forward_result = send_email_now(build_forward_input(original_email, input))
         
         if forward_result.success:
             return ForwardEmailOutput(
@@ -333,39 +886,104 @@ Subject: {original_email.subject}
         return ForwardEmailOutput(success=False, message=f"❌ Error forwarding email: {str(e)}")
 
 def get_labels(input: GetLabelsInput) -> GetLabelsOutput:
-    """Get all Gmail labels"""
+    """Get all Gmail labels, from the label directory cache"""
     try:
         headers = get_gmail_service()
-        url = "https://gmail.googleapis.com/gmail/v1/users/me/labels"
-        
-        response = httpx.get(url, headers=headers)
-        response.raise_for_status()
-        
-        labels_data = response.json().get("labels", [])
-        labels = [label["name"] for label in labels_data]
+        directory = get_labels_directory(headers)
+        labels = list(directory.names.values())
         
         return GetLabelsOutput(
             success=True,
             message=f"🏷️ Found {len(labels)} labels",
-            labels=labels
+            labels=labels,
+            label_ids={name: label_id for label_id, name in directory.names.items()}
         )
         
     except Exception as e:
         return GetLabelsOutput(success=False, message=f"❌ Error fetching labels: {str(e)}")
 
+def label_stats(label_id: str, resource: dict) -> LabelStats:
+    """Counters of a users.labels.get resource"""
+    return LabelStats(
+        id=label_id,
+        name=resource.get("name", label_id),
+        messages_total=resource.get("messagesTotal", 0),
+        messages_unread=resource.get("messagesUnread", 0),
+        threads_total=resource.get("threadsTotal", 0),
+        threads_unread=resource.get("threadsUnread", 0)
+    )
+
+def stats_output(label_ids: List[str], resources: dict) -> GetMailboxStatsOutput:
+    stats = [label_stats(label_id, resources[label_id]) for label_id in label_ids]
+    message_lines = ["📊 Mailbox statistics:"]
+    for label in stats:
+        message_lines.append(
+            f"- {label.name}: {label.messages_unread} unread of {label.messages_total} emails "
+            f"({label.threads_unread} unread of {label.threads_total} conversations)"
+        )
+    return GetMailboxStatsOutput(success=True, message="\n".join(message_lines), labels=stats)
+
+def get_label_resource(label_id: str, headers: dict) -> dict:
+    response = get_client().get(f"{GMAIL_API_BASE}/labels/{label_id}", headers=headers)
+    response.raise_for_status()
+    return fastjson.loads(response.content)
+
+def get_label_resources(label_ids: List[str], headers: dict) -> dict:
+    """users.labels.get for several labels through the Gmail batch endpoint, by label id"""
+    if not GMAIL_BATCH_ENABLED or len(label_ids) <= 1:
+        return {label_id: get_label_resource(label_id, headers) for label_id in label_ids}
+    
+    batch_size = max(1, min(GMAIL_BATCH_SIZE, gmail_batch.MAX_BATCH_SIZE))
+    resources = {}
+    for start in range(0, len(label_ids), batch_size):
+        found, failures = gmail_batch.get_labels(label_ids[start:start + batch_size], headers)
+        resources.update(found)
+        for label_id, status in failures.items():
+            if status not in RETRYABLE_STATUSES:
+                raise ValueError(f"Label {label_id} returned status {status}")
+            resources[label_id] = get_label_resource(label_id, headers)
+    return resources
+
+def get_mailbox_stats(input: GetMailboxStatsInput) -> GetMailboxStatsOutput:
+    """Unread and total counts per label, from the labels' counters instead of listing messages"""
+    try:
+        if not input.labels:
+            return GetMailboxStatsOutput(success=False, message="❌ Give at least one label")
+        
+        headers = get_gmail_service()
+        label_ids = list(dict.fromkeys(resolve_label(headers, label) for label in input.labels))
+        max_age = GMAIL_STATS_TTL if input.max_staleness_seconds is None else input.max_staleness_seconds
+        resources = cached_counts(headers, label_ids, max_age)
+        missing = [label_id for label_id in label_ids if label_id not in resources]
+        if missing:
+            fetched = get_label_resources(missing, headers)
+            store_counts(headers, fetched)
+            resources.update(fetched)
+        
+        return stats_output(label_ids, resources)
+        
+    except Exception as e:
+        return GetMailboxStatsOutput(success=False, message=f"❌ Error fetching mailbox statistics: {str(e)}")
+
 def mark_as_read(input: MarkAsReadInput) -> MarkAsReadOutput:
     """Mark an email as read"""
     try:
         headers = get_gmail_service()
-        url = f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{input.email_id}/modify"
+        url = f"{GMAIL_API_BASE}/messages/{input.email_id}/modify"
         
         payload = {
             "removeLabelIds": ["UNREAD"]
         }
         
-        response = httpx.post(url, headers=headers, json=payload)
+        response = get_client().post(url, headers=headers, json=payload)
         response.raise_for_status()
         
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        cache = get_mail_cache()
+        if cache is not None:
+            cache.modify_labels(input.email_id, remove=["UNREAD"])
+        
         return MarkAsReadOutput(success=True, message="✅ Email marked as read")
         
     except Exception as e:
@@ -375,16 +993,1068 @@ def mark_as_unread(input: MarkAsUnreadInput) -> MarkAsUnreadOutput:
     """Mark an email as unread"""
     try:
         headers = get_gmail_service()
-        url = f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{input.email_id}/modify"
+        url = f"{GMAIL_API_BASE}/messages/{input.email_id}/modify"
         
         payload = {
             "addLabelIds": ["UNREAD"]
         }
         
-        response = httpx.post(url, headers=headers, json=payload)
+        response = get_client().post(url, headers=headers, json=payload)
         response.raise_for_status()
         
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        cache = get_mail_cache()
+        if cache is not None:
+            cache.modify_labels(input.email_id, add=["UNREAD"])
+        
         return MarkAsUnreadOutput(success=True, message="✅ Email marked as unread")
         
     except Exception as e:
-        return MarkAsUnreadOutput(success=False, message=f"❌ Error marking email as unread: {str(e)}") 
\ No newline at end of file
+        return MarkAsUnreadOutput(success=False, message=f"❌ Error marking email as unread: {str(e)}") 
+
+def get_metrics() -> GetMetricsOutput:
+    """Quota usage, throttling and retry counters of the shared Gmail clients"""
+    try:
+        quota = QuotaMetrics(**get_quota_stats())
+        message = f"📈 {quota.requests} requests, {quota.units} quota units, {quota.throttled} throttled, {quota.retries} retried"
+        prefetcher = get_prefetcher()
+        prefetch = PrefetchMetrics(**prefetcher.snapshot()) if prefetcher is not None else None
+        if prefetch is not None:
+            message += f"; prefetch hit rate {prefetch.hit_rate:.0%} ({prefetch.hits} of {prefetch.hits + prefetch.misses})"
+        return GetMetricsOutput(
+            success=True,
+            message=message,
+            quota=quota,
+            prefetch=prefetch
+        )
+        
+    except Exception as e:
+        return GetMetricsOutput(success=False, message=f"❌ Error reading metrics: {str(e)}")
+
+# Bulk modify and delete
+#
+# users.messages.batchModify and batchDelete take up to BULK_CHUNK_SIZE ids per
+# call and succeed or fail as a whole, so each id's result is its chunk's.
+
+BULK_CHUNK_SIZE = 1000
+
+def select_bulk_ids(email_ids: Optional[List[str]], query: Optional[str], max_emails: int,
+                    headers: dict) -> List[str]:
+    """Ids a bulk operation applies to: the given ids (duplicates dropped) or a search's matches"""
+    if email_ids:
+        return list(dict.fromkeys(email_ids))
+    ids = []
+    for page_ids, _ in iter_message_pages(headers, {"q": query}, limit=max_emails):
+        ids.extend(page_ids)
+    return ids
+
+def bulk_chunks(email_ids: List[str]) -> List[List[str]]:
+    return [email_ids[start:start + BULK_CHUNK_SIZE] for start in range(0, len(email_ids), BULK_CHUNK_SIZE)]
+
+def bulk_modify_payload(input: BulkModifyEmailsInput, chunk: List[str]) -> dict:
+    return {"ids": chunk, "addLabelIds": input.add_labels, "removeLabelIds": input.remove_labels}
+
+def bulk_results(chunks: List[List[str]], errors: List[Optional[str]]) -> List[BulkEmailResult]:
+    """Per-id results from each chunk's outcome (None for success)"""
+    return [
+        BulkEmailResult(email_id=email_id, success=error is None, error=error)
+        for chunk, error in zip(chunks, errors)
+        for email_id in chunk
+    ]
+
+def bulk_summary(action: str, results: List[BulkEmailResult]) -> dict:
+    """Output fields summarizing the per-id results of a bulk operation"""
+    succeeded = sum(1 for r in results if r.success)
+    failed = len(results) - succeeded
+    message = f"✅ {action} {succeeded} of {len(results)} emails"
+    if failed:
+        message += f" ({failed} failed)"
+    return {"success": True, "message": message, "succeeded": succeeded, "failed": failed, "results": results}
+
+def bulk_selection_error(email_ids: Optional[List[str]], query: Optional[str]) -> Optional[str]:
+    if not email_ids and not query:
+        return "❌ Give the email_ids or a query selecting the emails"
+    return None
+
+def post_bulk_chunk(action: str, payload: dict, headers: dict) -> Optional[str]:
+    """Run one batchModify/batchDelete call; returns the error, or None on success"""
+    try:
+        response = get_client().post(f"{GMAIL_API_BASE}/messages/{action}", headers=headers, json=payload)
+        check_auth(response, headers)
+        response.raise_for_status()
+        return None
+    except Exception as e:
+        return str(e)
+
+def post_bulk_chunks(action: str, payloads: List[dict], headers: dict) -> List[Optional[str]]:
+    """Run batchModify/batchDelete calls, GMAIL_MAX_CONCURRENCY at a time like the async gather"""
+    if len(payloads) <= 1:
+        return [post_bulk_chunk(action, payload, headers) for payload in payloads]
+    with ThreadPoolExecutor(max_workers=GMAIL_MAX_CONCURRENCY, thread_name_prefix="gmail-bulk") as pool:
+        return list(pool.map(lambda payload: post_bulk_chunk(action, payload, headers), payloads))
+
+def apply_bulk_modify(cache: Optional[MailCache], input: BulkModifyEmailsInput, results: List[BulkEmailResult]):
+    """Mirror successful label changes in the mailbox cache"""
+    if cache is not None:
+        for result in results:
+            if result.success:
+                cache.modify_labels(result.email_id, add=input.add_labels, remove=input.remove_labels)
+
+def apply_bulk_delete(cache: Optional[MailCache], results: List[BulkEmailResult]):
+    """Drop successfully deleted emails from the mailbox cache"""
+    if cache is not None:
+        cache.remove(r.email_id for r in results if r.success)
+
+def bulk_modify_emails(input: BulkModifyEmailsInput) -> BulkModifyEmailsOutput:
+    """Add and remove labels on many emails; the batchModify chunks run concurrently"""
+    try:
+        error = bulk_selection_error(input.email_ids, input.query)
+        if error is None and not input.add_labels and not input.remove_labels:
+            error = "❌ Give labels to add or remove"
+        if error:
+            return BulkModifyEmailsOutput(success=False, message=error)
+        
+        headers = get_gmail_service()
+        chunks = bulk_chunks(select_bulk_ids(input.email_ids, input.query, input.max_emails, headers))
+        errors = post_bulk_chunks("batchModify", [bulk_modify_payload(input, chunk) for chunk in chunks], headers)
+        results = bulk_results(chunks, errors)
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        apply_bulk_modify(get_mail_cache(), input, results)
+        
+        return BulkModifyEmailsOutput(**bulk_summary("Modified", results))
+        
+    except Exception as e:
+        return BulkModifyEmailsOutput(success=False, message=f"❌ Error modifying emails: {str(e)}")
+
+def bulk_delete_emails(input: BulkDeleteEmailsInput) -> BulkDeleteEmailsOutput:
+    """Permanently delete many emails; the batchDelete chunks run concurrently"""
+    try:
+        error = bulk_selection_error(input.email_ids, input.query)
+        if error:
+            return BulkDeleteEmailsOutput(success=False, message=error)
+        
+        headers = get_gmail_service()
+        chunks = bulk_chunks(select_bulk_ids(input.email_ids, input.query, input.max_emails, headers))
+        errors = post_bulk_chunks("batchDelete", [{"ids": chunk} for chunk in chunks], headers)
+        results = bulk_results(chunks, errors)
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        apply_bulk_delete(get_mail_cache(), results)
+        
+        return BulkDeleteEmailsOutput(**bulk_summary("Deleted", results))
+        
+    except Exception as e:
+        return BulkDeleteEmailsOutput(success=False, message=f"❌ Error deleting emails: {str(e)}")
+
+# Mailbox cache
+#
+# With MAIL_CACHE_PATH set, listings, search details and full messages are
+# served from the local SQLite cache. It is brought up to date lazily: once it
+# is older than the request's freshness bound, Gmail's history since the last
+# seen historyId is applied (a full paginated load the first time, or when
+# Gmail no longer has that history).
+
+def sync_mail_cache(headers: dict, cache: MailCache, max_staleness: float = 0) -> str:
+    """Bring the cache up to date with Gmail; returns one of fresh, incremental or full"""
+    with cache.sync_lock:
+        # Another request may have synced while this one waited for the lock
+        if cache.age() <= max_staleness:
+            return "fresh"
+        
+        if cache.history_id:
+            try:
+                sync_mail_cache_incremental(headers, cache)
+                return "incremental"
+            except httpx.HTTPStatusError as e:
+                # 404: the start history id is too old, reload everything
+                if e.response.status_code != 404:
+                    raise
+        
+        sync_mail_cache_full(headers, cache)
+        return "full"
+
+def sync_mail_cache_full(headers: dict, cache: MailCache):
+    """Bulk-load the newest cache.max_messages messages, a page at a time"""
+    client = get_client()
+    
+    # Take the history id first so changes made during the load are replayed next time
+    profile = client.get(f"{GMAIL_API_BASE}/profile", headers=headers)
+    profile.raise_for_status()
+    history_id = fastjson.loads(profile.content)["historyId"]
+    
+    seen = []
+    page_token = None
+    for page_ids, page_token in iter_message_pages(headers, {}, cache.max_messages):
+        cache.upsert(get_emails_details(page_ids, headers, LISTING_PARAMS))
+        seen.extend(page_ids)
+    
+    cache.retain_only(seen)
+    cache.set_state(history_id=history_id, synced_at=time.time(), complete=int(not page_token))
+
+def sync_mail_cache_incremental(headers: dict, cache: MailCache):
+    """Apply users.history.list changes since the cached historyId"""
+    client = get_client()
+    params = {"startHistoryId": cache.history_id, "maxResults": LIST_PAGE_SIZE}
+    history_id = cache.history_id
+    added = {}     # message id -> None, keeps first-seen order
+    deleted = set()
+    relabeled = {}  # message id -> latest label ids
+    
+    while True:
+        response = client.get(f"{GMAIL_API_BASE}/history", headers=headers, params=params)
+        response.raise_for_status()
+        data = fastjson.loads(response.content)
+        
+        for record in data.get("history", []):
+            for item in record.get("messagesAdded", []):
+                added[item["message"]["id"]] = None
+                deleted.discard(item["message"]["id"])
+            for item in record.get("messagesDeleted", []):
+                added.pop(item["message"]["id"], None)
+                deleted.add(item["message"]["id"])
+            for key in ("labelsAdded", "labelsRemoved"):
+                for item in record.get(key, []):
+                    relabeled[item["message"]["id"]] = item["message"].get("labelIds", [])
+        
+        history_id = data.get("historyId", history_id)
+        if not data.get("nextPageToken"):
+            break
+        params["pageToken"] = data["nextPageToken"]
+    
+    cache.remove(deleted)
+    for email_id, labels in relabeled.items():
+        if email_id not in added and email_id not in deleted:
+            cache.set_labels(email_id, labels)
+    cache.upsert(get_emails_details(list(added), headers, LISTING_PARAMS))
+    cache.set_state(history_id=history_id, synced_at=time.time())
+
+def get_fresh_mail_cache(headers: dict, max_staleness: Optional[float] = None) -> Optional[MailCache]:
+    """The mailbox cache, synced if it is older than max_staleness seconds.
+
+    None when the cache is disabled or could not be synced; callers then go to Gmail.
+    """
+    cache = get_mail_cache()
+    if cache is None:
+        return None
+    
+    bound = MAIL_CACHE_MAX_STALENESS if max_staleness is None else max_staleness
+    if cache.age() > bound:
+        try:
+            sync_mail_cache(headers, cache, bound)
+        except Exception as e:
+            print(f"Error syncing mail cache: {str(e)}")
+            return None
+    return cache
+
+def get_cached_listing(input: GetEmailsInput, headers: dict,
+                       position: dict) -> Optional[Tuple[List[EmailRecord], Optional[dict]]]:
+    """Answer a get_emails page from the cache, or None when Gmail has to be asked"""
+    # The cache does not evaluate Gmail search queries or resume Gmail page tokens
+    if input.query or "p" in position:
+        return None
+    
+    cache = get_fresh_mail_cache(headers, input.max_staleness_seconds)
+    if cache is None:
+        return None
+    
+    offset = position.get("o", 0)
+    emails = cache.list(input.label, input.max_results + 1, offset=offset)
+    more = len(emails) > input.max_results
+    emails = emails[:input.max_results]
+    # A short listing is only final when the cache holds the whole mailbox
+    if not more and not cache.is_complete():
+        return None
+    return emails, ({"o": offset + len(emails)} if more else None)
+
+def get_cached_thread(cache: MailCache, thread_id: str) -> Optional[List[EmailRecord]]:
+    """A thread rebuilt from the cache, or None when the cache may be missing part of it"""
+    emails = cache.thread(thread_id)
+    if not emails or not all(is_full_email(e) for e in emails):
+        return None
+    if cache.is_complete():
+        return emails
+    # A partial cache may have evicted part of the conversation: every email
+    # replied to must be cached (emails cached before threading headers were
+    # kept cannot be checked)
+    if any(e.message_id is None or e.references is None for e in emails):
+        return None
+    referenced = {ref for e in emails for ref in e.references} - {e.message_id for e in emails}
+    if referenced - cache.known_message_ids(referenced):
+        return None
+    return emails
+
+def get_indexed_search(input: SearchEmailsInput, headers: dict,
+                       position: dict) -> Optional[Tuple[List[EmailRecord], Optional[dict]]]:
+    """Answer a search page from the local index, or None when Gmail has to be asked"""
+    if "p" in position:
+        return None
+    parsed = mail_index.parse_query(input.query)
+    if parsed is None:
+        return None
+    
+    cache = get_fresh_mail_cache(headers, input.max_staleness_seconds)
+    # Only a cache holding the whole mailbox (and for free text, the bodies) can tell that a message does not match
+    if cache is None or not cache.is_complete() or not cache.can_search(parsed):
+        return None
+    
+    offset = position.get("o", 0)
+    emails = cache.search(parsed, input.max_results + 1, offset)
+    more = len(emails) > input.max_results
+    emails = emails[:input.max_results]
+    return emails, ({"o": offset + len(emails)} if more else None)
+
+def get_listing_details(email_ids: List[str], headers: dict, max_staleness: Optional[float] = None) -> List[EmailRecord]:
+    """Listing details for the given ids, from the cache where possible, in list order"""
+    cache = get_fresh_mail_cache(headers, max_staleness) if email_ids else None
+    if cache is None:
+        return get_emails_details(email_ids, headers, LISTING_PARAMS)
+    
+    found = cache.get(email_ids, bodies=False)
+    fetched = get_emails_details([i for i in email_ids if i not in found], headers, LISTING_PARAMS)
+    cache.upsert(fetched)
+    found.update((e.id, e) for e in fetched)
+    return [found[i] for i in email_ids if i in found]
+
+def is_full_email(email_detail: Optional[EmailRecord]) -> bool:
+    """Whether a cached email has what a full read returns (entries cached before attachments were kept lack it)"""
+    return email_detail is not None and email_detail.body is not None and email_detail.attachments is not None
+
+def get_full_email(email_id: str, headers: dict) -> Optional[EmailRecord]:
+    """The full message, body included; bodies never change, so a cached one is always good"""
+    cache = get_mail_cache()
+    if cache is not None:
+        cached = cache.get([email_id]).get(email_id)
+        if is_full_email(cached):
+            return cached
+    
+    email_detail = get_email_details(email_id, headers)
+    if email_detail is not None and cache is not None:
+        cache.upsert([email_detail])
+    return email_detail
+
+# Async read path
+#
+# Used by the API endpoints. Message details are fetched (and bulk sends are
+# delivered) concurrently over the shared AsyncClient, at most
+# GMAIL_MAX_CONCURRENCY at a time across all requests, so a listing costs
+# about one round-trip instead of N even where batch requests are disallowed
+# or throttled.
+
+_detail_semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+def _detail_semaphore() -> asyncio.Semaphore:
+    """Process-wide cap on in-flight Gmail requests for the running event loop"""
+    loop = asyncio.get_running_loop()
+    semaphore = _detail_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _detail_semaphores[loop] = asyncio.Semaphore(GMAIL_MAX_CONCURRENCY)
+    return semaphore
+
+async def aget_email_details(email_id: str, headers: dict, params: Optional[dict] = None) -> Optional[EmailRecord]:
+    """Get detailed information for a specific email (the full message unless params say otherwise)"""
+    try:
+        prefetcher = get_prefetcher() if params is None else None
+        prefetched = await prefetcher.aget(headers, email_id) if prefetcher is not None else None
+        if prefetched is not None:
+            return prefetched
+        
+        url = f"{GMAIL_API_BASE}/messages/{email_id}"
+        async with _detail_semaphore():
+            response = await get_async_client().get(url, headers=headers, params=params)
+        response.raise_for_status()
+        
+        return parse_email(email_id, fastjson.loads(response.content))
+        
+    except Exception as e:
+        print(f"Error getting email details: {str(e)}")
+        return None
+
+async def aget_emails_details(email_ids: List[str], headers: dict, params: Optional[dict] = None) -> List[EmailRecord]:
+    """Get detailed information for several emails concurrently, in list order"""
+    details = await asyncio.gather(*(aget_email_details(email_id, headers, params) for email_id in email_ids))
+    return [email_detail for email_detail in details if email_detail]
+
+async def aget_full_email(email_id: str, headers: dict) -> Optional[EmailRecord]:
+    """The full message, body included, from the cache when it holds the body"""
+    cache = get_mail_cache()
+    if cache is not None:
+        cached = (await asyncio.to_thread(cache.get, [email_id])).get(email_id)
+        if is_full_email(cached):
+            return cached
+    
+    email_detail = await aget_email_details(email_id, headers)
+    if email_detail is not None and cache is not None:
+        await asyncio.to_thread(cache.upsert, [email_detail])
+    return email_detail
+
+async def aread_email(input: ReadEmailInput) -> ReadEmailOutput:
+    """Read a specific email by ID"""
+    try:
+        headers = get_gmail_service()
+        email_detail = await aget_full_email(input.email_id, headers)
+        
+        if not email_detail:
+            return ReadEmailOutput(success=False, message="❌ Email not found or could not be read")
+        
+        return ReadEmailOutput.model_construct(
+            success=True,
+            message=f"📧 Email: {email_detail.subject}",
+            email=email_detail
+        )
+        
+    except Exception as e:
+        return ReadEmailOutput(success=False, message=f"❌ Error reading email: {str(e)}")
+
+async def aget_thread(input: GetThreadInput) -> GetThreadOutput:
+    """Get a whole conversation in one users.threads.get call"""
+    if get_mail_cache() is not None:
+        return await asyncio.to_thread(get_thread, input)
+    
+    try:
+        if not input.thread_id and not input.email_id:
+            return GetThreadOutput(success=False, message="❌ Give a thread_id or an email_id")
+        
+        headers = get_gmail_service()
+        client = get_async_client()
+        thread_id = input.thread_id
+        if not thread_id:
+            async with _detail_semaphore():
+                response = await client.get(f"{GMAIL_API_BASE}/messages/{input.email_id}", headers=headers,
+                                            params=THREAD_ID_PARAMS)
+            if response.status_code != 404:
+                response.raise_for_status()
+                thread_id = fastjson.loads(response.content).get("threadId")
+        
+        emails = []
+        if thread_id:
+            async with _detail_semaphore():
+                response = await client.get(f"{GMAIL_API_BASE}/threads/{thread_id}", headers=headers)
+            if response.status_code != 404:
+                response.raise_for_status()
+                emails = parse_thread(fastjson.loads(response.content))
+        
+        if not emails:
+            return GetThreadOutput(success=False, message="❌ Thread not found")
+        return thread_output(thread_id, emails, "remote")
+        
+    except Exception as e:
+        return GetThreadOutput(success=False, message=f"❌ Error fetching thread: {str(e)}")
+
+async def aget_reply_context(email_id: str, headers: dict) -> Optional[dict]:
+    """Headers and thread of the email being replied to, or None if it does not exist"""
+    async with _detail_semaphore():
+        response = await get_async_client().get(f"{GMAIL_API_BASE}/messages/{email_id}", headers=headers, params=REPLY_PARAMS)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return parse_reply_context(fastjson.loads(response.content))
+
+async def adeliver_email(sender_email: str, input: SendEmailInput, headers: dict) -> SendEmailOutput:
+    """Send an email once the sender address is known"""
+    try:
+        if uses_upload(input):
+            # Spooling to a file and the chunked upload block, so they run in a worker thread
+            email_id = await asyncio.to_thread(post_email, sender_email, input, headers)
+        else:
+            payload = build_send_payload(sender_email, input)
+            async with _detail_semaphore():
+                response = await get_async_client().post(f"{GMAIL_API_BASE}/messages/send", headers=headers, json=payload)
+            check_auth(response, headers)
+            response.raise_for_status()
+            email_id = fastjson.loads(response.content).get("id")
+        
+        return SendEmailOutput(
+            success=True,
+            message=f"✅ Email sent successfully to {input.to}",
+            email_id=email_id
+        )
+        
+    except Exception as e:
+        return SendEmailOutput(success=False, message=f"❌ Error sending email: {str(e)}")
+
+async def asend_email(input: SendEmailInput) -> SendEmailOutput:
+    """Send an email using Gmail API, or queue it in the outbox when OUTBOX_PATH is set"""
+    try:
+        if get_outbox() is not None:
+            # Queueing is a local SQLite write, kept off the event loop
+            return await asyncio.to_thread(queue_email, input)
+        
+        return await asend_email_now(input)
+        
+    except Exception as e:
+        return SendEmailOutput(success=False, message=f"❌ Error sending email: {str(e)}")
+
+async def asend_email_now(input: SendEmailInput) -> SendEmailOutput:
+    """Send an email and wait for Gmail to accept it"""
+    try:
+        headers = get_gmail_service()
+        sender_email = await aget_sender_email(headers)
+        if not sender_email:
+            return SendEmailOutput(success=False, message="❌ Could not retrieve sender email address")
+        
+        return await adeliver_email(sender_email, input, headers)
+        
+    except Exception as e:
+        return SendEmailOutput(success=False, message=f"❌ Error sending email: {str(e)}")
+
+async def asend_emails(input: SendBulkEmailsInput) -> SendBulkEmailsOutput:
+    """Send several emails concurrently, resolving the sender address once for the whole batch (or queue them)"""
+    try:
+        if get_outbox() is not None:
+            # Queueing is a local write per email; the outbox workers do the sending
+            return await asyncio.to_thread(send_emails, input)
+        
+        headers = get_gmail_service()
+        sender_email = await aget_sender_email(headers)
+        if not sender_email:
+            return SendBulkEmailsOutput(success=False, message="❌ Could not retrieve sender email address")
+        
+        results = await asyncio.gather(*(adeliver_email(sender_email, email_input, headers) for email_input in input.emails))
+        return bulk_send_output(list(results))
+        
+    except Exception as e:
+        return SendBulkEmailsOutput(success=False, message=f"❌ Error sending emails: {str(e)}")
+
+async def astream_mail_merge(input: MailMergeInput) -> AsyncIterator[Union[MailMergeResult, MailMergeOutput]]:
+    """Send a mail merge, yielding each recipient's result as its send completes, then the totals.
+    
+    Closing the stream early stops the sends not yet started.
+    """
+    if get_outbox() is not None:
+        # Queueing is a local write per email; the outbox workers do the sending
+        output = await asyncio.to_thread(mail_merge, input)
+        for result in output.results or []:
+            yield result
+        output.results = None
+        yield output
+        return
+    
+    results = []
+    try:
+        if not input.recipients:
+            yield MailMergeOutput(success=False, message="❌ Give at least one recipient")
+            return
+        
+        emails = merge_emails(input)
+        headers = get_gmail_service()
+        sender_email = await aget_sender_email(headers)
+        if not sender_email:
+            yield MailMergeOutput(success=False, message="❌ Could not retrieve sender email address")
+            return
+        
+        async def send_one(index: int) -> MailMergeResult:
+            email_input = emails[index]
+            if isinstance(email_input, ValueError):
+                return merge_result(index, input.recipients[index].to, email_input)
+            return merge_result(index, input.recipients[index].to, await adeliver_email(sender_email, email_input, headers))
+        
+        async for result in abounded(send_one(index) for index in range(len(emails))):
+            results.append(result)
+            yield result
+        
+    except Exception as e:
+        yield MailMergeOutput(success=False, message=f"❌ Error sending mail merge: {str(e)}",
+                              sent=sum(1 for r in results if r.success), failed=sum(1 for r in results if not r.success))
+        return
+    
+    yield mail_merge_output(results, include_results=False)
+
+async def amail_merge(input: MailMergeInput) -> MailMergeOutput:
+    """Send a mail merge concurrently; every recipient's result, in recipient order"""
+    results = []
+    async for item in astream_mail_merge(input):
+        if isinstance(item, MailMergeOutput):
+            return mail_merge_output(results, queued=get_outbox() is not None) if item.success else item
+        results.append(item)
+
+async def aiter_message_pages(headers: dict, params: dict, limit: Optional[int] = None,
+                              page_token: Optional[str] = None) -> AsyncIterator[Tuple[List[str], Optional[str]]]:
+    """Walk messages.list, yielding (message ids, next page token) one page at a time"""
+    client = get_async_client()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_params = dict(params, maxResults=LIST_PAGE_SIZE if remaining is None else min(LIST_PAGE_SIZE, remaining))
+        if page_token:
+            page_params["pageToken"] = page_token
+        response = await client.get(f"{GMAIL_API_BASE}/messages", headers=headers, params=page_params)
+        response.raise_for_status()
+        data = fastjson.loads(response.content)
+        
+        ids = [msg["id"] for msg in data.get("messages", [])]
+        page_token = data.get("nextPageToken")
+        if remaining is not None:
+            remaining -= len(ids)
+        yield ids, page_token
+        if not page_token:
+            return
+
+async def alist_emails_page(headers: dict, params: dict, limit: int, position: dict) -> Tuple[List[EmailRecord], Optional[dict]]:
+    """One page of a listing from Gmail: the emails and the position after them"""
+    page_token = position.get("p")
+    skip = position.get("o", 0)
+    emails = []
+    next_token = None
+    
+    async for ids, next_token in aiter_message_pages(headers, params, limit + skip, page_token):
+        if skip:
+            dropped = min(skip, len(ids))
+            ids, skip = ids[dropped:], skip - dropped
+        emails.extend(await aget_emails_details(ids, headers, LISTING_PARAMS))
+    
+    return emails, ({"p": next_token} if next_token else None)
+
+async def aget_emails(input: GetEmailsInput) -> GetEmailsOutput:
+    """Get emails from Gmail"""
+    if get_mail_cache() is not None:
+        # The cache path does SQLite and batch work; keep it off the event loop
+        return await asyncio.to_thread(get_emails, input)
+    
+    try:
+        headers = get_gmail_service()
+        input = input.model_copy(update={"label": await aresolve_label(headers, input.label)})
+        scope = listing_scope(input.query, input.label)
+        emails, next_position = await alist_emails_page(headers, get_emails_params(input), input.max_results,
+                                                        decode_cursor(input.cursor, scope))
+        if not emails:
+            return GetEmailsOutput(success=True, message="📭 No emails found")
+        
+        prefetch_listing(headers, emails)
+        next_cursor = encode_cursor(next_position, scope)
+        return GetEmailsOutput.model_construct(
+            success=True,
+            message=listing_message("📧 Recent emails:", emails, next_cursor),
+            emails=emails,
+            next_cursor=next_cursor
+        )
+        
+    except Exception as e:
+        return GetEmailsOutput(success=False, message=f"❌ Error fetching emails: {str(e)}")
+
+async def asearch_emails(input: SearchEmailsInput) -> SearchEmailsOutput:
+    """Search emails using Gmail search syntax"""
+    if get_mail_cache() is not None:
+        return await asyncio.to_thread(search_emails, input)
+    
+    try:
+        headers = get_gmail_service()
+        scope = listing_scope(input.query)
+        emails, next_position = await alist_emails_page(headers, {"q": input.query}, input.max_results,
+                                                        decode_cursor(input.cursor, scope))
+        if not emails:
+            return SearchEmailsOutput(success=True, message=f"🔍 No emails found for query: {input.query}", source="remote")
+        
+        prefetch_listing(headers, emails)
+        next_cursor = encode_cursor(next_position, scope)
+        return SearchEmailsOutput.model_construct(
+            success=True,
+            message=listing_message(f"🔍 Search results for '{input.query}':", emails, next_cursor),
+            emails=emails,
+            next_cursor=next_cursor,
+            source="remote"
+        )
+        
+    except Exception as e:
+        return SearchEmailsOutput(success=False, message=f"❌ Error searching emails: {str(e)}")
+
+T = TypeVar("T")
+
+async def abounded(calls: Iterator[Awaitable[T]]) -> AsyncIterator[T]:
+    """Yield the results of awaitables as they complete.
+    
+    At most GMAIL_MAX_CONCURRENCY run ahead of the consumer, so a slow reader
+    holds back the work instead of piling up finished results, and the rest
+    of calls is never started once the consumer goes away.
+    """
+    pending = set()
+    try:
+        while True:
+            for call in calls:
+                pending.add(asyncio.ensure_future(call))
+                if len(pending) >= GMAIL_MAX_CONCURRENCY:
+                    break
+            if not pending:
+                return
+            
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # The consumer went away (e.g. the client disconnected)
+        for task in pending:
+            task.cancel()
+
+async def astream_emails_details(email_ids: List[str], headers: dict,
+                                 params: Optional[dict] = None) -> AsyncIterator[EmailRecord]:
+    """Yield emails as their detail fetches complete, at most GMAIL_MAX_CONCURRENCY ahead of the consumer"""
+    async for email_detail in abounded(aget_email_details(email_id, headers, params) for email_id in email_ids):
+        if email_detail:
+            yield email_detail
+
+async def astream_listing(headers: dict, params: dict, limit: int, position: dict,
+                          scope: str) -> AsyncIterator[Union[EmailRecord, EmailStreamSummary]]:
+    """Stream one listing page: each email as it arrives, then a summary with the next cursor"""
+    page_token = position.get("p")
+    skip = position.get("o", 0)
+    count = 0
+    next_token = None
+    
+    async for ids, next_token in aiter_message_pages(headers, params, limit + skip, page_token):
+        if skip:
+            dropped = min(skip, len(ids))
+            ids, skip = ids[dropped:], skip - dropped
+        async for email_detail in astream_emails_details(ids, headers, LISTING_PARAMS):
+            count += 1
+            yield email_detail
+    
+    yield EmailStreamSummary(
+        success=True,
+        message=f"📧 Streamed {count} emails" if count else "📭 No emails found",
+        count=count,
+        next_cursor=encode_cursor({"p": next_token} if next_token else None, scope)
+    )
+
+async def astream_cached(output: Union[GetEmailsOutput, SearchEmailsOutput]) -> AsyncIterator[Union[EmailRecord, EmailStreamSummary]]:
+    """Replay a finished listing as a stream"""
+    for email_detail in output.emails or []:
+        yield email_detail
+    yield EmailStreamSummary(
+        success=output.success,
+        message=output.message if not output.success else f"📧 Streamed {len(output.emails or [])} emails",
+        count=len(output.emails or []),
+        next_cursor=output.next_cursor,
+        source=getattr(output, "source", None)
+    )
+
+async def astream_emails(input: GetEmailsInput) -> AsyncIterator[Union[EmailRecord, EmailStreamSummary]]:
+    """Stream emails from Gmail as their details arrive, ending with a summary"""
+    if get_mail_cache() is not None:
+        # Cached listings are answered at once; there is nothing to stream
+        async for item in astream_cached(await asyncio.to_thread(get_emails, input)):
+            yield item
+        return
+    
+    count = 0
+    try:
+        headers = get_gmail_service()
+        input = input.model_copy(update={"label": await aresolve_label(headers, input.label)})
+        scope = listing_scope(input.query, input.label)
+        position = decode_cursor(input.cursor, scope)
+        async for item in astream_listing(headers, get_emails_params(input), input.max_results, position, scope):
+            count += isinstance(item, EmailRecord)
+            yield item
+        
+    except Exception as e:
+        yield EmailStreamSummary(success=False, message=f"❌ Error fetching emails: {str(e)}", count=count)
+
+async def astream_search_emails(input: SearchEmailsInput) -> AsyncIterator[Union[EmailRecord, EmailStreamSummary]]:
+    """Stream search results as their details arrive, ending with a summary"""
+    if get_mail_cache() is not None:
+        async for item in astream_cached(await asyncio.to_thread(search_emails, input)):
+            yield item
+        return
+    
+    count = 0
+    try:
+        headers = get_gmail_service()
+        scope = listing_scope(input.query)
+        position = decode_cursor(input.cursor, scope)
+        async for item in astream_listing(headers, {"q": input.query}, input.max_results, position, scope):
+            if isinstance(item, EmailStreamSummary):
+                item.source = "remote"
+            count += isinstance(item, EmailRecord)
+            yield item
+        
+    except Exception as e:
+        yield EmailStreamSummary(success=False, message=f"❌ Error searching emails: {str(e)}", count=count)
+
+async def aselect_bulk_ids(email_ids: Optional[List[str]], query: Optional[str], max_emails: int,
+                           headers: dict) -> List[str]:
+    """Ids a bulk operation applies to: the given ids (duplicates dropped) or a search's matches"""
+    if email_ids:
+        return list(dict.fromkeys(email_ids))
+    ids = []
+    async for page_ids, _ in aiter_message_pages(headers, {"q": query}, limit=max_emails):
+        ids.extend(page_ids)
+    return ids
+
+async def apost_bulk_chunk(action: str, payload: dict, headers: dict) -> Optional[str]:
+    """Run one batchModify/batchDelete call; returns the error, or None on success"""
+    try:
+        async with _detail_semaphore():
+            response = await get_async_client().post(f"{GMAIL_API_BASE}/messages/{action}", headers=headers, json=payload)
+        check_auth(response, headers)
+        response.raise_for_status()
+        return None
+    except Exception as e:
+        return str(e)
+
+async def adelete_email(input: DeleteEmailInput) -> DeleteEmailOutput:
+    """Delete an email by ID"""
+    try:
+        headers = get_gmail_service()
+        async with _detail_semaphore():
+            response = await get_async_client().delete(f"{GMAIL_API_BASE}/messages/{input.email_id}", headers=headers)
+        response.raise_for_status()
+        
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        cache = get_mail_cache()
+        if cache is not None:
+            await asyncio.to_thread(cache.remove, [input.email_id])
+        
+        return DeleteEmailOutput(success=True, message="✅ Email deleted successfully")
+        
+    except Exception as e:
+        return DeleteEmailOutput(success=False, message=f"❌ Error deleting email: {str(e)}")
+
+async def aget_labels(input: GetLabelsInput) -> GetLabelsOutput:
+    """Get all Gmail labels, from the label directory cache"""
+    try:
+        directory = await aget_labels_directory(get_gmail_service())
+        labels = list(directory.names.values())
+        
+        return GetLabelsOutput(
+            success=True,
+            message=f"🏷️ Found {len(labels)} labels",
+            labels=labels,
+            label_ids={name: label_id for label_id, name in directory.names.items()}
+        )
+        
+    except Exception as e:
+        return GetLabelsOutput(success=False, message=f"❌ Error fetching labels: {str(e)}")
+
+async def amodify_email_labels(email_id: str, add: List[str], remove: List[str]):
+    """messages.modify for one email, mirrored in the mailbox cache; raises on failure"""
+    headers = get_gmail_service()
+    async with _detail_semaphore():
+        response = await get_async_client().post(f"{GMAIL_API_BASE}/messages/{email_id}/modify", headers=headers,
+                                                 json={"addLabelIds": add, "removeLabelIds": remove})
+    response.raise_for_status()
+    
+    invalidate_label_counts(headers)
+    forget_prefetched(headers)
+    cache = get_mail_cache()
+    if cache is not None:
+        await asyncio.to_thread(cache.modify_labels, email_id, add=add, remove=remove)
+
+async def amark_as_read(input: MarkAsReadInput) -> MarkAsReadOutput:
+    """Mark an email as read"""
+    try:
+        await amodify_email_labels(input.email_id, add=[], remove=["UNREAD"])
+        return MarkAsReadOutput(success=True, message="✅ Email marked as read")
+        
+    except Exception as e:
+        return MarkAsReadOutput(success=False, message=f"❌ Error marking email as read: {str(e)}")
+
+async def amark_as_unread(input: MarkAsUnreadInput) -> MarkAsUnreadOutput:
+    """Mark an email as unread"""
+    try:
+        await amodify_email_labels(input.email_id, add=["UNREAD"], remove=[])
+        return MarkAsUnreadOutput(success=True, message="✅ Email marked as unread")
+        
+    except Exception as e:
+        return MarkAsUnreadOutput(success=False, message=f"❌ Error marking email as unread: {str(e)}")
+
+async def aget_label_resource(label_id: str, headers: dict) -> dict:
+    async with _detail_semaphore():
+        response = await get_async_client().get(f"{GMAIL_API_BASE}/labels/{label_id}", headers=headers)
+    response.raise_for_status()
+    return fastjson.loads(response.content)
+
+async def aget_mailbox_stats(input: GetMailboxStatsInput) -> GetMailboxStatsOutput:
+    """Unread and total counts per label; the labels' counters are fetched concurrently"""
+    try:
+        if not input.labels:
+            return GetMailboxStatsOutput(success=False, message="❌ Give at least one label")
+        
+        headers = get_gmail_service()
+        label_ids = list(dict.fromkeys([await aresolve_label(headers, label) for label in input.labels]))
+        max_age = GMAIL_STATS_TTL if input.max_staleness_seconds is None else input.max_staleness_seconds
+        resources = cached_counts(headers, label_ids, max_age)
+        missing = [label_id for label_id in label_ids if label_id not in resources]
+        if missing:
+            fetched = dict(zip(missing, await asyncio.gather(*(aget_label_resource(label_id, headers) for label_id in missing))))
+            store_counts(headers, fetched)
+            resources.update(fetched)
+        
+        return stats_output(label_ids, resources)
+        
+    except Exception as e:
+        return GetMailboxStatsOutput(success=False, message=f"❌ Error fetching mailbox statistics: {str(e)}")
+
+async def abulk_modify_emails(input: BulkModifyEmailsInput) -> BulkModifyEmailsOutput:
+    """Add and remove labels on many emails; the batchModify chunks run concurrently"""
+    try:
+        error = bulk_selection_error(input.email_ids, input.query)
+        if error is None and not input.add_labels and not input.remove_labels:
+            error = "❌ Give labels to add or remove"
+        if error:
+            return BulkModifyEmailsOutput(success=False, message=error)
+        
+        headers = get_gmail_service()
+        chunks = bulk_chunks(await aselect_bulk_ids(input.email_ids, input.query, input.max_emails, headers))
+        errors = await asyncio.gather(
+            *(apost_bulk_chunk("batchModify", bulk_modify_payload(input, chunk), headers) for chunk in chunks)
+        )
+        results = bulk_results(chunks, errors)
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        cache = get_mail_cache()
+        if cache is not None:
+            await asyncio.to_thread(apply_bulk_modify, cache, input, results)
+        
+        return BulkModifyEmailsOutput(**bulk_summary("Modified", results))
+        
+    except Exception as e:
+        return BulkModifyEmailsOutput(success=False, message=f"❌ Error modifying emails: {str(e)}")
+
+async def abulk_delete_emails(input: BulkDeleteEmailsInput) -> BulkDeleteEmailsOutput:
+    """Permanently delete many emails; the batchDelete chunks run concurrently"""
+    try:
+        error = bulk_selection_error(input.email_ids, input.query)
+        if error:
+            return BulkDeleteEmailsOutput(success=False, message=error)
+        
+        headers = get_gmail_service()
+        chunks = bulk_chunks(await aselect_bulk_ids(input.email_ids, input.query, input.max_emails, headers))
+        errors = await asyncio.gather(*(apost_bulk_chunk("batchDelete", {"ids": chunk}, headers) for chunk in chunks))
+        results = bulk_results(chunks, errors)
+        invalidate_label_counts(headers)
+        forget_prefetched(headers)
+        cache = get_mail_cache()
+        if cache is not None:
+            await asyncio.to_thread(apply_bulk_delete, cache, results)
+        
+        return BulkDeleteEmailsOutput(**bulk_summary("Deleted", results))
+        
+    except Exception as e:
+        return BulkDeleteEmailsOutput(success=False, message=f"❌ Error deleting emails: {str(e)}")
+
+async def aattachment_metadata(message_id: str, attachment_id: str, headers: dict) -> dict:
+    """Filename and MIME type of an attachment, from its message's parts; generic values if it is not listed"""
+    email_detail = await aget_full_email(message_id, headers)
+    for attachment in (email_detail.attachments if email_detail is not None else None) or []:
+        if attachment.attachment_id == attachment_id:
+            return {"filename": attachment.filename or None, "mime_type": attachment.mime_type}
+    return {"filename": None, "mime_type": "application/octet-stream"}
+
+def cached_attachment(cache: AttachmentCache, input: GetAttachmentInput) -> Optional[Tuple[str, int, Optional[dict]]]:
+    """A cached attachment's path, size and stored metadata, or None when it is not cached"""
+    path = cache.get(input.message_id, input.attachment_id)
+    if path is None:
+        return None
+    return path, os.path.getsize(path), cache.metadata(input.message_id, input.attachment_id)
+
+async def astream_attachment(input: GetAttachmentInput) -> AsyncIterator[Union[GetAttachmentOutput, bytes]]:
+    """Download an attachment: a header saying whether it started, then its bytes as they are decoded"""
+    started = False
+    lookup = None
+    try:
+        headers = get_gmail_service()
+        cache = get_attachment_cache()
+        # Every touch of the cache directory runs in a worker thread
+        cached = await asyncio.to_thread(cached_attachment, cache, input) if cache is not None else None
+        if cached is not None:
+            cached, size, metadata = cached
+            if metadata is None:
+                metadata = await aattachment_metadata(input.message_id, input.attachment_id, headers)
+            started = True
+            yield GetAttachmentOutput(
+                success=True, message="📎 Attachment served from cache", size=size, cached=True, **metadata
+            )
+            chunks = read_chunks(cached)
+            try:
+                # Reads from the memory map can fault pages in from disk, so they run in a worker thread
+                while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                    yield chunk
+            finally:
+                chunks.close()
+            return
+        
+        url = f"{GMAIL_API_BASE}/messages/{input.message_id}/attachments/{input.attachment_id}"
+        # The part metadata is looked up while the download starts
+        lookup = asyncio.ensure_future(aattachment_metadata(input.message_id, input.attachment_id, headers))
+        async with get_async_client().stream("GET", url, headers=headers) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                check_auth(response, headers)
+                response.raise_for_status()
+            
+            metadata = await lookup
+            started = True
+            yield GetAttachmentOutput(success=True, message="📎 Downloading attachment", **metadata)
+            decoder = DataFieldDecoder()
+            # Only a complete download is kept; an unfinished file is discarded
+            sink, temp_path = await asyncio.to_thread(cache.begin) if cache is not None else (None, None)
+            completed = False
+            try:
+                async for chunk in response.aiter_bytes(CHUNK_BYTES):
+                    data = decoder.feed(chunk)
+                    if data:
+                        if sink is not None:
+                            await asyncio.to_thread(sink.write, data)
+                        yield data
+                decoder.close()
+                completed = True
+            finally:
+                if sink is not None:
+                    if completed:
+                        await asyncio.to_thread(cache.commit, sink, temp_path, input.message_id, input.attachment_id,
+                                                metadata)
+                    else:
+                        await asyncio.to_thread(cache.discard, sink, temp_path)
+        
+    except Exception as e:
+        # Once bytes have gone out the status is sent; the error ends the response instead
+        if started:
+            raise
+        yield GetAttachmentOutput(success=False, message=f"❌ Error downloading attachment: {str(e)}")
+    finally:
+        if lookup is not None:
+            lookup.cancel()
+
+async def areply_to_email(input: ReplyToEmailInput) -> ReplyToEmailOutput:
+    """Reply to an email"""
+    try:
+        headers = get_gmail_service()
+        context = await aget_reply_context(input.email_id, headers)
+        if not context:
+            return ReplyToEmailOutput(success=False, message="❌ Original email not found")
+        original_email = await aget_full_email(input.email_id, headers) if input.quote_original else None
+        
+        reply_result = await asend_email_now(build_reply_input(context, input, original_email.body if original_email else None))
+        
+        if reply_result.success:
+            return ReplyToEmailOutput(
+                success=True,
+                message=f"✅ Reply sent successfully to {context['reply_to']}",
+                reply_id=reply_result.email_id
+            )
+        else:
+            return ReplyToEmailOutput(success=False, message=reply_result.message)
+        
+    except Exception as e:
+        return ReplyToEmailOutput(success=False, message=f"❌ Error replying to email: {str(e)}")
+
+async def aforward_email(input: ForwardEmailInput) -> ForwardEmailOutput:
+    """Forward an email"""
+    try:
+        original_email = await aget_full_email(input.email_id, get_gmail_service())
+        if not original_email:
+            return ForwardEmailOutput(success=False, message="❌ Original email not found")
+        
+        forward_result = await asend_email_now(build_forward_input(original_email, input))
+        
+        if forward_result.success:
+            return ForwardEmailOutput(
+                success=True,
+                message=f"✅ Email forwarded successfully to {input.forward_to}",
+                forward_id=forward_result.email_id
+            )
+        else:
+            return ForwardEmailOutput(success=False, message=forward_result.message)
+        
+    except Exception as e:
+        return ForwardEmailOutput(success=False, message=f"❌ Error forwarding email: {str(e)}")
@@ -0,0 +1,185 @@
+# app/services/gmail_upload.py
+
+"""
+Sending messages with attachments.
+
+``messages.send`` with a JSON ``raw`` field needs the whole message in memory,
+base64url encoded inside the request body, and Gmail caps such requests at
+5 MB. Messages with attachments are instead written to a temporary file: the
+headers and text part first, then each attachment read through a memory map
+and base64 encoded a piece at a time. Small results are still sent as
+``raw``. Larger ones go through Gmail's resumable upload
+(``uploadType=resumable``) in GMAIL_UPLOAD_CHUNK_BYTES requests whose bodies
+are streamed from a memory map of the file, so memory use stays flat whatever
+the message size.
+
+A dropped connection or a 5xx during the upload asks Gmail how many bytes it
+already has (``Content-Range: bytes */size``) and carries on from there.
+
+Attachments are local files under ATTACHMENT_UPLOAD_DIR. Paths outside it are
+refused, and with no directory set attachments are turned off.
+"""
+
+import base64
+import mimetypes
+import mmap
+import os
+import tempfile
+import time
+import uuid
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from typing import BinaryIO, Iterator, List, Optional
+
+import httpx
+
+from app import fastjson
+from app.config import ATTACHMENT_UPLOAD_DIR, GMAIL_MAX_RETRIES, GMAIL_UPLOAD_CHUNK_BYTES
+from app.services.gmail_attachments import CHUNK_BYTES, read_chunks
+from app.services.gmail_client import GMAIL_API_BASE, GMAIL_UPLOAD_BASE, get_client
+from app.services.gmail_profile import check_auth
+from app.services.gmail_quota import RETRY_STATUSES, backoff_delay
+
+# Largest message sent as a JSON raw field; base64 grows it by a third and Gmail caps simple uploads at 5 MB
+SIMPLE_UPLOAD_MAX_BYTES = 3 * 1024 * 1024
+
+# Resumable upload requests must carry a multiple of this, except the last one
+_CHUNK_UNIT = 256 * 1024
+# 57 bytes make one 76-character base64 line, so whole-line reads encode as one continuous stream
+_ENCODE_BYTES = 57 * 1152
+
+
+def chunk_bytes() -> int:
+    """Bytes sent per resumable upload request"""
+    return max(_CHUNK_UNIT, GMAIL_UPLOAD_CHUNK_BYTES // _CHUNK_UNIT * _CHUNK_UNIT)
+
+
+def attachment_path(path: str) -> str:
+    """The real path of an attachment under ATTACHMENT_UPLOAD_DIR; raises ValueError for any other file"""
+    if not ATTACHMENT_UPLOAD_DIR:
+        raise ValueError("Attachments are disabled (set ATTACHMENT_UPLOAD_DIR)")
+    root = os.path.realpath(ATTACHMENT_UPLOAD_DIR)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root or not os.path.isfile(full):
+        raise ValueError(f"No attachment '{path}' in the upload directory")
+    return full
+
+
+def _part_headers(path: str) -> bytes:
+    mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    part = MIMEBase(*mime_type.split("/", 1))
+    del part["MIME-Version"]
+    part["Content-Transfer-Encoding"] = "base64"
+    part.add_header("Content-Disposition", "attachment", filename=os.path.basename(path))
+    return part.as_bytes()
+
+
+def write_message(out: BinaryIO, message: MIMEMultipart, paths: List[str]) -> int:
+    """Write message to out with the files at paths attached; returns its size in bytes"""
+    boundary = f"==============={uuid.uuid4().hex}=="
+    message.set_boundary(boundary)
+    closing = f"--{boundary}--\n".encode()
+    head = message.as_bytes()
+    out.write(head[:head.rindex(closing)])
+    for path in paths:
+        out.write(f"--{boundary}\n".encode() + _part_headers(path))
+        for chunk in read_chunks(path, _ENCODE_BYTES):
+            out.write(base64.encodebytes(chunk))
+    out.write(closing)
+    out.flush()
+    return out.tell()
+
+
+def _send_raw(mapped: mmap.mmap, metadata: dict, headers: dict) -> dict:
+    payload = dict(metadata, raw=base64.urlsafe_b64encode(mapped[:]).decode())
+    response = get_client().post(f"{GMAIL_API_BASE}/messages/send", headers=headers, json=payload)
+    check_auth(response, headers)
+    response.raise_for_status()
+    return fastjson.loads(response.content)
+
+
+def start_upload(size: int, metadata: dict, headers: dict) -> str:
+    """Open a resumable upload of a size-byte message; returns the session URL"""
+    response = get_client().post(
+        f"{GMAIL_UPLOAD_BASE}/messages/send",
+        params={"uploadType": "resumable"},
+        headers={**headers, "X-Upload-Content-Type": "message/rfc822", "X-Upload-Content-Length": str(size)},
+        json=metadata,
+    )
+    check_auth(response, headers)
+    response.raise_for_status()
+    return response.headers["Location"]
+
+
+class MappedRange:
+    """Bytes start:end of a memory map as a request body, read CHUNK_BYTES at a time (again on a retry)"""
+
+    def __init__(self, mapped: mmap.mmap, start: int, end: int):
+        self.mapped = mapped
+        self.start = start
+        self.end = end
+
+    def __iter__(self) -> Iterator[bytes]:
+        for position in range(self.start, self.end, CHUNK_BYTES):
+            yield self.mapped[position:min(position + CHUNK_BYTES, self.end)]
+
+
+def _received(response: httpx.Response) -> int:
+    """Bytes Gmail holds, from the Range header ("bytes=0-1234") of a 308 answer"""
+    received = response.headers.get("Range")
+    return int(received.rsplit("-", 1)[1]) + 1 if received else 0
+
+
+def upload(mapped: mmap.mmap, metadata: dict, headers: dict) -> dict:
+    """Send a message through a resumable upload, resuming after dropped connections; returns Gmail's answer"""
+    size = len(mapped)
+    session = start_upload(size, metadata, headers)
+    client = get_client()
+    step = chunk_bytes()
+    offset = 0
+    failures = 0
+    resume = False
+    while True:
+        try:
+            if resume:
+                # Ask how much of the last request arrived before sending anything again
+                response = client.put(session, headers={**headers, "Content-Range": f"bytes */{size}"})
+            else:
+                end = min(offset + step, size)
+                response = client.put(session, headers={**headers, "Content-Range": f"bytes {offset}-{end - 1}/{size}",
+                                                         "Content-Length": str(end - offset)},
+                                      content=MappedRange(mapped, offset, end))
+        except httpx.TransportError:
+            if failures >= GMAIL_MAX_RETRIES:
+                raise
+        else:
+            if response.status_code in (200, 201):
+                return fastjson.loads(response.content)
+            if response.status_code == 308:
+                received = _received(response)
+                if received > offset:
+                    failures = 0
+                if received > offset or resume:
+                    offset, resume = received, False
+                    continue
+                # A chunk went through without Gmail keeping any of it; count it like an error
+                if failures >= GMAIL_MAX_RETRIES:
+                    raise RuntimeError(f"Upload stuck at byte {offset} of {size}")
+            elif response.status_code not in RETRY_STATUSES or failures >= GMAIL_MAX_RETRIES:
+                check_auth(response, headers)
+                response.raise_for_status()
+                raise RuntimeError(f"Unexpected upload answer {response.status_code}")
+        time.sleep(backoff_delay(failures))
+        failures += 1
+        resume = True
+
+
+def send_message(message: MIMEMultipart, paths: List[str], headers: dict, thread_id: Optional[str] = None) -> Optional[str]:
+    """messages.send for a MIME message with the files at paths attached; returns the Gmail id and raises on failure"""
+    files = [attachment_path(path) for path in paths]
+    metadata = {"threadId": thread_id} if thread_id else {}
+    with tempfile.TemporaryFile() as spool:
+        size = write_message(spool, message, files)
+        with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            sent = _send_raw(mapped, metadata, headers) if size <= SIMPLE_UPLOAD_MAX_BYTES else upload(mapped, metadata, headers)
+    return sent.get("id")
@@ -0,0 +1,415 @@
+# app/services/mail_cache.py
+
+"""
+On-disk mailbox cache (SQLite in WAL mode).
+
+Stores message metadata and, once fetched, bodies by message id, plus the
+Gmail ``historyId`` the cache is current with. gmail_service keeps it in sync
+(a paginated bulk load first, then ``users.history.list``) and serves repeat
+listings and reads from it.
+
+The cache is bounded: past MAIL_CACHE_MAX_MESSAGES the least recently used
+messages are dropped, and past MAIL_CACHE_MAX_BODY_BYTES the least recently
+used bodies are dropped (their metadata stays).
+
+Cached messages are also full-text indexed (see mail_index), so supported
+searches can be answered locally, and indexed by thread and Message-ID, so
+cached conversations can be rebuilt without asking Gmail.
+
+Disabled unless MAIL_CACHE_PATH is set.
+"""
+
+import sqlite3
+from dataclasses import asdict
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from app import fastjson
+from app.config import MAIL_CACHE_PATH, MAIL_CACHE_MAX_MESSAGES, MAIL_CACHE_MAX_BODY_BYTES
+from app.schema.gmail_schema import AttachmentRecord, EmailRecord
+from app.services import gmail_mime, mail_index
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER NOT NULL DEFAULT 0,
+    subject TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    date TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    snippet TEXT,
+    has_attachments INTEGER NOT NULL DEFAULT 0,
+    body TEXT,
+    body_size INTEGER NOT NULL DEFAULT 0,
+    attachments TEXT,
+    message_id TEXT,
+    refs TEXT,
+    body_indexed INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_date ON messages(internal_date DESC);
+CREATE INDEX IF NOT EXISTS messages_by_access ON messages(last_access);
+CREATE TABLE IF NOT EXISTS message_labels (
+    label TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    PRIMARY KEY (label, message_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Columns added after the table was first shipped; older cache files gain them on open
+_ADDED_COLUMNS = {"attachments": "TEXT", "message_id": "TEXT", "refs": "TEXT",
+                  "body_indexed": "INTEGER NOT NULL DEFAULT 0"}
+
+# Marks the messages whose whole body is cached, and so indexed (see gmail_mime.is_truncated)
+_MARK_BODIES_INDEXED = ("UPDATE messages SET body_indexed = "
+                        "body IS NOT NULL AND body NOT LIKE '%[… message truncated after % bytes]'")
+
+# Indexes on added columns, created once the columns exist
+INDEXES = """
+CREATE INDEX IF NOT EXISTS messages_by_thread ON messages(thread_id, internal_date);
+CREATE INDEX IF NOT EXISTS messages_by_message_id ON messages(message_id);
+"""
+
+_COLUMNS = ["id", "thread_id", "internal_date", "subject", "sender", "recipient", "date", "labels",
+            "snippet", "has_attachments", "message_id", "refs"]
+
+
+def _select(bodies: bool, alias: str = "") -> str:
+    """Column list for EmailRecord rows; listings skip the body and attachment columns entirely"""
+    columns = [alias + c for c in _COLUMNS]
+    if bodies:
+        columns.extend([f"{alias}body", f"{alias}attachments"])
+    else:
+        columns.extend(["NULL AS body", "NULL AS attachments"])
+    return ", ".join(columns)
+
+
+def _row_to_email(row: sqlite3.Row) -> EmailRecord:
+    return EmailRecord(
+        id=row["id"],
+        thread_id=row["thread_id"],
+        internal_date=row["internal_date"] or None,
+        subject=row["subject"],
+        sender=row["sender"],
+        recipient=row["recipient"],
+        date=row["date"],
+        labels=fastjson.loads(row["labels"]),
+        snippet=row["snippet"],
+        has_attachments=bool(row["has_attachments"]),
+        body=row["body"],
+        attachments=[AttachmentRecord(**a) for a in fastjson.loads(row["attachments"])] if row["attachments"] else None,
+        message_id=row["message_id"],
+        references=fastjson.loads(row["refs"]) if row["refs"] else None,
+    )
+
+
+class MailCache:
+    def __init__(self, path: str, max_messages: int = MAIL_CACHE_MAX_MESSAGES,
+                 max_body_bytes: int = MAIL_CACHE_MAX_BODY_BYTES):
+        self.path = path
+        self.max_messages = max_messages
+        self.max_body_bytes = max_body_bytes
+        self.sync_lock = threading.Lock()
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA + mail_index.SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(messages)")}
+            for column, declaration in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE messages ADD COLUMN {column} {declaration}")
+            if "body_indexed" not in existing:
+                # Bodies evicted before the flag existed may not be indexed; only cached ones are known to be
+                conn.execute(_MARK_BODIES_INDEXED)
+            conn.executescript(INDEXES)
+            # Caches created before the index (or with an older tokenizer) are reindexed once
+            if conn.execute("PRAGMA user_version").fetchone()[0] < mail_index.INDEX_VERSION:
+                mail_index.rebuild(conn, _row_to_email)
+                conn.execute(_MARK_BODIES_INDEXED)
+                conn.execute(f"PRAGMA user_version = {mail_index.INDEX_VERSION}")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -- sync state ----------------------------------------------------------
+
+    def get_state(self, key: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, **values):
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(key, str(value)) for key, value in values.items()],
+            )
+
+    @property
+    def history_id(self) -> Optional[str]:
+        return self.get_state("history_id")
+
+    def age(self) -> float:
+        """Seconds since the cache was last synced with Gmail (infinite if never)"""
+        synced_at = self.get_state("synced_at")
+        return time.time() - float(synced_at) if synced_at else float("inf")
+
+    def is_complete(self) -> bool:
+        """Whether the cache holds the whole mailbox rather than its newest messages"""
+        return self.get_state("complete") == "1"
+
+    # -- messages ------------------------------------------------------------
+
+    def upsert(self, emails: Iterable[EmailRecord]):
+        """Store emails; a None body or attachment list keeps whatever is already cached"""
+        emails = list(emails)
+        now = time.time()
+        rows = []
+        label_rows = []
+        for e in emails:
+            rows.append((
+                e.id, e.thread_id, e.internal_date or 0, e.subject, e.sender, e.recipient, e.date,
+                fastjson.dumps(e.labels or []), e.snippet, int(e.has_attachments), e.body,
+                len(e.body.encode("utf-8")) if e.body is not None else 0,
+                fastjson.dumps([asdict(a) for a in e.attachments]) if e.attachments is not None else None,
+                e.message_id, fastjson.dumps(e.references) if e.references is not None else None,
+                int(e.body is not None and not gmail_mime.is_truncated(e.body)), now,
+            ))
+            label_rows.extend((label, e.id) for label in e.labels or [])
+        if not rows:
+            return
+
+        with self._connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO messages (id, thread_id, internal_date, subject, sender, recipient, date,
+                                      labels, snippet, has_attachments, body, body_size, attachments,
+                                      message_id, refs, body_indexed, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    thread_id = excluded.thread_id,
+                    internal_date = MAX(messages.internal_date, excluded.internal_date),
+                    subject = excluded.subject,
+                    sender = excluded.sender,
+                    recipient = excluded.recipient,
+                    date = excluded.date,
+                    labels = excluded.labels,
+                    snippet = COALESCE(excluded.snippet, messages.snippet),
+                    has_attachments = excluded.has_attachments,
+                    body = COALESCE(excluded.body, messages.body),
+                    body_size = CASE WHEN excluded.body IS NULL THEN messages.body_size ELSE excluded.body_size END,
+                    attachments = COALESCE(excluded.attachments, messages.attachments),
+                    message_id = COALESCE(excluded.message_id, messages.message_id),
+                    refs = COALESCE(excluded.refs, messages.refs),
+                    body_indexed = MAX(messages.body_indexed, excluded.body_indexed),
+                    last_access = excluded.last_access
+                """,
+                rows,
+            )
+            conn.executemany("DELETE FROM message_labels WHERE message_id = ?", [(r[0],) for r in rows])
+            conn.executemany("INSERT OR IGNORE INTO message_labels (label, message_id) VALUES (?, ?)", label_rows)
+            mail_index.index_emails(conn, emails)
+        self.evict()
+
+    def get(self, email_ids: List[str], bodies: bool = True) -> Dict[str, EmailRecord]:
+        """Cached emails by id; ids that are not cached are missing from the result"""
+        if not email_ids:
+            return {}
+        conn = self._connection()
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(email_ids), 500):
+            chunk = email_ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT {_select(bodies)} FROM messages WHERE id IN ({marks})", chunk):
+                found[row["id"]] = _row_to_email(row)
+        self._touch(list(found))
+        return found
+
+    def thread(self, thread_id: str) -> List[EmailRecord]:
+        """Cached emails of a Gmail thread with their bodies, oldest first"""
+        rows = self._connection().execute(
+            f"SELECT {_select(True)} FROM messages WHERE thread_id = ? ORDER BY internal_date", (thread_id,)
+        ).fetchall()
+        emails = [_row_to_email(row) for row in rows]
+        self._touch([e.id for e in emails])
+        return emails
+
+    def thread_id_of(self, email_id: str) -> Optional[str]:
+        row = self._connection().execute("SELECT thread_id FROM messages WHERE id = ?", (email_id,)).fetchone()
+        return row["thread_id"] if row else None
+
+    def known_message_ids(self, message_ids: Iterable[str]) -> Set[str]:
+        """Which of these Message-ID headers belong to cached emails"""
+        message_ids = list(message_ids)
+        conn = self._connection()
+        known = set()
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            known.update(row[0] for row in conn.execute(
+                f"SELECT message_id FROM messages WHERE message_id IN ({marks})", chunk
+            ))
+        return known
+
+    def list(self, label: Optional[str] = None, limit: int = 10, offset: int = 0, bodies: bool = False) -> List[EmailRecord]:
+        """Newest cached emails, optionally restricted to a label id.
+
+        Like messages.list, spam and trash only show up when asked for by label.
+        """
+        conn = self._connection()
+        if label:
+            rows = conn.execute(
+                f"SELECT {_select(bodies, 'm.')} FROM messages m "
+                "JOIN message_labels l ON l.message_id = m.id WHERE l.label = ? "
+                "ORDER BY m.internal_date DESC LIMIT ? OFFSET ?",
+                (label, limit, offset),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT {_select(bodies)} FROM messages WHERE NOT EXISTS "
+                "(SELECT 1 FROM message_labels l WHERE l.message_id = messages.id AND l.label IN ('SPAM', 'TRASH')) "
+                "ORDER BY internal_date DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        emails = [_row_to_email(row) for row in rows]
+        self._touch([e.id for e in emails])
+        return emails
+
+    def search(self, parsed: mail_index.ParsedQuery, limit: int = 10, offset: int = 0) -> List[EmailRecord]:
+        """Newest cached emails matching a parsed search query"""
+        where, params = mail_index.where_clause(parsed)
+        rows = self._connection().execute(
+            f"SELECT {_select(False, 'm.')} FROM messages m WHERE {where} "
+            "ORDER BY m.internal_date DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        ).fetchall()
+        emails = [_row_to_email(row) for row in rows]
+        self._touch([e.id for e in emails])
+        return emails
+
+    def can_search(self, parsed: mail_index.ParsedQuery) -> bool:
+        """Whether search() gives the whole answer: free-text words need the bodies of all candidates indexed"""
+        if not parsed.needs_bodies:
+            return True
+        where, params = mail_index.where_clause(parsed, body_terms=False)
+        unread = self._connection().execute(
+            f"SELECT 1 FROM messages m WHERE {where} AND m.body_indexed = 0 LIMIT 1", params
+        ).fetchone()
+        return unread is None
+
+    def set_labels(self, email_id: str, labels: List[str]):
+        with self._connection() as conn:
+            conn.execute("UPDATE messages SET labels = ? WHERE id = ?", (fastjson.dumps(labels), email_id))
+            conn.execute("DELETE FROM message_labels WHERE message_id = ?", (email_id,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO message_labels (label, message_id) "
+                "SELECT ?, id FROM messages WHERE id = ?",
+                [(label, email_id) for label in labels],
+            )
+
+    def modify_labels(self, email_id: str, add: Iterable[str] = (), remove: Iterable[str] = ()):
+        row = self._connection().execute("SELECT labels FROM messages WHERE id = ?", (email_id,)).fetchone()
+        if row is None:
+            return
+        labels = [label for label in fastjson.loads(row["labels"]) if label not in set(remove)]
+        labels.extend(label for label in add if label not in labels)
+        self.set_labels(email_id, labels)
+
+    def remove(self, email_ids: Iterable[str]):
+        ids = [(email_id,) for email_id in email_ids]
+        with self._connection() as conn:
+            conn.executemany("DELETE FROM messages WHERE id = ?", ids)
+            conn.executemany("DELETE FROM message_labels WHERE message_id = ?", ids)
+
+    def retain_only(self, email_ids: Iterable[str]):
+        """Drop every cached message that is not in email_ids (after a full sync)"""
+        with self._connection() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_ids (id TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM keep_ids")
+            conn.executemany("INSERT OR IGNORE INTO keep_ids (id) VALUES (?)", [(i,) for i in email_ids])
+            conn.execute("DELETE FROM messages WHERE id NOT IN (SELECT id FROM keep_ids)")
+            conn.execute("DELETE FROM message_labels WHERE message_id NOT IN (SELECT id FROM keep_ids)")
+            mail_index.purge_orphans(conn)
+
+    def _touch(self, email_ids: List[str]):
+        if not email_ids:
+            return
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany("UPDATE messages SET last_access = ? WHERE id = ?", [(now, i) for i in email_ids])
+
+    # -- eviction ------------------------------------------------------------
+
+    def evict(self):
+        """Enforce the size bounds, least recently used first"""
+        conn = self._connection()
+        count, body_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(body_size), 0) FROM messages").fetchone()
+
+        with conn:
+            if count > self.max_messages:
+                conn.execute(
+                    "DELETE FROM messages WHERE id IN "
+                    "(SELECT id FROM messages ORDER BY last_access, internal_date LIMIT ?)",
+                    (count - self.max_messages,),
+                )
+                conn.execute("DELETE FROM message_labels WHERE message_id NOT IN (SELECT id FROM messages)")
+                mail_index.purge_orphans(conn)
+                # Listings can no longer be answered for the whole mailbox
+                conn.execute("DELETE FROM sync_state WHERE key = 'complete'")
+
+            if body_bytes > self.max_body_bytes:
+                excess = body_bytes - self.max_body_bytes
+                rows = conn.execute(
+                    "SELECT id, body_size FROM messages WHERE body IS NOT NULL ORDER BY last_access"
+                ).fetchall()
+                dropped = []
+                for row in rows:
+                    if excess <= 0:
+                        break
+                    dropped.append((row["id"],))
+                    excess -= row["body_size"]
+                conn.executemany("UPDATE messages SET body = NULL, body_size = 0 WHERE id = ?", dropped)
+
+    def stats(self) -> dict:
+        count, bodies, body_bytes = self._connection().execute(
+            "SELECT COUNT(*), COUNT(body), COALESCE(SUM(body_size), 0) FROM messages"
+        ).fetchone()
+        return {
+            "messages": count,
+            "bodies": bodies,
+            "body_bytes": body_bytes,
+            "history_id": self.history_id,
+            "age_seconds": self.age(),
+            "complete": self.is_complete(),
+        }
+
+
+_cache: Optional[MailCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_mail_cache() -> Optional[MailCache]:
+    """The process-wide mailbox cache, or None when MAIL_CACHE_PATH is not set"""
+    global _cache
+    if not MAIL_CACHE_PATH:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MailCache(MAIL_CACHE_PATH)
+    return _cache
@@ -0,0 +1,178 @@
+# app/services/mail_index.py
+
+"""
+Inverted index over cached mail, kept in the mailbox cache database.
+
+Each posting is a ``(term, message id)`` row. Terms are prefixed by the field
+they come from: ``s:`` subject, ``f:`` sender, ``t:`` recipient and ``b:``
+snippet or body. Messages never change once sent, so postings are only ever
+added. Body terms are added when a body is first cached and kept after the
+body is evicted. Postings of messages that left the cache are ignored by
+searches and purged in bulk.
+
+``parse_query`` understands the subset of Gmail search syntax these postings
+can answer. For anything else it returns None, and the search goes to Gmail.
+Field and label conditions only need the metadata every cached message has.
+Free-text words also match bodies, and most cached messages only have their
+snippet indexed (full syncs fetch metadata), so such a query is answered
+locally only while every message it could match has had its body indexed.
+"""
+
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+from app.schema.gmail_schema import EmailRecord
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    PRIMARY KEY (term, message_id)
+) WITHOUT ROWID;
+"""
+
+# Bumped when the tokenizer changes; older databases are reindexed on open
+INDEX_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MAX_TERM_LENGTH = 64
+
+FIELD_PREFIXES = {"subject": "s:", "from": "f:", "to": "t:"}
+FREE_TEXT_PREFIXES = ("s:", "f:", "t:", "b:")
+
+# is:/in:/label: values that map to Gmail system label ids
+SYSTEM_LABELS = {
+    "inbox": "INBOX", "sent": "SENT", "draft": "DRAFT", "drafts": "DRAFT", "spam": "SPAM",
+    "trash": "TRASH", "starred": "STARRED", "important": "IMPORTANT", "unread": "UNREAD",
+}
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased word tokens; email addresses split into their parts"""
+    if not text:
+        return []
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) <= MAX_TERM_LENGTH]
+
+
+@dataclass
+class ParsedQuery:
+    # Each group is a set of terms of which at least one must match
+    term_groups: List[Tuple[str, ...]] = field(default_factory=list)
+    labels: List[str] = field(default_factory=list)
+    without_labels: List[str] = field(default_factory=list)
+    has_attachment: bool = False
+
+    @property
+    def needs_bodies(self) -> bool:
+        """Whether a free-text word can match body text, which only read messages have indexed"""
+        return any(_is_body_group(group) for group in self.term_groups)
+
+
+def _is_body_group(group: Tuple[str, ...]) -> bool:
+    return any(term.startswith("b:") for term in group)
+
+
+def parse_query(query: str) -> Optional[ParsedQuery]:
+    """Parse the supported Gmail search subset; None if the query needs Gmail"""
+    parsed = ParsedQuery()
+    words = query.split()
+    if not words:
+        return None
+
+    for word in words:
+        # Quoting, grouping, negation, OR and wildcards are left to Gmail
+        if any(c in word for c in '"(){}*') or word.startswith("-") or word in ("OR", "AND"):
+            return None
+
+        operator, sep, value = word.partition(":")
+        operator = operator.lower()
+        if not sep:
+            tokens = tokenize(word)
+            if not tokens:
+                return None
+            parsed.term_groups.extend(tuple(p + t for p in FREE_TEXT_PREFIXES) for t in tokens)
+        elif operator in FIELD_PREFIXES:
+            tokens = tokenize(value)
+            if not tokens:
+                return None
+            parsed.term_groups.extend((FIELD_PREFIXES[operator] + t,) for t in tokens)
+        elif operator == "is" and value.lower() == "read":
+            parsed.without_labels.append("UNREAD")
+        elif operator in ("is", "in", "label") and value.lower() in SYSTEM_LABELS:
+            parsed.labels.append(SYSTEM_LABELS[value.lower()])
+        elif operator == "has" and value.lower() in ("attachment", "attachments"):
+            parsed.has_attachment = True
+        else:
+            return None
+
+    return parsed
+
+
+def _postings(email: EmailRecord) -> Iterable[Tuple[str, str]]:
+    terms = set()
+    terms.update("s:" + t for t in tokenize(email.subject))
+    terms.update("f:" + t for t in tokenize(email.sender))
+    terms.update("t:" + t for t in tokenize(email.recipient))
+    terms.update("b:" + t for t in tokenize(email.snippet))
+    terms.update("b:" + t for t in tokenize(email.body))
+    return ((term, email.id) for term in terms)
+
+
+def index_emails(conn: sqlite3.Connection, emails: Iterable[EmailRecord]):
+    """Add postings for the given emails (inside the caller's transaction)"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO postings (term, message_id) VALUES (?, ?)",
+        (posting for email in emails for posting in _postings(email)),
+    )
+
+
+def purge_orphans(conn: sqlite3.Connection):
+    """Drop postings of messages that are no longer cached"""
+    conn.execute("DELETE FROM postings WHERE message_id NOT IN (SELECT id FROM messages)")
+
+
+def rebuild(conn: sqlite3.Connection, load_email) -> int:
+    """Index every cached message from scratch; returns the number indexed"""
+    conn.execute("DELETE FROM postings")
+    count = 0
+    for row in conn.execute("SELECT * FROM messages").fetchall():
+        index_emails(conn, [load_email(row)])
+        count += 1
+    return count
+
+
+def where_clause(parsed: ParsedQuery, alias: str = "m.", body_terms: bool = True) -> Tuple[str, list]:
+    """SQL conditions on the messages table (aliased) matching a parsed query.
+
+    body_terms=False leaves out the free-text words, matching every message the query could match.
+    """
+    clauses = []
+    params: list = []
+
+    for group in parsed.term_groups:
+        if not body_terms and _is_body_group(group):
+            continue
+        marks = ",".join("?" * len(group))
+        clauses.append(f"{alias}id IN (SELECT message_id FROM postings WHERE term IN ({marks}))")
+        params.extend(group)
+    for label in parsed.labels:
+        clauses.append(f"EXISTS (SELECT 1 FROM message_labels l WHERE l.message_id = {alias}id AND l.label = ?)")
+        params.append(label)
+    for label in parsed.without_labels:
+        clauses.append(f"NOT EXISTS (SELECT 1 FROM message_labels l WHERE l.message_id = {alias}id AND l.label = ?)")
+        params.append(label)
+    if parsed.has_attachment:
+        clauses.append(f"{alias}has_attachments = 1")
+
+    # Like Gmail, spam and trash only match when asked for
+    hidden = [label for label in ("SPAM", "TRASH") if label not in parsed.labels]
+    if hidden:
+        marks = ",".join("?" * len(hidden))
+        clauses.append(
+            f"NOT EXISTS (SELECT 1 FROM message_labels l WHERE l.message_id = {alias}id AND l.label IN ({marks}))"
+        )
+        params.extend(hidden)
+
+    return " AND ".join(clauses) or "1", params
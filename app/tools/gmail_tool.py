@@ -1,31 +1,42 @@
 # app/tools/gmail_tool.py
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from langchain.tools import StructuredTool
 from app.services.gmail_service import (
     send_email,
+    send_emails,
+    mail_merge,
     get_emails,
     read_email,
+    get_thread,
     search_emails,
     delete_email,
     reply_to_email,
     forward_email,
     get_labels,
     mark_as_read,
-    mark_as_unread
+    mark_as_unread,
+    bulk_modify_emails,
+    get_mailbox_stats
 )
 from app.schema.gmail_schema import (
     SendEmailInput,
+    SendBulkEmailsInput,
+    MailMergeInput,
+    MailMergeRecipient,
     GetEmailsInput,
     ReadEmailInput,
+    GetThreadInput,
     SearchEmailsInput,
     DeleteEmailInput,
     ReplyToEmailInput,
     ForwardEmailInput,
     GetLabelsInput,
     MarkAsReadInput,
-    MarkAsUnreadInput
+    MarkAsUnreadInput,
+    BulkModifyEmailsInput,
+    GetMailboxStatsInput
 )
 
 # Input models for tools
@@ -35,18 +46,34 @@ class SendEmailToolInput(BaseModel):
     body: str
     cc: Optional[str] = None
     bcc: Optional[str] = None
+    attachments: Optional[List[str]] = None
+
+class SendBulkEmailsToolInput(BaseModel):
+    emails: List[SendEmailToolInput]
+
+class MailMergeToolInput(BaseModel):
+    subject: str
+    body: str
+    recipients: List[MailMergeRecipient]
+    attachments: Optional[List[str]] = None
 
 class GetEmailsToolInput(BaseModel):
     query: Optional[str] = None
     max_results: int = 10
     label: Optional[str] = None
+    cursor: Optional[str] = None
 
 class ReadEmailToolInput(BaseModel):
     email_id: str
 
+class GetThreadToolInput(BaseModel):
+    thread_id: Optional[str] = None
+    email_id: Optional[str] = None
+
 class SearchEmailsToolInput(BaseModel):
     query: str
     max_results: int = 10
+    cursor: Optional[str] = None
 
 class DeleteEmailToolInput(BaseModel):
     email_id: str
@@ -54,6 +81,7 @@ class DeleteEmailToolInput(BaseModel):
 class ReplyToEmailToolInput(BaseModel):
     email_id: str
     reply_body: str
+    quote_original: bool = False
 
 class ForwardEmailToolInput(BaseModel):
     email_id: str
@@ -66,25 +94,65 @@ class MarkAsReadToolInput(BaseModel):
 class MarkAsUnreadToolInput(BaseModel):
     email_id: str
 
+class BulkModifyEmailsToolInput(BaseModel):
+    email_ids: Optional[List[str]] = None
+    query: Optional[str] = None
+    add_labels: List[str] = []
+    remove_labels: List[str] = []
+
+class TrashEmailsToolInput(BaseModel):
+    email_ids: Optional[List[str]] = None
+    query: Optional[str] = None
+
+class GetMailboxStatsToolInput(BaseModel):
+    labels: List[str] = ["INBOX"]
+
 # Tool wrapper functions
-def send_email_wrapper(to: str, subject: str, body: str, cc: Optional[str] = None, bcc: Optional[str] = None) -> str:
+def send_email_wrapper(to: str, subject: str, body: str, cc: Optional[str] = None, bcc: Optional[str] = None,
+                       attachments: Optional[List[str]] = None) -> str:
     """Send an email"""
     input_data = SendEmailInput(
         to=to,
         subject=subject,
         body=body,
         cc=cc,
-        bcc=bcc
+        bcc=bcc,
+        attachments=attachments
     )
     result = send_email(input_data)
     return result.message
 
-def get_emails_wrapper(query: Optional[str] = None, max_results: int = 10, label: Optional[str] = None) -> str:
+def send_bulk_emails_wrapper(emails: List[SendEmailToolInput]) -> str:
+    """Send several emails"""
+    input_data = SendBulkEmailsInput(
+        emails=[SendEmailInput(**dict(email)) for email in emails]
+    )
+    result = send_emails(input_data)
+    return result.message
+
+def mail_merge_wrapper(subject: str, body: str, recipients: List[MailMergeRecipient],
+                       attachments: Optional[List[str]] = None) -> str:
+    """Send a template to many recipients"""
+    input_data = MailMergeInput(
+        subject=subject,
+        body=body,
+        recipients=[MailMergeRecipient(**dict(recipient)) for recipient in recipients],
+        attachments=attachments
+    )
+    result = mail_merge(input_data)
+    if result.success and result.failed:
+        failures = "\n".join(f"- {r.to}: {r.error}" for r in result.results if not r.success)
+        return f"{result.message}\n{failures}"
+    return result.message
+
+def get_emails_wrapper(query: Optional[str] = None, max_results: int = 10, label: Optional[str] = None,
+                       cursor: Optional[str] = None) -> str:
     """Get emails from Gmail"""
     input_data = GetEmailsInput(
         query=query,
         max_results=max_results,
-        label=label
+        label=label,
+        cursor=cursor
     )
     result = get_emails(input_data)
     return result.message
@@ -95,11 +163,18 @@ def read_email_wrapper(email_id: str) -> str:
     result = read_email(input_data)
     return result.message
 
-def search_emails_wrapper(query: str, max_results: int = 10) -> str:
+def get_thread_wrapper(thread_id: Optional[str] = None, email_id: Optional[str] = None) -> str:
+    """Read a whole conversation"""
+    input_data = GetThreadInput(thread_id=thread_id, email_id=email_id)
+    result = get_thread(input_data)
+    return result.message
+
+def search_emails_wrapper(query: str, max_results: int = 10, cursor: Optional[str] = None) -> str:
     """Search emails using Gmail search syntax"""
     input_data = SearchEmailsInput(
         query=query,
-        max_results=max_results
+        max_results=max_results,
+        cursor=cursor
     )
     result = search_emails(input_data)
     return result.message
@@ -110,11 +185,12 @@ def delete_email_wrapper(email_id: str) -> str:
     result = delete_email(input_data)
     return result.message
 
-def reply_to_email_wrapper(email_id: str, reply_body: str) -> str:
+def reply_to_email_wrapper(email_id: str, reply_body: str, quote_original: bool = False) -> str:
     """Reply to an email"""
     input_data = ReplyToEmailInput(
         email_id=email_id,
-        reply_body=reply_body
+        reply_body=reply_body,
+        quote_original=quote_original
     )
     result = reply_to_email(input_data)
     return result.message
@@ -147,18 +223,73 @@ def mark_as_unread_wrapper(email_id: str) -> str:
     result = mark_as_unread(input_data)
     return result.message
 
+def bulk_modify_emails_wrapper(email_ids: Optional[List[str]] = None, query: Optional[str] = None,
+                               add_labels: Optional[List[str]] = None, remove_labels: Optional[List[str]] = None) -> str:
+    """Change labels on many emails"""
+    hiding = [label for label in add_labels or [] if label.upper() in ("TRASH", "SPAM")]
+    if hiding:
+        return f"❌ Use trash_emails to move emails to Trash; bulk_modify_emails cannot add {', '.join(hiding)}"
+    input_data = BulkModifyEmailsInput(
+        email_ids=email_ids,
+        query=query,
+        add_labels=add_labels or [],
+        remove_labels=remove_labels or []
+    )
+    result = bulk_modify_emails(input_data)
+    return result.message
+
+# The agent only moves emails to Trash, where Gmail keeps them for 30 days;
+# permanent bulk deletion is left to /api/gmail/bulk-delete.
+TRASH_TOOL_MAX_EMAILS = 100
+
+def trash_emails_wrapper(email_ids: Optional[List[str]] = None, query: Optional[str] = None) -> str:
+    """Move many emails to Trash"""
+    if email_ids and len(email_ids) > TRASH_TOOL_MAX_EMAILS:
+        return f"❌ Give at most {TRASH_TOOL_MAX_EMAILS} emails at a time"
+    input_data = BulkModifyEmailsInput(email_ids=email_ids, query=query, max_emails=TRASH_TOOL_MAX_EMAILS,
+                                       add_labels=["TRASH"])
+    result = bulk_modify_emails(input_data)
+    if not result.success:
+        return result.message
+    message = f"🗑️ Moved {result.succeeded} of {result.succeeded + result.failed} emails to Trash"
+    if result.failed:
+        message += f" ({result.failed} failed)"
+    return message
+
+def get_mailbox_stats_wrapper(labels: Optional[List[str]] = None) -> str:
+    """Count emails per label"""
+    input_data = GetMailboxStatsInput(labels=labels or ["INBOX"])
+    result = get_mailbox_stats(input_data)
+    return result.message
+
 # LangChain Tools
 send_email_tool = StructuredTool.from_function(
     name="send_email",
-    description="Send an email using Gmail. Provide recipient email, subject, and body. Optionally include CC and BCC.",
+    description="Send an email using Gmail. Provide recipient email, subject, and body. Optionally include CC, BCC and attachments (file names in the upload directory).",
     func=send_email_wrapper,
     args_schema=SendEmailToolInput,
     return_direct=True
 )
 
+send_bulk_emails_tool = StructuredTool.from_function(
+    name="send_bulk_emails",
+    description="Send several emails at once, each with its own recipient, subject and body. Prefer this over repeated send_email calls.",
+    func=send_bulk_emails_wrapper,
+    args_schema=SendBulkEmailsToolInput,
+    return_direct=True
+)
+
+mail_merge_tool = StructuredTool.from_function(
+    name="mail_merge",
+    description="Send the same email, personalized, to many recipients: subject and body are templates with {{name}} placeholders filled from each recipient's variables ({{to}} is their address). Use this instead of send_email or send_bulk_emails when one message goes to a list of people.",
+    func=mail_merge_wrapper,
+    args_schema=MailMergeToolInput,
+    return_direct=True
+)
+
 get_emails_tool = StructuredTool.from_function(
     name="get_emails",
-    description="Get emails from Gmail. You can specify a query, max results, and label to filter emails.",
+    description="Get emails from Gmail. You can specify a query, max results, and label to filter emails; the label may be its name as the user says it (e.g. 'Receipts') or its ID. To get the next page, pass the cursor from the previous result with the same query and label.",
     func=get_emails_wrapper,
     args_schema=GetEmailsToolInput,
     return_direct=True
@@ -172,9 +303,17 @@ read_email_tool = StructuredTool.from_function(
     return_direct=True
 )
 
+get_thread_tool = StructuredTool.from_function(
+    name="get_thread",
+    description="Read a whole email conversation (every email in the thread with its sender, date and body) in one call, given its thread ID or the ID of any email in it. Prefer this over repeated read_email calls on the same conversation.",
+    func=get_thread_wrapper,
+    args_schema=GetThreadToolInput,
+    return_direct=True
+)
+
 search_emails_tool = StructuredTool.from_function(
     name="search_emails",
-    description="Search emails using Gmail search syntax. Examples: 'from:john@example.com', 'subject:meeting', 'is:unread'.",
+    description="Search emails using Gmail search syntax. Examples: 'from:john@example.com', 'subject:meeting', 'is:unread'. To get the next page, pass the cursor from the previous result with the same query.",
     func=search_emails_wrapper,
     args_schema=SearchEmailsToolInput,
     return_direct=True
@@ -190,7 +329,7 @@ delete_email_tool = StructuredTool.from_function(
 
 reply_to_email_tool = StructuredTool.from_function(
     name="reply_to_email",
-    description="Reply to an email by its ID. Provide the email ID and your reply message.",
+    description="Reply to an email by its ID, in the same thread. Provide the email ID and your reply message. Set quote_original only if the user asks to include the original text.",
     func=reply_to_email_wrapper,
     args_schema=ReplyToEmailToolInput,
     return_direct=True
@@ -206,7 +345,7 @@ forward_email_tool = StructuredTool.from_function(
 
 get_labels_tool = StructuredTool.from_function(
     name="get_labels",
-    description="Get all available Gmail labels. Useful for filtering emails by label.",
+    description="Get all available Gmail labels. Not needed before get_emails, which accepts label names.",
     func=get_labels_wrapper,
     args_schema=GetLabelsInput,
     return_direct=True
@@ -226,4 +365,28 @@ mark_as_unread_tool = StructuredTool.from_function(
     func=mark_as_unread_wrapper,
     args_schema=MarkAsUnreadToolInput,
     return_direct=True
-) 
\ No newline at end of file
+)
+
+bulk_modify_emails_tool = StructuredTool.from_function(
+    name="bulk_modify_emails",
+    description="Add or remove labels on many emails at once, given their IDs or a Gmail search query. Use remove_labels=['UNREAD'] to mark as read, add_labels=['UNREAD'] to mark as unread, remove_labels=['INBOX'] to archive. Cannot add TRASH or SPAM; use trash_emails to trash emails. Prefer this over repeated mark_as_read or mark_as_unread calls.",
+    func=bulk_modify_emails_wrapper,
+    args_schema=BulkModifyEmailsToolInput,
+    return_direct=True
+)
+
+trash_emails_tool = StructuredTool.from_function(
+    name="trash_emails",
+    description=f"Move up to {TRASH_TOOL_MAX_EMAILS} emails to Trash at once, given their IDs or a Gmail search query. They can be restored from Trash for 30 days. Prefer this over repeated delete_email calls.",
+    func=trash_emails_wrapper,
+    args_schema=TrashEmailsToolInput,
+    return_direct=True
+)
+
+get_mailbox_stats_tool = StructuredTool.from_function(
+    name="get_mailbox_stats",
+    description="Count emails: unread and total emails and conversations per label (names or IDs, default ['INBOX']). Use this to answer 'how many' questions instead of listing emails, e.g. labels=['UNREAD'] for all unread mail.",
+    func=get_mailbox_stats_wrapper,
+    args_schema=GetMailboxStatsToolInput,
+    return_direct=True
+)
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the pure-Python hot paths
+
+Every benchmark runs against synthetic but realistic inputs (large MIME
+payloads, 1000-event days, long LLM outputs) and reports throughput and the
+traced memory of a single call. Results can be saved and compared to measure
+an alternative implementation against the current one.
+
+Usage:
+    python bench_hot_paths.py                       # run every benchmark
+    python bench_hot_paths.py -k mime -k calendar   # only matching benchmarks
+    python bench_hot_paths.py --save before.json    # keep results for later
+    python bench_hot_paths.py --compare before.json # show the change per benchmark
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+# The agents build their LLM clients at import time; no request is ever made here
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import httpx
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark factory; the factory does the setup and returns the timed callable"""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Synthetic inputs
+# ---------------------------------------------------------------------------
+
+RNG = random.Random(1234)
+WORDS = (
+    "meeting schedule calendar project update team review email budget quarterly "
+    "follow up tomorrow availability invite agenda notes deadline client launch "
+    "design sprint retro roadmap hiring onboarding report numbers forecast"
+).split()
+
+
+def lorem(n_words: int) -> str:
+    return " ".join(RNG.choice(WORDS) for _ in range(n_words))
+
+
+def long_llm_output(json_blob: dict, prose_words: int = 3000) -> str:
+    """An LLM answer that buries the JSON object between long stretches of prose"""
+    return (
+        f"Sure! Let me think about this request step by step. {lorem(prose_words // 2)}\n\n"
+        f"```json\n{json.dumps(json_blob, indent=4)}\n```\n\n"
+        f"Some notes {{with braces}} that are not JSON. {lorem(prose_words // 2)}"
+    )
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def mime_payload_large(size_bytes: int = 2 * 1024 * 1024) -> dict:
+    """multipart/alternative with a large text/plain part and an HTML twin"""
+    text = (lorem(200) + "\n") * (size_bytes // 1400 + 1)
+    text = text[:size_bytes]
+    return {
+        "mimeType": "multipart/alternative",
+        "body": {"size": 0},
+        "parts": [
+            {"mimeType": "text/html", "body": {"data": b64url(f"<p>{text}</p>".encode())}},
+            {"mimeType": "text/plain", "body": {"data": b64url(text.encode())}},
+        ],
+    }
+
+
+def mime_payload_many_parts(n_parts: int = 200) -> dict:
+    """multipart/mixed with many attachments before the readable part"""
+    parts = [
+        {"mimeType": "application/pdf", "filename": f"doc{i}.pdf",
+         "body": {"attachmentId": f"att{i}", "size": 52_000}}
+        for i in range(n_parts)
+    ]
+    parts.append({"mimeType": "text/plain", "body": {"data": b64url(lorem(400).encode())}})
+    return {"mimeType": "multipart/mixed", "body": {"size": 0}, "parts": parts}
+
+
+def mime_payload_deep(depth: int = 100) -> dict:
+    """Forwarded-inside-forwarded chain: the readable part sits depth levels down"""
+    payload = {
+        "mimeType": "multipart/alternative",
+        "parts": [
+            {"mimeType": "text/plain", "body": {"data": b64url(lorem(400).encode())}},
+            {"mimeType": "text/html", "body": {"data": b64url(f"<p>{lorem(400)}</p>".encode())}},
+        ],
+    }
+    for i in range(depth):
+        payload = {
+            "mimeType": "multipart/mixed",
+            "parts": [payload, {"mimeType": "image/png", "filename": f"logo{i}.png", "body": {"attachmentId": f"a{i}"}}],
+        }
+    return payload
+
+
+def mime_payload_html_only(size_bytes: int = 512 * 1024) -> dict:
+    """Marketing mail: a single large HTML part and no text/plain alternative"""
+    block = f"<div><p style='color:#333'>{lorem(60)}</p><a href='https://example.com'>Read more</a></div>"
+    html = "<html><head><style>p {margin:0}</style></head><body>" + block * (size_bytes // len(block)) + "</body></html>"
+    return {"mimeType": "text/html", "body": {"data": b64url(html.encode())}}
+
+
+def calendar_day(n_events: int = 1000, date: str = "2025-07-25") -> bytes:
+    """Encoded Calendar API response for a packed day"""
+    items = []
+    for i in range(n_events):
+        minute = RNG.randrange(0, 24 * 60)
+        items.append({
+            "id": f"evt{i}",
+            "summary": f"{lorem(3).title()} #{i}",
+            "start": {"dateTime": f"{date}T{minute // 60:02d}:{minute % 60:02d}:00Z"},
+            "end": {"dateTime": f"{date}T{minute // 60:02d}:{minute % 60:02d}:00Z"},
+            "location": RNG.choice(["Virtual", "Room 4", "HQ"]),
+        })
+    items.sort(key=lambda e: e["start"]["dateTime"])
+    return json.dumps({"items": items}).encode()
+
+
+@contextmanager
+def fake_httpx_get(body: bytes):
+    """Serve every httpx.get with the same pre-encoded JSON body"""
+    def fake_get(url, **kwargs):
+        return httpx.Response(
+            200,
+            content=body,
+            headers={"Content-Type": "application/json"},
+            request=httpx.Request("GET", url),
+        )
+
+    with mock.patch.object(httpx, "get", fake_get):
+        yield
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+@benchmark("supervisor.parse_response_fallback")
+def bench_parse_response_fallback():
+    from app.agents.supervisor_agent import supervisor_agent
+
+    response_text = long_llm_output({"selected_agent": "maybe", "reasoning": lorem(40)})
+    user_input = f"Please schedule a meeting and then send an email to the team about {lorem(80)}"
+    return lambda: supervisor_agent._parse_response_fallback(response_text, user_input)
+
+
+@benchmark("supervisor.json_span_regex")
+def bench_supervisor_span_regex():
+    from app.agents.supervisor_agent import JSON_SPAN_PATTERN
+
+    text = long_llm_output({"selected_agent": "calendar", "reasoning": lorem(30), "task_description": lorem(20)})
+    return lambda: JSON_SPAN_PATTERN.search(text)
+
+
+@benchmark("supervisor.should_enhance_json_regex")
+def bench_should_enhance_regex():
+    from app.agents.supervisor_agent import JSON_OBJECT_PATTERN
+
+    text = long_llm_output({"needs_enhancement": True, "reasoning": lorem(30), "confidence": 0.9})
+    return lambda: JSON_OBJECT_PATTERN.findall(text)
+
+
+@benchmark("enhancement.enhance_input_json_regex")
+def bench_enhance_input_regex():
+    from app.agents.enhancement_agent import JSON_OBJECT_PATTERN
+
+    text = long_llm_output({
+        "enhanced_input": lorem(60),
+        "original_input": lorem(10),
+        "enhancements_made": [lorem(6) for _ in range(8)],
+        "confidence_score": 0.95,
+        "reasoning": lorem(40),
+    })
+    return lambda: JSON_OBJECT_PATTERN.findall(text)
+
+
+@benchmark("enhancement.fallback_enhancement")
+def bench_fallback_enhancement():
+    from app.agents.enhancement_agent import enhancement_agent
+
+    user_input = f"send email about the meeting tomorrow and check calendar {lorem(120)}"
+    llm_response = long_llm_output({"broken": True})
+    return lambda: enhancement_agent._fallback_enhancement(user_input, llm_response)
+
+
+@benchmark("gmail.extract_email_body.large")
+def bench_extract_body_large():
+    from app.services.gmail_service import extract_email_body
+
+    payload = mime_payload_large()
+    return lambda: extract_email_body(payload)
+
+
+@benchmark("gmail.extract_email_body.many_parts")
+def bench_extract_body_many_parts():
+    from app.services.gmail_service import extract_email_body
+
+    payload = mime_payload_many_parts()
+    return lambda: extract_email_body(payload)
+
+
+@benchmark("gmail.extract_email_body.20mb")
+def bench_extract_body_huge():
+    from app.services.gmail_service import extract_email_body
+
+    payload = mime_payload_large(20 * 1024 * 1024)
+    return lambda: extract_email_body(payload)
+
+
+@benchmark("gmail.extract_email_body.deep")
+def bench_extract_body_deep():
+    from app.services.gmail_service import extract_email_body
+
+    payload = mime_payload_deep()
+    return lambda: extract_email_body(payload)
+
+
+@benchmark("gmail.extract_email_body.html_only")
+def bench_extract_body_html_only():
+    from app.services.gmail_service import extract_email_body
+
+    payload = mime_payload_html_only()
+    return lambda: extract_email_body(payload)
+
+
+@benchmark("gmail.attachment_stream.20mb")
+def bench_attachment_stream():
+    from app.services.gmail_attachments import CHUNK_BYTES, DataFieldDecoder
+
+    data = b64url(RNG.randbytes(20 * 1024 * 1024))
+    response = f'{{"size": {len(data) * 3 // 4}, "data": "{data}"}}'.encode()
+    del data
+
+    def run():
+        decoder = DataFieldDecoder()
+        # Stands in for response.aiter_bytes(): one network chunk at a time
+        for start in range(0, len(response), CHUNK_BYTES):
+            decoder.feed(response[start:start + CHUNK_BYTES])
+        decoder.close()
+        return decoder.size
+
+    return run
+
+
+def gmail_resource(payload: dict, fmt: str) -> dict:
+    """Message resource as returned by messages.get in the given format"""
+    headers = [
+        {"name": "Subject", "value": "Weekly digest"},
+        {"name": "From", "value": "news@example.com"},
+        {"name": "To", "value": "me@example.com"},
+        {"name": "Date", "value": "Mon, 1 Jan 2024 10:00:00 +0000"},
+    ]
+    resource = {"id": "m1", "threadId": "m1", "labelIds": ["INBOX"], "snippet": lorem(20)}
+    if fmt == "metadata":
+        resource["payload"] = {"mimeType": payload["mimeType"], "headers": headers}
+    else:
+        resource["payload"] = dict(payload, headers=headers)
+    return resource
+
+
+@benchmark("gmail.parse_email.full")
+def bench_parse_email_full():
+    from app.services.gmail_service import parse_email
+
+    encoded = json.dumps(gmail_resource(mime_payload_large(), "full")).encode()
+    return lambda: parse_email("m1", json.loads(encoded))
+
+
+@benchmark("gmail.parse_email.metadata")
+def bench_parse_email_metadata():
+    from app.services.gmail_service import parse_email
+
+    encoded = json.dumps(gmail_resource(mime_payload_large(), "metadata")).encode()
+    return lambda: parse_email("m1", json.loads(encoded))
+
+
+def listing_resources(n: int = 10_000) -> List[dict]:
+    """messages.get metadata resources for an n-message listing"""
+    resources = []
+    for i in range(n):
+        resource = gmail_resource(mime_payload_many_parts(2), "metadata")
+        resource.update(id=f"m{i}", threadId=f"t{i // 4}", internalDate=str(1_700_000_000_000 + i))
+        resources.append(resource)
+    return resources
+
+
+@benchmark("gmail.batch_response.50_full")
+def bench_batch_response():
+    from app.services.gmail_batch import parse_batch_response
+
+    boundary = "batch_bench"
+    parts = []
+    for i in range(50):
+        resource = json.dumps(gmail_resource(mime_payload_large(64 * 1024), "full"))
+        parts.append(
+            f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-item-{i}>\r\n\r\n"
+            f"HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{resource}\r\n"
+        )
+    content = ("".join(parts) + f"--{boundary}--").encode()
+    return lambda: parse_batch_response(content, f"multipart/mixed; boundary={boundary}")
+
+
+@benchmark("gmail.listing.10k_messages")
+def bench_listing_10k():
+    from app.services.gmail_service import listing_message, parse_email
+
+    resources = listing_resources()
+
+    def run():
+        emails = [parse_email(r["id"], r) for r in resources]
+        listing_message("📧 Recent emails:", emails, None)
+        return emails
+    return run
+
+
+@benchmark("gmail.mail_cache.list_10k")
+def bench_mail_cache_list():
+    import tempfile
+    from app.services.gmail_service import parse_email
+    from app.services.mail_cache import MailCache
+
+    directory = tempfile.mkdtemp(prefix="bench-mail-cache-")
+    cache = MailCache(os.path.join(directory, "mail.db"), max_messages=20_000)
+    cache.upsert(parse_email(r["id"], r) for r in listing_resources())
+    return lambda: cache.list(limit=10_000)
+
+
+@benchmark("gmail.mail_cache.thread_20_of_10k")
+def bench_mail_cache_thread():
+    import tempfile
+    from app.services.gmail_service import get_cached_thread, parse_email
+    from app.services.mail_cache import MailCache
+
+    directory = tempfile.mkdtemp(prefix="bench-mail-cache-")
+    cache = MailCache(os.path.join(directory, "mail.db"), max_messages=20_000)
+    emails = []
+    for r in listing_resources():
+        email_detail = parse_email(r["id"], dict(r, threadId=f"t{int(r['id'][1:]) // 20}"))
+        email_detail.body, email_detail.attachments = "Body", []
+        emails.append(email_detail)
+    cache.upsert(emails)
+    cache.set_state(complete="1")
+    return lambda: get_cached_thread(cache, "t7")
+
+
+@benchmark("gmail.create_message.1mb")
+def bench_create_message():
+    from app.services.gmail_service import create_message
+
+    body = (lorem(150) + "\n") * 1000
+    return lambda: create_message(
+        sender="me@example.com",
+        to="team@example.com",
+        subject="Quarterly report",
+        body=body,
+        cc="boss@example.com",
+        bcc="archive@example.com",
+    )
+
+
+@benchmark("calendar.get_events.1000_events")
+def bench_get_events():
+    from app.services.calendar_service import get_events
+    from app.schema.calendar_schema import GetEventsInput
+
+    body = calendar_day()
+    input_data = GetEventsInput(start_date="2025-07-25", end_date="2025-07-25")
+
+    def run():
+        with fake_httpx_get(body):
+            return get_events(input_data)
+    return run
+
+
+@benchmark("calendar.suggest_free_slots.1000_events")
+def bench_suggest_free_slots():
+    from app.tools.calendar_tool import suggest_free_slots
+
+    body = calendar_day()
+
+    def run():
+        with fake_httpx_get(body):
+            return suggest_free_slots("2025-07-25", 30)
+    return run
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def time_callable(fn: Callable[[], object], min_time: float, repeat: int) -> float:
+    """Return the best seconds-per-call over `repeat` runs of an auto-sized loop"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def trace_allocations(fn: Callable[[], object]) -> Dict[str, int]:
+    """Traced memory of a single call: peak bytes and bytes still held by the result"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        after, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak - before, "retained_bytes": max(0, after - before)}
+
+
+def run_benchmarks(selected: List[str], min_time: float, repeat: int) -> Dict[str, dict]:
+    results = {}
+    for name in selected:
+        fn = BENCHMARKS[name]()
+        fn()  # warm caches and lazy imports
+        seconds = time_callable(fn, min_time, repeat)
+        allocations = trace_allocations(fn)
+        results[name] = {"seconds_per_op": seconds, "ops_per_sec": 1 / seconds, **allocations}
+        print_row(name, results[name])
+    return results
+
+
+def print_header(compare: bool):
+    line = f"{'benchmark':<44} {'ops/sec':>12} {'µs/op':>12} {'peak KiB':>10} {'held KiB':>10}"
+    if compare:
+        line += f" {'vs base':>9}"
+    print(line)
+    print("-" * len(line))
+
+
+def print_row(name: str, result: dict, baseline: Optional[dict] = None):
+    line = (
+        f"{name:<44} {result['ops_per_sec']:>12,.1f} {result['seconds_per_op'] * 1e6:>12,.1f} "
+        f"{result['peak_bytes'] / 1024:>10,.1f} {result['retained_bytes'] / 1024:>10,.1f}"
+    )
+    if baseline is not None:
+        ratio = baseline["seconds_per_op"] / result["seconds_per_op"]
+        line += f" {ratio:>8.2f}x"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the pure-Python hot paths")
+    parser.add_argument("-k", dest="filters", action="append", default=[],
+                        help="only run benchmarks whose name contains this text (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per benchmark; the best is kept")
+    parser.add_argument("--save", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="compare against results saved with --save")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    args = parser.parse_args()
+
+    names = [n for n in BENCHMARKS if not args.filters or any(f in n for f in args.filters)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if not names:
+        print("❌ No benchmark matches the given filters")
+        return 1
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(f"🏁 Running {len(names)} benchmarks (Python {sys.version.split()[0]})\n")
+    if baseline is None:
+        print_header(compare=False)
+        results = run_benchmarks(names, args.min_time, args.repeat)
+    else:
+        # Silence the live rows and print the comparison table once everything ran
+        with open(os.devnull, "w") as devnull, mock.patch("sys.stdout", devnull):
+            results = run_benchmarks(names, args.min_time, args.repeat)
+        print_header(compare=True)
+        for name, result in results.items():
+            print_row(name, result, baseline.get(name))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+In-process fake of the Gmail REST API for offline tests and benchmarks.
+
+Install it with ``gmail_client.use_transport(fake.transport())``; every route
+the services use is answered from memory, and ``fake.requests`` records each
+round-trip so tests can count them.
+"""
+
+import base64
+import json
+import tempfile
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+
+API_PREFIX = "/gmail/v1/users/me"
+UPLOAD_PATH = "/upload/gmail/v1/users/me/messages/send"
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+class FakeTransport(httpx.MockTransport):
+    """MockTransport that leaves upload chunks unread, so the fake can take them a piece at a time"""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not (request.method == "PUT" and request.url.path == UPLOAD_PATH):
+            request.read()
+        return self.handler(request)
+
+
+class FakeGmail:
+    def __init__(self, email_address: str = "me@example.com"):
+        self.email_address = email_address
+        self.messages: Dict[str, dict] = {}
+        self.order: List[str] = []  # newest first, like messages.list
+        self.sent: List[dict] = []
+        self.requests: List[str] = []
+        self.uploaded = 0  # request body bytes received from the client
+        self.downloaded = 0  # response body bytes sent to the client
+        self.fail_ids: Dict[str, int] = {}  # message id -> status to answer with
+        self.fail_sends: List[int] = []  # statuses for the next messages.send calls
+        self.fail_batches: List[int] = []  # statuses for the next batchModify/batchDelete calls
+        self.throttle: List[Tuple[int, Optional[str]]] = []  # (status, Retry-After) for the next calls of any kind
+        self.attachments: Dict[str, bytes] = {}  # attachment id -> content, for messages.attachments.get
+        self.label_names: Dict[str, str] = {}  # user label id -> name; other labels are named by their id
+        self.history_id = 1
+        self.history: List[dict] = []  # users.history records, oldest first
+        self.history_floor = 0  # start ids below this answer 404, as expired history does
+        self.uploads: Dict[str, dict] = {}  # resumable upload session id -> state; bytes are kept in a temporary file
+        self.upload_ranges: List[str] = []  # Content-Range of every upload request, in order
+        self.drop_upload_at: Optional[int] = None  # drop the connection once an upload has this many bytes
+
+    # -- fixtures -------------------------------------------------------------
+
+    def add_message(self, message_id: str, subject: str = "Hello", sender: str = "alice@example.com",
+                    to: str = "me@example.com", body: str = "Hi there", labels: Optional[List[str]] = None,
+                    date: str = "Mon, 1 Jan 2024 10:00:00 +0000", thread_id: Optional[str] = None,
+                    payload: Optional[dict] = None, replies_to: Optional[List[str]] = None) -> dict:
+        headers = [
+            {"name": "Subject", "value": subject},
+            {"name": "From", "value": sender},
+            {"name": "To", "value": to},
+            {"name": "Date", "value": date},
+            {"name": "Message-ID", "value": f"<{message_id}@mail.example.com>"},
+        ]
+        if replies_to:  # ids of the earlier messages of the conversation, oldest first
+            references = [f"<{i}@mail.example.com>" for i in replies_to]
+            headers.append({"name": "In-Reply-To", "value": references[-1]})
+            headers.append({"name": "References", "value": " ".join(references)})
+        if payload is None:
+            payload = {"mimeType": "text/plain", "body": {"size": len(body), "data": b64url(body.encode())}}
+        payload = dict(payload, headers=headers)
+        resource = {
+            "id": message_id,
+            "threadId": thread_id or message_id,
+            "labelIds": labels if labels is not None else ["INBOX", "UNREAD"],
+            "snippet": body[:100],
+            "sizeEstimate": len(json.dumps(payload)),
+            "internalDate": str(1_700_000_000_000 + len(self.order) * 1000),
+            "payload": payload,
+        }
+        self.messages[message_id] = resource
+        self.order.insert(0, message_id)
+        self._record("messagesAdded", message_id)
+        return resource
+
+    def transport(self) -> httpx.MockTransport:
+        return FakeTransport(self.handle)
+
+    def count(self, prefix: str = "") -> int:
+        return sum(1 for r in self.requests if r.startswith(prefix))
+
+    # -- routing --------------------------------------------------------------
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.requests.append(f"{request.method} {path}")
+        if self.throttle:
+            status, retry_after = self.throttle.pop(0)
+            headers = {"Retry-After": retry_after} if retry_after is not None else {}
+            return httpx.Response(status, headers=headers, json={"error": {"code": status, "message": "Injected failure"}})
+        if path == "/batch/gmail/v1":
+            response = self._batch(request)
+        elif path == UPLOAD_PATH:
+            return self._upload(request)
+        else:
+            response = self._route(request.method, path, parse_qs(request.url.query.decode()), request.content)
+        self.uploaded += len(request.content)
+        self.downloaded += len(response.content)
+        return response
+
+    def _route(self, method: str, path: str, query: Dict[str, List[str]], body: bytes) -> httpx.Response:
+        if not path.startswith(API_PREFIX):
+            return httpx.Response(404, json={"error": {"code": 404, "message": "Not Found"}})
+        resource = path[len(API_PREFIX):]
+
+        if resource == "/profile":
+            return httpx.Response(200, json={"emailAddress": self.email_address, "historyId": str(self.history_id)})
+        if resource == "/history":
+            return self._history(query)
+        if resource == "/labels":
+            labels = sorted({label for m in self.messages.values() for label in m["labelIds"]} | set(self.label_names))
+            return httpx.Response(200, json={"labels": [{"id": label, "name": self.label_names.get(label, label)}
+                                                        for label in labels]})
+        if resource.startswith("/labels/") and method == "GET":
+            return self._label(resource[len("/labels/"):])
+        if resource.startswith("/threads/") and method == "GET":
+            thread_id = resource[len("/threads/"):]
+            messages = sorted((m for m in self.messages.values() if m["threadId"] == thread_id),
+                              key=lambda m: int(m["internalDate"]))
+            if not messages:
+                return httpx.Response(404, json={"error": {"code": 404, "message": "Requested entity was not found."}})
+            return httpx.Response(200, json={"id": thread_id, "messages": [self._format(m, query) for m in messages]})
+        if resource == "/messages" and method == "GET":
+            return self._list(query)
+        if resource == "/messages/send" and method == "POST":
+            if self.fail_sends:
+                status = self.fail_sends.pop(0)
+                return httpx.Response(status, json={"error": {"code": status, "message": "Injected failure"}})
+            message = json.loads(body)
+            message["id"] = f"sent{len(self.sent) + 1}"
+            self.sent.append(message)
+            return httpx.Response(200, json={"id": message["id"], "threadId": message.get("threadId", message["id"])})
+        if resource in ("/messages/batchModify", "/messages/batchDelete") and method == "POST":
+            if self.fail_batches:
+                status = self.fail_batches.pop(0)
+                return httpx.Response(status, json={"error": {"code": status, "message": "Injected failure"}})
+            change = json.loads(body)
+            for message_id in change["ids"]:
+                if message_id not in self.messages:
+                    continue
+                if resource.endswith("batchDelete"):
+                    self._remove(message_id)
+                else:
+                    self._modify(message_id, change)
+            return httpx.Response(204)
+        if resource.startswith("/messages/"):
+            message_id, _, action = resource[len("/messages/"):].partition("/")
+            if message_id in self.fail_ids:
+                status = self.fail_ids[message_id]
+                return httpx.Response(status, json={"error": {"code": status, "message": "Injected failure"}})
+            if message_id not in self.messages:
+                return httpx.Response(404, json={"error": {"code": 404, "message": "Not Found"}})
+            if method == "GET" and not action:
+                return httpx.Response(200, json=self._format(self.messages[message_id], query))
+            if method == "GET" and action.startswith("attachments/"):
+                data = self.attachments.get(action[len("attachments/"):])
+                if data is None:
+                    return httpx.Response(400, json={"error": {"code": 400, "message": "Invalid attachment token"}})
+                return httpx.Response(200, json={"size": len(data), "data": b64url(data)})
+            if method == "DELETE" and not action:
+                self._remove(message_id)
+                return httpx.Response(204)
+            if method == "POST" and action == "modify":
+                self._modify(message_id, json.loads(body))
+                return httpx.Response(200, json=self._format(self.messages[message_id], {"format": ["minimal"]}))
+        return httpx.Response(404, json={"error": {"code": 404, "message": f"No fake route for {method} {path}"}})
+
+    def _list(self, query: Dict[str, List[str]]) -> httpx.Response:
+        ids = self.order
+        for label in query.get("labelIds", []):
+            ids = [i for i in ids if label in self.messages[i]["labelIds"]]
+        max_results = int(query.get("maxResults", ["100"])[0])
+        start = int(query.get("pageToken", ["0"])[0])
+        page = ids[start:start + max_results]
+        result = {
+            "messages": [{"id": i, "threadId": self.messages[i]["threadId"]} for i in page],
+            "resultSizeEstimate": len(ids),
+        }
+        if start + max_results < len(ids):
+            result["nextPageToken"] = str(start + max_results)
+        if not page:
+            result.pop("messages")
+        return httpx.Response(200, json=result)
+
+    def _history(self, query: Dict[str, List[str]]) -> httpx.Response:
+        start = int(query["startHistoryId"][0])
+        if start < self.history_floor:
+            return httpx.Response(404, json={"error": {"code": 404, "message": "Requested entity was not found."}})
+        records = [r for r in self.history if int(r["id"]) > start]
+        max_results = int(query.get("maxResults", ["100"])[0])
+        offset = int(query.get("pageToken", ["0"])[0])
+        result = {"history": records[offset:offset + max_results], "historyId": str(self.history_id)}
+        if offset + max_results < len(records):
+            result["nextPageToken"] = str(offset + max_results)
+        return httpx.Response(200, json=result)
+
+    def _record(self, kind: str, message_id: str, labels: Optional[List[str]] = None):
+        self.history_id += 1
+        message = self.messages.get(message_id, {"id": message_id})
+        item = {"message": {"id": message_id, "threadId": message.get("threadId", message_id),
+                            "labelIds": list(message.get("labelIds", []))}}
+        if labels is not None:
+            item["labelIds"] = labels
+        self.history.append({"id": str(self.history_id), kind: [item]})
+
+    def _format(self, resource: dict, query: Dict[str, List[str]]) -> dict:
+        fmt = query.get("format", ["full"])[0]
+        if fmt == "full":
+            return resource
+        result = {k: v for k, v in resource.items() if k != "payload"}
+        if fmt == "metadata":
+            wanted = set(query.get("metadataHeaders", []))
+            headers = [h for h in resource["payload"]["headers"] if not wanted or h["name"] in wanted]
+            result["payload"] = {"mimeType": resource["payload"].get("mimeType"), "headers": headers}
+        return result
+
+    def _modify(self, message_id: str, change: dict):
+        labels = self.messages[message_id]["labelIds"]
+        for label in change.get("addLabelIds", []):
+            if label not in labels:
+                labels.append(label)
+        for label in change.get("removeLabelIds", []):
+            if label in labels:
+                labels.remove(label)
+        if change.get("addLabelIds"):
+            self._record("labelsAdded", message_id, change["addLabelIds"])
+        if change.get("removeLabelIds"):
+            self._record("labelsRemoved", message_id, change["removeLabelIds"])
+
+    def _remove(self, message_id: str):
+        self._record("messagesDeleted", message_id)
+        self.messages.pop(message_id, None)
+        if message_id in self.order:
+            self.order.remove(message_id)
+
+    def _label(self, label_id: str) -> httpx.Response:
+        messages = [m for m in self.messages.values() if label_id in m["labelIds"]]
+        if not messages and label_id not in self.label_names:
+            return httpx.Response(404, json={"error": {"code": 404, "message": "Requested entity was not found."}})
+        unread = [m for m in messages if "UNREAD" in m["labelIds"]]
+        return httpx.Response(200, json={
+            "id": label_id,
+            "name": self.label_names.get(label_id, label_id),
+            "messagesTotal": len(messages),
+            "messagesUnread": len(unread),
+            "threadsTotal": len({m["threadId"] for m in messages}),
+            "threadsUnread": len({m["threadId"] for m in unread}),
+        })
+
+    def _upload(self, request: httpx.Request) -> httpx.Response:
+        """Resumable messages.send: a POST opens the session, PUTs carry the message in ranges"""
+        if request.method == "POST":
+            self.uploaded += len(request.content)
+            if self.fail_sends:
+                status = self.fail_sends.pop(0)
+                return httpx.Response(status, json={"error": {"code": status, "message": "Injected failure"}})
+            session = f"upload{len(self.uploads) + 1}"
+            self.uploads[session] = {"size": int(request.headers["X-Upload-Content-Length"]), "received": 0,
+                                     "metadata": json.loads(request.content or b"{}"), "data": tempfile.TemporaryFile()}
+            location = f"https://gmail.googleapis.com{UPLOAD_PATH}?uploadType=resumable&upload_id={session}"
+            return httpx.Response(200, headers={"Location": location})
+
+        upload = self.uploads.get(parse_qs(request.url.query.decode()).get("upload_id", [""])[0])
+        if upload is None:
+            return httpx.Response(404, json={"error": {"code": 404, "message": "Upload session not found"}})
+        content_range = request.headers["Content-Range"]
+        self.upload_ranges.append(content_range)
+        span = content_range.split(" ", 1)[1].split("/", 1)[0]
+        if span != "*":
+            start = int(span.split("-", 1)[0])
+            if start > upload["received"]:
+                return httpx.Response(400, json={"error": {"code": 400, "message": "Range skips bytes"}})
+            position = start
+            for piece in request.stream:
+                self.uploaded += len(piece)
+                skip = max(0, upload["received"] - position)  # bytes the session already has
+                position += len(piece)
+                piece = piece[skip:]
+                if self.drop_upload_at is not None and upload["received"] + len(piece) > self.drop_upload_at:
+                    kept = self.drop_upload_at - upload["received"]
+                    upload["data"].write(piece[:kept])
+                    upload["received"] += kept
+                    self.drop_upload_at = None
+                    raise httpx.ReadError("Connection dropped during upload")
+                upload["data"].write(piece)
+                upload["received"] += len(piece)
+
+        if upload["received"] < upload["size"]:
+            headers = {"Range": f"bytes=0-{upload['received'] - 1}"} if upload["received"] else {}
+            return httpx.Response(308, headers=headers)
+        if "id" not in upload:
+            upload["id"] = f"sent{len(self.sent) + 1}"
+            upload["data"].seek(0)
+            self.sent.append(dict(upload["metadata"], id=upload["id"], upload=upload["data"]))
+        return httpx.Response(200, json={"id": upload["id"], "threadId": upload["metadata"].get("threadId", upload["id"])})
+
+    def _batch(self, request: httpx.Request) -> httpx.Response:
+        boundary = request.headers["content-type"].split("boundary=", 1)[1]
+        parts = request.content.decode().split(f"--{boundary}")
+        out = []
+        for part in parts:
+            part = part.strip()
+            if not part or part == "--":
+                continue
+            head, _, inner = part.partition("\r\n\r\n")
+            content_id = next(line.split(":", 1)[1].strip() for line in head.split("\r\n")
+                              if line.lower().startswith("content-id"))
+            method, target = inner.strip().split(" ", 1)
+            path, _, query = target.partition("?")
+            response = self._route(method, path, parse_qs(query), b"")
+            out.append(
+                f"--batch_response\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id.strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {response.status_code} OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{response.content.decode()}\r\n"
+            )
+        out.append("--batch_response--")
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "multipart/mixed; boundary=batch_response"},
+            content="".join(out).encode(),
+        )
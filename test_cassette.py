@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Test script for the record/replay cassette harness
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from unittest import mock
+
+import httpx
+
+from app import cassette
+
+
+def fake_google(request: httpx.Request) -> httpx.Response:
+    """Local stand-in for the Google APIs"""
+    time.sleep(0.05)
+    if request.url.path.endswith("/messages"):
+        return httpx.Response(200, json={"messages": [{"id": "m1"}, {"id": "m2"}]})
+    return httpx.Response(200, json={"id": request.url.path.rsplit("/", 1)[-1]})
+
+
+def offline(request: httpx.Request) -> httpx.Response:
+    raise AssertionError(f"Network used during replay: {request.url}")
+
+
+def record_sample(path: str):
+    with cassette.recording(path):
+        with httpx.Client(transport=httpx.MockTransport(fake_google)) as client:
+            client.get("https://gmail.googleapis.com/gmail/v1/users/me/messages", params={"maxResults": 2})
+            client.get("https://gmail.googleapis.com/gmail/v1/users/me/messages/m1")
+            client.get("https://gmail.googleapis.com/gmail/v1/users/me/messages/m2")
+
+
+def test_record_and_replay():
+    """Test that recorded responses are served back offline, in order"""
+    print("🧪 Testing record and replay...")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.jsonl.gz")
+            record_sample(path)
+
+            entries = cassette.load_entries(path)
+            if len(entries) != 3:
+                print(f"❌ Expected 3 recorded calls, got {len(entries)}")
+                return False
+
+            with cassette.replaying(path):
+                with httpx.Client(transport=httpx.MockTransport(offline)) as client:
+                    listing = client.get("https://gmail.googleapis.com/gmail/v1/users/me/messages", params={"maxResults": 2})
+                    detail = client.get("https://gmail.googleapis.com/gmail/v1/users/me/messages/m2")
+
+            if listing.json()["messages"][1]["id"] != "m2" or detail.json()["id"] != "m2":
+                print(f"❌ Replayed responses do not match: {listing.json()} {detail.json()}")
+                return False
+
+            print("✅ Responses replayed without network access")
+            return True
+
+    except Exception as e:
+        print(f"❌ Error testing record and replay: {str(e)}")
+        return False
+
+
+def test_replay_latency():
+    """Test that replay can reproduce the recorded latency"""
+    print("\n🧪 Testing replay with original latencies...")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.jsonl.gz")
+            record_sample(path)
+
+            async def replay():
+                async with httpx.AsyncClient(transport=httpx.MockTransport(offline)) as client:
+                    return await client.get("https://gmail.googleapis.com/gmail/v1/users/me/messages/m1")
+
+            with cassette.replaying(path, latency_scale=1.0):
+                start = time.perf_counter()
+                response = asyncio.run(replay())
+                elapsed = time.perf_counter() - start
+
+            if response.json()["id"] != "m1" or elapsed < 0.04:
+                print(f"❌ Expected ~50ms replay, got {elapsed * 1000:.1f}ms")
+                return False
+
+            print(f"✅ Async replay took {elapsed * 1000:.1f}ms (recorded ~50ms)")
+            return True
+
+    except Exception as e:
+        print(f"❌ Error testing replay latency: {str(e)}")
+        return False
+
+
+def test_replay_miss():
+    """Test that an unrecorded request fails instead of reaching the network"""
+    print("\n🧪 Testing replay miss...")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.jsonl.gz")
+            record_sample(path)
+
+            with cassette.replaying(path):
+                with httpx.Client(transport=httpx.MockTransport(offline)) as client:
+                    try:
+                        client.get("https://gmail.googleapis.com/gmail/v1/users/me/labels")
+                    except cassette.CassetteMissError:
+                        print("✅ Unrecorded request raised CassetteMissError")
+                        return True
+
+            print("❌ Unrecorded request did not fail")
+            return False
+
+    except Exception as e:
+        print(f"❌ Error testing replay miss: {str(e)}")
+        return False
+
+
+def test_record_streamed_response():
+    """Test that a streamed download reaches its reader chunk by chunk while it is recorded, and replays"""
+    print("\n🧪 Testing a recorded streamed response...")
+
+    try:
+        chunks = [os.urandom(64 * 1024) for _ in range(8)]
+        produced = []
+
+        async def download(request: httpx.Request) -> httpx.Response:
+            async def body():
+                for chunk in chunks:
+                    produced.append(len(chunk))
+                    yield chunk
+            return httpx.Response(200, headers={"Content-Type": "application/pdf"}, content=body())
+
+        async def fetch(transport: httpx.AsyncBaseTransport):
+            received, first_seen = [], None
+            async with httpx.AsyncClient(transport=transport) as client:
+                async with client.stream("GET", "https://gmail.googleapis.com/attachments/a1") as response:
+                    async for chunk in response.aiter_raw():
+                        received.append(chunk)
+                        if first_seen is None:
+                            first_seen = len(produced)
+            return b"".join(received), first_seen
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.jsonl.gz")
+            with cassette.recording(path):
+                recorded, first_seen = asyncio.run(fetch(httpx.MockTransport(download)))
+            with cassette.replaying(path):
+                replayed, _ = asyncio.run(fetch(httpx.MockTransport(offline)))
+
+        if first_seen != 1:
+            print(f"❌ Reader saw its first chunk after {first_seen} chunks were produced; the stream was buffered")
+            return False
+        if recorded != b"".join(chunks) or replayed != recorded:
+            print("❌ Replayed body differs from the streamed one")
+            return False
+
+        print(f"✅ {len(chunks)} chunks streamed through while recording; replay returned the same {len(replayed)} bytes")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing streamed recording: {str(e)}")
+        return False
+
+
+def test_unknown_mode_rejected():
+    """Test that a misspelled CASSETTE_MODE fails instead of replaying"""
+    print("\n🧪 Testing an unknown cassette mode...")
+
+    try:
+        with mock.patch.object(cassette, "CASSETTE_MODE", "recrod"), mock.patch.object(cassette, "CASSETTE_PATH", "x"):
+            try:
+                cassette.install_from_config()
+            except RuntimeError as e:
+                print(f"✅ Refused: {e}")
+                return True
+            finally:
+                if cassette._active is not None:
+                    cassette._active.uninstall()
+
+        print("❌ Unknown mode was accepted")
+        return False
+
+    except Exception as e:
+        print(f"❌ Error testing unknown mode: {str(e)}")
+        return False
+
+
+def main():
+    """Run all cassette tests"""
+    print("🚀 Starting cassette tests...\n")
+
+    tests = [
+        ("Record and Replay", test_record_and_replay),
+        ("Replay Latency", test_replay_latency),
+        ("Replay Miss", test_replay_miss),
+        ("Record Streamed Response", test_record_streamed_response),
+        ("Unknown Mode Rejected", test_unknown_mode_rejected),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script for the JSON helpers and response compression
+"""
+
+import importlib
+import sys
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app import fastjson
+from app.main import app
+from app.services import gmail_client
+from fake_gmail import FakeGmail
+
+PAYLOAD = {"id": "m1", "labelIds": ["INBOX", "UNREAD"], "snippet": "Grüße ✉️", "sizeEstimate": 2 ** 40, "raw": None}
+
+
+def stdlib_backend() -> dict:
+    """loads, dumps and ORJSON_AVAILABLE as loaded where orjson is not installed"""
+    try:
+        with mock.patch.dict(sys.modules, {"orjson": None}):
+            importlib.reload(fastjson)
+            return {name: getattr(fastjson, name) for name in ("loads", "dumps", "ORJSON_AVAILABLE")}
+    finally:
+        importlib.reload(fastjson)
+
+
+def test_both_backends_agree():
+    """Test that orjson and the stdlib fallback decode, encode and fail alike"""
+    print("🧪 Testing JSON backends...")
+
+    try:
+        fallback = stdlib_backend()
+        if fallback["ORJSON_AVAILABLE"]:
+            print("❌ Fallback module still uses orjson")
+            return False
+
+        for loads, dumps in ((fastjson.loads, fastjson.dumps), (fallback["loads"], fallback["dumps"])):
+            text = dumps(PAYLOAD)
+            if loads(text) != PAYLOAD or loads(text.encode("utf-8")) != PAYLOAD or ", " in text:
+                print(f"❌ Round trip failed: {text}")
+                return False
+            try:
+                loads(b'{"id": ')
+                print("❌ Truncated JSON was accepted")
+                return False
+            except ValueError:
+                pass
+
+        print(f"✅ Same results with orjson ({fastjson.ORJSON_AVAILABLE}) and the stdlib fallback")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing JSON backends: {str(e)}")
+        return False
+
+
+def test_gzip_negotiation():
+    """Test that large listings are gzipped for clients that accept it, and small answers are not"""
+    print("\n🧪 Testing response compression...")
+
+    try:
+        fake = FakeGmail()
+        for i in range(100):
+            fake.add_message(f"m{i}", subject=f"Weekly report {i}")
+        gmail_client.use_transport(fake.transport(), fake.transport())
+        with TestClient(app) as client:
+            large = client.post("/api/gmail/get", json={"max_results": 100})
+            plain = client.post("/api/gmail/get", json={"max_results": 100}, headers={"Accept-Encoding": "identity"})
+            small = client.get("/api/gmail/metrics")
+
+        if large.headers.get("content-encoding") != "gzip" or len(large.json()["emails"]) != 100:
+            print(f"❌ Large listing not gzipped: {dict(large.headers)}")
+            return False
+        if "content-encoding" in plain.headers or plain.json() != large.json():
+            print("❌ Client without gzip got a different or compressed body")
+            return False
+        if "content-encoding" in small.headers:
+            print("❌ Small response was compressed")
+            return False
+
+        ratio = len(plain.content) / int(large.headers["content-length"])
+        print(f"✅ 100-email listing gzipped {ratio:.1f}x; small and identity responses sent plain")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing compression: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all JSON and compression tests"""
+    print("🚀 Starting JSON tests...\n")
+
+    tests = [
+        ("Both Backends Agree", test_both_backends_agree),
+        ("Gzip Negotiation", test_gzip_negotiation),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
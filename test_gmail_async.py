@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the concurrent async Gmail read path
+"""
+
+import asyncio
+import time
+from unittest import mock
+
+import httpx
+
+from app.schema.gmail_schema import GetEmailsInput, ForwardEmailInput
+from app.services import gmail_client, gmail_service
+from fake_gmail import FakeGmail
+
+LATENCY = 0.05
+
+
+def slow_mailbox(n: int):
+    """Fake mailbox answering every request after LATENCY seconds; tracks peak concurrency"""
+    fake = FakeGmail()
+    for i in range(n):
+        fake.add_message(f"m{i}", subject=f"Subject {i}")
+    stats = {"in_flight": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        stats["in_flight"] += 1
+        stats["peak"] = max(stats["peak"], stats["in_flight"])
+        try:
+            await asyncio.sleep(LATENCY)
+            return fake.handle(request)
+        finally:
+            stats["in_flight"] -= 1
+
+    gmail_client.use_transport(async_transport=httpx.MockTransport(handler))
+    return fake, stats
+
+
+def test_concurrent_listing():
+    """Test that 20 details are fetched concurrently and returned in list order"""
+    print("🧪 Testing concurrent listing...")
+
+    try:
+        fake, stats = slow_mailbox(20)
+        start = time.perf_counter()
+        result = asyncio.run(gmail_service.aget_emails(GetEmailsInput(max_results=20)))
+        elapsed = time.perf_counter() - start
+
+        ids = [e.id for e in result.emails]
+        if ids != fake.order:
+            print(f"❌ Results out of order: {ids}")
+            return False
+        # 1 list call + 20 details at concurrency 10 ≈ 3 round-trips instead of 21
+        if elapsed > 8 * LATENCY:
+            print(f"❌ Listing took {elapsed * 1000:.0f}ms, expected about {3 * LATENCY * 1000:.0f}ms")
+            return False
+
+        print(f"✅ 21 requests in {elapsed * 1000:.0f}ms (sequential would take ~{21 * LATENCY * 1000:.0f}ms)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing concurrent listing: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_concurrency_cap():
+    """Test that in-flight detail fetches never exceed GMAIL_MAX_CONCURRENCY"""
+    print("\n🧪 Testing concurrency cap...")
+
+    try:
+        _, stats = slow_mailbox(30)
+        with mock.patch.object(gmail_service, "GMAIL_MAX_CONCURRENCY", 4):
+            result = asyncio.run(gmail_service.aget_emails(GetEmailsInput(max_results=30)))
+
+        if len(result.emails) != 30 or stats["peak"] > 4:
+            print(f"❌ Expected 30 emails with at most 4 in flight, got {len(result.emails)} / peak {stats['peak']}")
+            return False
+
+        print(f"✅ Peak in-flight requests: {stats['peak']}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing concurrency cap: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_async_forward():
+    """Test forwarding through the async path"""
+    print("\n🧪 Testing async forward...")
+
+    try:
+        fake, _ = slow_mailbox(1)
+        result = asyncio.run(gmail_service.aforward_email(
+            ForwardEmailInput(email_id="m0", forward_to="bob@example.com", additional_message="FYI")
+        ))
+
+        if not result.success or len(fake.sent) != 1:
+            print(f"❌ Forward failed: {result.message}")
+            return False
+
+        print("✅ Forward sent through the async path")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing async forward: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all async Gmail tests"""
+    print("🚀 Starting async Gmail tests...\n")
+
+    tests = [
+        ("Concurrent Listing", test_concurrent_listing),
+        ("Concurrency Cap", test_concurrency_cap),
+        ("Async Forward", test_async_forward),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test script for streamed attachment downloads against the local fake
+"""
+
+import base64
+import json
+import os
+import tempfile
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import ReadEmailInput
+from app.services import gmail_attachments, gmail_client, gmail_service, mail_cache
+from app.services.gmail_attachments import AttachmentCache, DataFieldDecoder
+from app.services.mail_cache import MailCache
+from fake_gmail import FakeGmail
+
+REPORT = os.urandom(300_000)  # several download chunks
+
+
+def make_mailbox() -> FakeGmail:
+    fake = FakeGmail()
+    fake.add_message("m1", subject="Report", payload={"mimeType": "multipart/mixed", "parts": [
+        {"mimeType": "text/plain", "body": {"data": base64.urlsafe_b64encode(b"See attached").decode()}},
+        {"mimeType": "application/pdf", "filename": "report.pdf",
+         "body": {"attachmentId": "att-1", "size": len(REPORT)}},
+    ]})
+    fake.attachments["att-1"] = REPORT
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    return fake
+
+
+def test_decoder_chunk_boundaries():
+    """Test that the data field decodes the same however the response is split"""
+    print("🧪 Testing incremental decoding...")
+
+    try:
+        data = os.urandom(10_001)
+        response = json.dumps({"size": len(data), "data": base64.urlsafe_b64encode(data).decode()}).encode()
+        for size in (1, 3, 7, 4096, len(response)):
+            decoder = DataFieldDecoder()
+            out = b"".join(decoder.feed(response[i:i + size]) for i in range(0, len(response), size))
+            decoder.close()
+            if out != data or decoder.size != len(data):
+                print(f"❌ Wrong bytes with {size}-byte chunks")
+                return False
+
+        truncated = DataFieldDecoder()
+        truncated.feed(response[:len(response) // 2])
+        try:
+            truncated.close()
+            print("❌ Truncated response was accepted")
+            return False
+        except ValueError:
+            pass
+
+        print("✅ Same bytes for 1-byte to whole-response chunks; truncation detected")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing decoding: {str(e)}")
+        return False
+
+
+def test_read_lists_attachments():
+    """Test that a full read exposes attachment ids, also when served from the mailbox cache"""
+    print("\n🧪 Testing attachment listing on read...")
+
+    try:
+        fake = make_mailbox()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mail.db")
+            with mock.patch.object(mail_cache, "MAIL_CACHE_PATH", path), \
+                    mock.patch.object(mail_cache, "_cache", MailCache(path)):
+                first = gmail_service.read_email(ReadEmailInput(email_id="m1")).email
+                fake.requests.clear()
+                second = gmail_service.read_email(ReadEmailInput(email_id="m1")).email
+
+        expected = [("att-1", "report.pdf", "application/pdf", len(REPORT))]
+        for email in (first, second):
+            found = [(a.attachment_id, a.filename, a.mime_type, a.size) for a in email.attachments or []]
+            if found != expected or not email.has_attachments:
+                print(f"❌ Unexpected attachments: {found}")
+                return False
+        if fake.requests:
+            print(f"❌ Cached read went to Gmail: {fake.requests}")
+            return False
+
+        print("✅ Attachment id, name, type and size listed on fresh and cached reads")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing attachment listing: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_download_and_disk_cache():
+    """Test the streamed download with headers from the message, then a repeat served from the disk cache"""
+    print("\n🧪 Testing download endpoint and disk cache...")
+
+    try:
+        fake = make_mailbox()
+        # Caller-supplied names are not echoed into the response headers
+        url = "/api/gmail/attachments/m1/att-1?filename=evil.html&mime_type=text/html"
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(gmail_attachments, "_cache", AttachmentCache(tmp)), \
+                mock.patch.object(gmail_attachments, "ATTACHMENT_CACHE_DIR", tmp):
+            with TestClient(app) as client:
+                first = client.get(url)
+                fake.requests.clear()
+                second = client.get(url)
+            cached_files = os.listdir(tmp)
+
+        if first.status_code != 200 or first.content != REPORT:
+            print(f"❌ Download failed: {first.status_code}")
+            return False
+        for response in (first, second):
+            if response.headers["content-type"] != "application/pdf" or \
+                    response.headers["content-disposition"] != "attachment; filename*=UTF-8''report.pdf":
+                print(f"❌ Headers not taken from the message: {dict(response.headers)}")
+                return False
+        if second.content != REPORT or fake.requests or second.headers.get("content-length") != str(len(REPORT)):
+            print(f"❌ Repeat download was not served from disk: {fake.requests}")
+            return False
+        if len(cached_files) != 2:
+            print(f"❌ Unexpected cache directory contents: {cached_files}")
+            return False
+
+        print(f"✅ {len(REPORT)} bytes streamed, then served from the disk cache")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing download: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_cache_eviction_and_errors():
+    """Test the disk cache bound and a failed download"""
+    print("\n🧪 Testing cache eviction and download errors...")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = AttachmentCache(tmp, max_bytes=250)
+            for i in range(4):
+                with cache.writer("m", f"a{i}") as f:
+                    f.write(b"x" * 100)
+                os.utime(cache.path("m", f"a{i}"), (i, i))
+            kept = [i for i in range(4) if cache.get("m", f"a{i}")]
+            if kept != [2, 3]:
+                print(f"❌ Wrong files kept: {kept}")
+                return False
+
+        make_mailbox()
+        with TestClient(app) as client:
+            response = client.get("/api/gmail/attachments/m1/missing")
+        if response.status_code != 400:
+            print(f"❌ Expected 400 for a bad attachment id, got {response.status_code}")
+            return False
+
+        print("✅ Oldest files evicted past the bound; bad id answered with 400")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing eviction: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all attachment tests"""
+    print("🚀 Starting attachment tests...\n")
+
+    tests = [
+        ("Decoder Chunk Boundaries", test_decoder_chunk_boundaries),
+        ("Read Lists Attachments", test_read_lists_attachments),
+        ("Download and Disk Cache", test_download_and_disk_cache),
+        ("Cache Eviction and Errors", test_cache_eviction_and_errors),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test script for Gmail batch fetching against the local fake
+"""
+
+from unittest import mock
+
+from app.schema.gmail_schema import GetEmailsInput, ReadEmailInput, SearchEmailsInput
+from app.services import gmail_batch, gmail_client, gmail_service
+from fake_gmail import FakeGmail
+
+
+def make_mailbox(n: int) -> FakeGmail:
+    fake = FakeGmail()
+    for i in range(n):
+        fake.add_message(f"m{i}", subject=f"Subject {i}", sender=f"user{i}@example.com")
+    gmail_client.use_transport(fake.transport())
+    return fake
+
+
+def test_batch_round_trips():
+    """Test that listing 25 emails costs 2 round-trips instead of 26"""
+    print("🧪 Testing batch round-trips...")
+
+    try:
+        fake = make_mailbox(25)
+        with mock.patch.object(gmail_service, "GMAIL_BATCH_ENABLED", False):
+            sequential = gmail_service.get_emails(GetEmailsInput(max_results=25))
+        sequential_trips = len(fake.requests)
+
+        fake.requests.clear()
+        batched = gmail_service.get_emails(GetEmailsInput(max_results=25))
+        batched_trips = len(fake.requests)
+
+        if [e.id for e in batched.emails] != [e.id for e in sequential.emails]:
+            print("❌ Batched results differ from sequential results")
+            return False
+        if batched_trips != 2:
+            print(f"❌ Expected 2 round-trips, got {batched_trips}")
+            return False
+
+        print(f"✅ Round-trips: {sequential_trips} sequential → {batched_trips} batched")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing batch round-trips: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_batch_chunking():
+    """Test that large listings are split into GMAIL_BATCH_SIZE chunks"""
+    print("\n🧪 Testing batch chunking...")
+
+    try:
+        fake = make_mailbox(120)
+        with mock.patch.object(gmail_service, "GMAIL_BATCH_SIZE", 50):
+            result = gmail_service.search_emails(SearchEmailsInput(query="anything", max_results=120))
+
+        batches = fake.count("POST /batch")
+        if len(result.emails) != 120 or batches != 3:
+            print(f"❌ Expected 120 emails in 3 batches, got {len(result.emails)} in {batches}")
+            return False
+
+        print(f"✅ 120 emails fetched in {batches} batch requests")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing batch chunking: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_partial_failures():
+    """Test that failures inside a batch only affect their own message"""
+    print("\n🧪 Testing partial batch failures...")
+
+    try:
+        fake = make_mailbox(6)
+        fake.fail_ids = {"m2": 404, "m4": 503}
+        result = gmail_service.get_emails(GetEmailsInput(max_results=6))
+
+        ids = [e.id for e in result.emails]
+        if ids != ["m5", "m3", "m1", "m0"]:
+            print(f"❌ Unexpected emails after partial failure: {ids}")
+            return False
+        if fake.count("GET /gmail/v1/users/me/messages/m4") != 1:
+            print("❌ Retryable failure was not retried individually")
+            return False
+
+        print("✅ 404 skipped, 503 retried on its own, other messages kept in order")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing partial failures: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_metadata_listing():
+    """Test that listings fetch metadata only and bodies are loaded on read"""
+    print("\n🧪 Testing metadata-only listing...")
+
+    try:
+        fake = make_mailbox(3)
+        fake.add_message("big", subject="Newsletter", body="<p>" + "x" * 500_000 + "</p>")
+        listing = gmail_service.get_emails(GetEmailsInput(max_results=4))
+        if any(e.body is not None for e in listing.emails) or listing.emails[0].snippet is None:
+            print("❌ Listing returned bodies or lost the snippet")
+            return False
+
+        read = gmail_service.read_email(ReadEmailInput(email_id="big"))
+        if not read.success or len(read.email.body) < 500_000:
+            print("❌ read_email did not load the full body")
+            return False
+
+        print("✅ Listing carried headers and snippets only; read_email loaded the body")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing metadata-only listing: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_parse_batch_response():
+    """Test multipart parsing of a batch response"""
+    print("\n🧪 Testing batch response parsing...")
+
+    content = (
+        b"--batch_x\r\nContent-Type: application/http\r\nContent-ID: <response-item-1>\r\n\r\n"
+        b"HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\n\r\n{\"error\": {\"code\": 404}}\r\n"
+        b"--batch_x\r\nContent-Type: application/http\r\nContent-ID: <response-item-0>\r\n\r\n"
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{\"id\": \"a\"}\r\n"
+        b"--batch_x--"
+    )
+    parsed = gmail_batch.parse_batch_response(content, 'multipart/mixed; boundary="batch_x"')
+    if parsed != {0: (200, {"id": "a"}), 1: (404, {"error": {"code": 404}})}:
+        print(f"❌ Unexpected parse result: {parsed}")
+        return False
+
+    print("✅ Parts matched back to their requests by Content-ID")
+    return True
+
+
+def main():
+    """Run all Gmail batch tests"""
+    print("🚀 Starting Gmail batch tests...\n")
+
+    tests = [
+        ("Batch Round-trips", test_batch_round_trips),
+        ("Batch Chunking", test_batch_chunking),
+        ("Partial Failures", test_partial_failures),
+        ("Metadata Listing", test_metadata_listing),
+        ("Batch Response Parsing", test_parse_batch_response),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
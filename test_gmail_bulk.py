@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk modify and delete against the local fake
+"""
+
+import os
+import tempfile
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import BulkModifyEmailsInput, GetEmailsInput
+from app.services import gmail_client, gmail_service, mail_cache
+from app.services.mail_cache import MailCache
+from app.tools.gmail_tool import TRASH_TOOL_MAX_EMAILS, bulk_modify_emails_tool, trash_emails_tool
+from fake_gmail import FakeGmail
+
+BATCH_MODIFY = "POST /gmail/v1/users/me/messages/batchModify"
+BATCH_DELETE = "POST /gmail/v1/users/me/messages/batchDelete"
+
+
+def make_mailbox(n: int) -> FakeGmail:
+    fake = FakeGmail()
+    for i in range(n):
+        fake.add_message(f"m{i}", subject=f"Newsletter {i}")
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    return fake
+
+
+def test_modify_in_chunks():
+    """Test that 2500 ids become three batchModify calls with per-id results"""
+    print("🧪 Testing chunked bulk modify...")
+
+    try:
+        fake = make_mailbox(2500)
+        ids = [f"m{i}" for i in range(2500)]
+        result = gmail_service.bulk_modify_emails(BulkModifyEmailsInput(email_ids=ids + ids[:10], remove_labels=["UNREAD"]))
+
+        if fake.requests.count(BATCH_MODIFY) != 3:
+            print(f"❌ Expected 3 batchModify calls, got {fake.requests.count(BATCH_MODIFY)}")
+            return False
+        if result.succeeded != 2500 or result.failed or [r.email_id for r in result.results] != ids:
+            print(f"❌ Unexpected results: {result.message}")
+            return False
+        if any("UNREAD" in m["labelIds"] for m in fake.messages.values()):
+            print("❌ Some messages are still unread")
+            return False
+
+        print("✅ 2500 emails modified in 3 calls with per-id results")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing bulk modify: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_partial_failure():
+    """Test that a failed chunk only fails its own ids"""
+    print("\n🧪 Testing a failed chunk...")
+
+    try:
+        fake = make_mailbox(1500)
+        fake.fail_batches = [503]
+        ids = [f"m{i}" for i in range(1500)]
+        result = gmail_service.bulk_modify_emails(BulkModifyEmailsInput(email_ids=ids, add_labels=["STARRED"]))
+
+        # The chunks run concurrently, so either one may draw the injected failure
+        failed = [r.email_id for r in result.results if not r.success]
+        if failed not in (ids[:1000], ids[1000:]) or result.succeeded != 1500 - len(failed):
+            print(f"❌ Unexpected partial results: {result.message}")
+            return False
+        if any(("STARRED" in fake.messages[r.email_id]["labelIds"]) != r.success for r in result.results):
+            print("❌ Labels do not match the chunk outcomes")
+            return False
+        if any("503" not in r.error for r in result.results if not r.success):
+            print("❌ Failed ids do not report their chunk's error")
+            return False
+
+        print(f"✅ Failed chunk reported for its {len(failed)} ids; the other {result.succeeded} modified")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing partial failure: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_delete_by_query_endpoint():
+    """Test /bulk-delete selecting emails by query, with the mailbox cache kept in step"""
+    print("\n🧪 Testing bulk delete by query...")
+
+    try:
+        fake = make_mailbox(30)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mail.db")
+            cache = MailCache(path)
+            with mock.patch.object(mail_cache, "MAIL_CACHE_PATH", path), mock.patch.object(mail_cache, "_cache", cache):
+                gmail_service.get_emails(GetEmailsInput(max_results=5))
+                with TestClient(app) as client:
+                    response = client.post("/api/gmail/bulk-delete", json={"query": "category:promotions", "max_emails": 20})
+                remaining = cache.stats()["messages"]
+
+        body = response.json()
+        if response.status_code != 200 or body["succeeded"] != 20 or fake.requests.count(BATCH_DELETE) != 1:
+            print(f"❌ Unexpected response: {response.status_code} {body.get('message')}")
+            return False
+        if len(fake.messages) != 10 or remaining != 10:
+            print(f"❌ Expected 10 messages left in Gmail and the cache, got {len(fake.messages)} and {remaining}")
+            return False
+
+        print("✅ 20 emails deleted in one call; cache dropped them too")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing bulk delete: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_trash_tool():
+    """Test that the agents move at most TRASH_TOOL_MAX_EMAILS emails to Trash, through trash_emails only, and never delete"""
+    print("\n🧪 Testing the trash_emails tool...")
+
+    try:
+        fake = make_mailbox(TRASH_TOOL_MAX_EMAILS + 50)
+        message = trash_emails_tool.invoke({"query": "category:promotions"})
+        too_many = trash_emails_tool.invoke({"email_ids": [f"m{i}" for i in range(TRASH_TOOL_MAX_EMAILS + 1)]})
+        bypass = bulk_modify_emails_tool.invoke({"query": "category:promotions", "add_labels": ["TRASH"]})
+        trashed = sum(1 for m in fake.messages.values() if "TRASH" in m["labelIds"])
+
+        if message != f"🗑️ Moved {TRASH_TOOL_MAX_EMAILS} of {TRASH_TOOL_MAX_EMAILS} emails to Trash":
+            print(f"❌ Unexpected tool answer: {message}")
+            return False
+        if trashed != TRASH_TOOL_MAX_EMAILS or len(fake.messages) != TRASH_TOOL_MAX_EMAILS + 50 or BATCH_DELETE in fake.requests:
+            print(f"❌ Expected {TRASH_TOOL_MAX_EMAILS} trashed and none deleted, got {trashed} trashed")
+            return False
+        if not too_many.startswith("❌"):
+            print(f"❌ Expected too many ids to be refused: {too_many}")
+            return False
+        if not bypass.startswith("❌ Use trash_emails"):
+            print(f"❌ Expected bulk_modify_emails to refuse TRASH: {bypass}")
+            return False
+
+        print(f"✅ {message}; nothing permanently deleted")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing the trash tool: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_invalid_requests():
+    """Test that a bulk call without a selection or without label changes is refused"""
+    print("\n🧪 Testing invalid bulk requests...")
+
+    try:
+        fake = make_mailbox(3)
+        with TestClient(app) as client:
+            no_selection = client.post("/api/gmail/bulk-delete", json={})
+            no_labels = client.post("/api/gmail/bulk-modify", json={"email_ids": ["m1"]})
+
+        if no_selection.status_code != 400 or no_labels.status_code != 400 or fake.requests:
+            print(f"❌ Expected two 400s and no Gmail calls, got {no_selection.status_code}, {no_labels.status_code}")
+            return False
+
+        print("✅ Both refused with 400 before calling Gmail")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing invalid requests: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all bulk operation tests"""
+    print("🚀 Starting bulk operation tests...\n")
+
+    tests = [
+        ("Modify in Chunks", test_modify_in_chunks),
+        ("Partial Failure", test_partial_failure),
+        ("Delete by Query", test_delete_by_query_endpoint),
+        ("Trash Tool", test_trash_tool),
+        ("Invalid Requests", test_invalid_requests),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test script for the label directory cache against the local fake
+"""
+
+import time
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import GetEmailsInput, GetLabelsInput
+from app.services import gmail_client, gmail_labels, gmail_service
+from fake_gmail import FakeGmail
+
+LABELS = "GET /gmail/v1/users/me/labels"
+
+
+def make_mailbox() -> FakeGmail:
+    """A mailbox with a user label whose id differs from its name"""
+    fake = FakeGmail()
+    fake.label_names = {"Label_7": "Receipts"}
+    fake.add_message("m1", subject="Your order", labels=["INBOX", "Label_7"])
+    fake.add_message("m2", subject="Lunch?", labels=["INBOX"])
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    gmail_labels.invalidate_labels()
+    return fake
+
+
+def test_names_resolved_locally():
+    """Test that get_emails takes a label name and labels.list is called once for many listings"""
+    print("🧪 Testing label names in get_emails...")
+
+    try:
+        fake = make_mailbox()
+        by_name = gmail_service.get_emails(GetEmailsInput(label="receipts"))
+        by_id = gmail_service.get_emails(GetEmailsInput(label="Label_7"))
+        inbox = gmail_service.get_emails(GetEmailsInput(label="Inbox"))
+        labels = gmail_service.get_labels(GetLabelsInput())
+
+        if not by_name.success or [e.id for e in by_name.emails] != ["m1"]:
+            print(f"❌ Label name not resolved: {by_name.message}")
+            return False
+        if [e.id for e in by_id.emails] != ["m1"] or by_id.next_cursor != by_name.next_cursor:
+            print(f"❌ Label id listing differs: {by_id.message}")
+            return False
+        if sorted(e.id for e in inbox.emails) != ["m1", "m2"]:
+            print(f"❌ System label not matched case-insensitively: {inbox.message}")
+            return False
+        if labels.label_ids.get("Receipts") != "Label_7" or fake.requests.count(LABELS) != 1:
+            print(f"❌ Expected one labels.list call, got {fake.requests.count(LABELS)}: {labels.label_ids}")
+            return False
+
+        print("✅ 'receipts', 'Label_7' and 'Inbox' resolved from a single labels.list call")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing label names: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_unknown_and_new_labels():
+    """Test that a new label is found after one reload and an unknown one lists the real names"""
+    print("\n🧪 Testing unknown and new labels...")
+
+    try:
+        fake = make_mailbox()
+        gmail_service.get_labels(GetLabelsInput())
+        fake.label_names["Label_8"] = "Travel"
+        fake.add_message("m3", subject="Boarding pass", labels=["Label_8"])
+
+        with mock.patch.object(gmail_labels, "MISS_RELOAD_INTERVAL", 0):
+            travel = gmail_service.get_emails(GetEmailsInput(label="Travel"))
+        unknown = gmail_service.get_emails(GetEmailsInput(label="Holidays"))
+
+        if not travel.success or [e.id for e in travel.emails] != ["m3"]:
+            print(f"❌ New label not picked up: {travel.message}")
+            return False
+        if unknown.success or "Holidays" not in unknown.message or "Receipts" not in unknown.message:
+            print(f"❌ Expected an unknown-label error naming the labels: {unknown.message}")
+            return False
+        if fake.requests.count(LABELS) != 2:
+            print(f"❌ Expected one reload, got {fake.requests.count(LABELS)} labels.list calls")
+            return False
+
+        print(f"✅ New label found after one reload; unknown label answered: {unknown.message}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing unknown labels: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_background_reload():
+    """Test that an expired directory is served at once and reloaded off the request path"""
+    print("\n🧪 Testing background reload...")
+
+    try:
+        fake = make_mailbox()
+        gmail_service.get_labels(GetLabelsInput())
+        fake.label_names["Label_7"] = "Invoices"
+
+        with mock.patch.object(gmail_labels, "GMAIL_LABELS_TTL", 0):
+            stale = gmail_service.get_labels(GetLabelsInput())
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and "Invoices" not in gmail_service.get_labels(GetLabelsInput()).labels:
+                time.sleep(0.01)
+        fresh = gmail_service.get_labels(GetLabelsInput())
+
+        if "Receipts" not in stale.labels:
+            print(f"❌ Expired directory not served while reloading: {stale.labels}")
+            return False
+        if "Invoices" not in fresh.labels:
+            print(f"❌ Directory not reloaded: {fresh.labels}")
+            return False
+
+        print(f"✅ Served the expired directory, then reloaded it in the background ({fake.requests.count(LABELS)} calls)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing background reload: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_get_endpoint_with_label_name():
+    """Test /api/gmail/get and /api/gmail/labels with label names"""
+    print("\n🧪 Testing /get with a label name...")
+
+    try:
+        fake = make_mailbox()
+        with TestClient(app) as client:
+            listing = client.post("/api/gmail/get", json={"label": "Receipts"})
+            labels = client.get("/api/gmail/labels")
+            unknown = client.post("/api/gmail/get", json={"label": "Holidays"})
+
+        emails = listing.json()["emails"]
+        if listing.status_code != 200 or [e["id"] for e in emails] != ["m1"]:
+            print(f"❌ Unexpected listing: {listing.status_code} {listing.text}")
+            return False
+        if labels.json()["label_ids"]["Receipts"] != "Label_7" or fake.requests.count(LABELS) != 1:
+            print(f"❌ Unexpected labels: {labels.json()}")
+            return False
+        if unknown.status_code != 400:
+            print(f"❌ Expected 400 for an unknown label, got {unknown.status_code}")
+            return False
+
+        print("✅ /get filtered by 'Receipts'; /labels answered from the same directory")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing /get with a label name: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all label tests"""
+    print("🚀 Starting label directory tests...\n")
+
+    tests = [
+        ("Names Resolved Locally", test_names_resolved_locally),
+        ("Unknown and New Labels", test_unknown_and_new_labels),
+        ("Background Reload", test_background_reload),
+        ("Get Endpoint With Label Name", test_get_endpoint_with_label_name),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
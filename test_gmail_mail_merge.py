@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Test script for mail merge against the local fake
+"""
+
+import asyncio
+import base64
+import email
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import MailMergeInput, MailMergeRecipient
+from app.services import gmail_client, gmail_outbox, gmail_profile, gmail_service
+from app.services.gmail_quota import AsyncQuotaTransport, QuotaStats, TokenBucket
+from app.tools.gmail_tool import mail_merge_tool
+from fake_gmail import FakeGmail
+
+PROFILE = "GET /gmail/v1/users/me/profile"
+SEND = "POST /gmail/v1/users/me/messages/send"
+
+
+def make_mailbox() -> FakeGmail:
+    fake = FakeGmail()
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    gmail_profile.invalidate_profile()
+    return fake
+
+
+@contextmanager
+def outbox_enabled():
+    """Turn on outbox mode with a fresh queue file"""
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(gmail_outbox, "OUTBOX_PATH", os.path.join(tmp, "outbox.db")), \
+            mock.patch.object(gmail_outbox, "_outbox", None), mock.patch.object(gmail_outbox, "_workers", None):
+        try:
+            yield
+        finally:
+            gmail_outbox.stop_workers()
+
+
+def announcement(count: int) -> MailMergeInput:
+    return MailMergeInput(
+        subject="Launch day, {{ first_name }}",
+        body="Hi {{first_name}},\n\nThe {{team}} launch is today. This copy went to {{to}}.",
+        recipients=[MailMergeRecipient(to=f"user{i}@example.com", variables={"first_name": f"User{i}", "team": "Apps"})
+                    for i in range(count)],
+    )
+
+
+def sent_messages(fake: FakeGmail) -> dict:
+    """Sent emails by recipient"""
+    messages = [email.message_from_bytes(base64.urlsafe_b64decode(sent["raw"])) for sent in fake.sent]
+    return {message["to"]: message for message in messages}
+
+
+def test_render_and_send():
+    """Test that every recipient gets their own text, the profile is read once and a missing variable fails alone"""
+    print("🧪 Testing rendering and sending...")
+
+    try:
+        fake = make_mailbox()
+        input = announcement(20)
+        input.recipients[7].variables = {"first_name": "Seven"}
+        result = gmail_service.mail_merge(input)
+        sent = sent_messages(fake)
+
+        if not result.success or (result.sent, result.failed) != (19, 1) or len(fake.sent) != 19:
+            print(f"❌ Unexpected result: {result.message}")
+            return False
+        if [r.index for r in result.results] != list(range(20)) or result.results[7].error != "Missing variable 'team'":
+            print(f"❌ Unexpected results: {result.results[7]}")
+            return False
+        if "user7@example.com" in sent or fake.count(PROFILE) != 1 or fake.count(SEND) != 19:
+            print(f"❌ Expected one profile lookup and 19 sends: {fake.count(PROFILE)} {fake.count(SEND)}")
+            return False
+        message = sent["user3@example.com"]
+        body = message.get_payload()[0].get_payload(decode=True).decode()
+        if message["subject"] != "Launch day, User3" or "Hi User3," not in body or "went to user3@example.com" not in body:
+            print(f"❌ Unexpected rendering: {message['subject']} {body}")
+            return False
+
+        print(f"✅ {result.message}; one profile lookup")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing rendering: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_concurrent_under_quota():
+    """Test that sends overlap up to GMAIL_MAX_CONCURRENCY and are paced by the quota bucket"""
+    print("\n🧪 Testing concurrency and quota pacing...")
+
+    try:
+        fake = make_mailbox()
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+
+        async def slow(request: httpx.Request) -> httpx.Response:
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            await asyncio.sleep(0.05)
+            with lock:
+                state["in_flight"] -= 1
+            return fake.handle(request)
+
+        with mock.patch.object(gmail_service, "GMAIL_MAX_CONCURRENCY", 4):
+            gmail_client.use_transport(fake.transport(), httpx.MockTransport(slow))
+            started = time.monotonic()
+            fast = asyncio.run(gmail_service.amail_merge(announcement(16)))
+            unpaced = time.monotonic() - started
+            peak = state["peak"]
+
+            # Each send costs 100 units: with 1000 units a second, 10 sends take about 0.9 seconds
+            bucket = TokenBucket(rate=1000, burst=105)
+            gmail_client.use_transport(fake.transport(), AsyncQuotaTransport(httpx.MockTransport(slow), bucket, QuotaStats()))
+            started = time.monotonic()
+            paced = asyncio.run(gmail_service.amail_merge(announcement(10)))
+            elapsed = time.monotonic() - started
+
+        if fast.sent != 16 or paced.sent != 10 or len(fake.sent) != 26:
+            print(f"❌ Unexpected results: {fast.message} {paced.message}")
+            return False
+        if peak != 4 or unpaced > 16 * 0.05 / 2:
+            print(f"❌ Expected 4 sends at a time, got a peak of {peak} in {unpaced:.2f}s")
+            return False
+        if elapsed < 0.8:
+            print(f"❌ 10 sends took {elapsed:.2f}s; the quota bucket did not pace them")
+            return False
+
+        print(f"✅ 16 sends in {unpaced:.2f}s, 4 at a time; 10 paced sends took {elapsed:.2f}s")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing concurrency: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_mail_merge_endpoint():
+    """Test /api/gmail/mail-merge, streamed and not, and a request with no recipients"""
+    print("\n🧪 Testing /mail-merge endpoint...")
+
+    try:
+        fake = make_mailbox()
+        with TestClient(app) as client:
+            streamed = client.post("/api/gmail/mail-merge?stream=true", json=announcement(5).model_dump())
+            whole = client.post("/api/gmail/mail-merge", json=announcement(3).model_dump())
+            empty = client.post("/api/gmail/mail-merge", json={"subject": "x", "body": "y", "recipients": []})
+
+        lines = [json.loads(line) for line in streamed.text.splitlines()]
+        if streamed.status_code != 200 or sorted(line["result"]["index"] for line in lines[:-1]) != list(range(5)):
+            print(f"❌ Unexpected stream: {streamed.status_code} {streamed.text[:300]}")
+            return False
+        if lines[-1]["summary"]["sent"] != 5 or lines[-1]["summary"]["results"] is not None:
+            print(f"❌ Unexpected trailer: {lines[-1]}")
+            return False
+        results = whole.json()["results"]
+        if whole.status_code != 200 or [r["to"] for r in results] != [f"user{i}@example.com" for i in range(3)]:
+            print(f"❌ Unexpected response: {whole.text[:300]}")
+            return False
+        if empty.status_code != 400 or len(fake.sent) != 8:
+            print(f"❌ Expected 400 without recipients, got {empty.status_code}")
+            return False
+
+        print(f"✅ Streamed {len(lines) - 1} results then the totals; {whole.json()['message']}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing /mail-merge: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_tool_queues_with_outbox():
+    """Test the mail_merge tool, queueing the emails when the outbox is on"""
+    print("\n🧪 Testing the mail_merge tool with the outbox...")
+
+    try:
+        fake = make_mailbox()
+        with outbox_enabled():
+            message = mail_merge_tool.invoke({
+                "subject": "Hi {{name}}",
+                "body": "See you soon, {{name}}",
+                "recipients": [{"to": "ann@example.com", "variables": {"name": "Ann"}},
+                               {"to": "bo@example.com"}],
+            })
+            outbox = gmail_outbox.get_outbox()
+            deadline = time.monotonic() + 5
+            while outbox.counts()["sent"] < 1 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            counts = outbox.counts()
+
+        if not message.startswith("📤 Queued 1 of 2 emails (1 failed)") or "bo@example.com: Missing variable 'name'" not in message:
+            print(f"❌ Unexpected tool answer: {message}")
+            return False
+        if counts["sent"] != 1 or list(sent_messages(fake)) != ["ann@example.com"]:
+            print(f"❌ Queued email not delivered: {counts}")
+            return False
+
+        print(f"✅ Tool answered: {message.splitlines()[0]}; the outbox delivered the rendered email")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing the tool: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all mail merge tests"""
+    print("🚀 Starting mail merge tests...\n")
+
+    tests = [
+        ("Render And Send", test_render_and_send),
+        ("Concurrent Under Quota", test_concurrent_under_quota),
+        ("Mail Merge Endpoint", test_mail_merge_endpoint),
+        ("Tool Queues With Outbox", test_tool_queues_with_outbox),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script for email body extraction from Gmail payloads
+"""
+
+import base64
+
+from app.services import gmail_mime
+from app.services.gmail_service import extract_email_body
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def text_part(mime_type: str, text: str, charset: str = None, **extra) -> dict:
+    part = {"mimeType": mime_type, "body": {"data": b64url(text.encode(charset or "utf-8"))}, **extra}
+    if charset:
+        part["headers"] = [{"name": "Content-Type", "value": f'{mime_type}; charset="{charset}"'}]
+    return part
+
+
+def test_nested_alternative():
+    """Test that text/plain is found inside multipart/alternative inside multipart/mixed"""
+    print("🧪 Testing nested multipart payloads...")
+
+    try:
+        payload = {"mimeType": "multipart/mixed", "parts": [
+            {"mimeType": "multipart/alternative", "parts": [
+                text_part("text/html", "<p>HTML version</p>"),
+                text_part("text/plain", "Plain version"),
+            ]},
+            text_part("text/plain", "Attached notes", filename="notes.txt"),
+        ]}
+        body = extract_email_body(payload)
+        if body != "Plain version":
+            print(f"❌ Expected the nested plain part, got {body!r}")
+            return False
+
+        print("✅ Nested text/plain part chosen over HTML and the text attachment")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing nested payloads: {str(e)}")
+        return False
+
+
+def test_html_fallback():
+    """Test that HTML-only mail is returned as readable text"""
+    print("\n🧪 Testing HTML fallback...")
+
+    try:
+        html = ("<html><head><style>p {color: red}</style></head><body>"
+                "<p>Hello&nbsp;<b>there</b></p><script>track()</script><div>Second   line</div></body></html>")
+        body = extract_email_body(text_part("text/html", html))
+        if body != "Hello there\n\nSecond line":
+            print(f"❌ Unexpected text from HTML: {body!r}")
+            return False
+        if extract_email_body({"mimeType": "multipart/mixed", "parts": []}) != "No readable content":
+            print("❌ Payload without text parts was not reported")
+            return False
+
+        print("✅ Tags, styles and scripts stripped from the HTML body")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing HTML fallback: {str(e)}")
+        return False
+
+
+def test_truncation():
+    """Test the decoded size cap, across decode chunks and multi-byte characters"""
+    print("\n🧪 Testing body truncation...")
+
+    try:
+        text = "é" * 200_000  # 400,000 bytes, several decode chunks
+        part = text_part("text/plain", text)
+
+        body = gmail_mime.extract_body(part, max_bytes=100_001)
+        marker = gmail_mime.TRUNCATION_MARKER.format(limit=100_001)
+        if not body.endswith(marker) or body[:-len(marker)] != "é" * 50_000:
+            print(f"❌ Unexpected truncated body ({len(body)} characters)")
+            return False
+        if gmail_mime.extract_body(part, max_bytes=None) != text or gmail_mime.extract_body(part, 400_000) != text:
+            print("❌ Body at or under the cap was changed")
+            return False
+
+        print("✅ Body cut at the cap without splitting a character, marker appended")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing truncation: {str(e)}")
+        return False
+
+
+def test_charsets_and_depth():
+    """Test declared charsets and payloads nested deeper than the recursion limit"""
+    print("\n🧪 Testing charsets and deep nesting...")
+
+    try:
+        latin = extract_email_body(text_part("text/plain", "Grüße aus Köln", charset="iso-8859-1"))
+        unknown = text_part("text/plain", "plain ascii")
+        unknown["headers"] = [{"name": "Content-Type", "value": "text/plain; charset=x-made-up"}]
+        unknown = extract_email_body(unknown)
+        if latin != "Grüße aus Köln" or unknown != "plain ascii":
+            print(f"❌ Charset handling failed: {latin!r}, {unknown!r}")
+            return False
+
+        payload = text_part("text/plain", "Bottom of the chain")
+        for i in range(5000):
+            payload = {"mimeType": "multipart/mixed", "parts": [
+                payload, {"mimeType": "image/png", "filename": f"{i}.png", "body": {"attachmentId": str(i)}},
+            ]}
+        if extract_email_body(payload) != "Bottom of the chain":
+            print("❌ Deeply nested part not found")
+            return False
+
+        print("✅ Declared charsets decoded; 5000-level payload walked")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing charsets and depth: {str(e)}")
+        return False
+
+
+def main():
+    """Run all body extraction tests"""
+    print("🚀 Starting body extraction tests...\n")
+
+    tests = [
+        ("Nested Alternative", test_nested_alternative),
+        ("HTML Fallback", test_html_fallback),
+        ("Truncation", test_truncation),
+        ("Charsets and Depth", test_charsets_and_depth),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Test script for the send outbox against the local fake
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import GetOutboxStatusInput, SendEmailInput
+from app.services import gmail_client, gmail_outbox, gmail_profile, gmail_service
+from app.services.gmail_outbox import Outbox, OutboxWorkers
+from fake_gmail import FakeGmail
+
+EMAIL = SendEmailInput(to="bob@example.com", subject="Launch", body="We are live")
+
+
+def make_mailbox(latency: float = 0.0) -> FakeGmail:
+    """A fake mailbox whose every call takes latency seconds"""
+    fake = FakeGmail()
+
+    def slow(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return fake.handle(request)
+
+    gmail_client.use_transport(httpx.MockTransport(slow), fake.transport())
+    gmail_profile.invalidate_profile()
+    return fake
+
+
+@contextmanager
+def outbox_enabled():
+    """Turn on outbox mode with a fresh queue file"""
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(gmail_outbox, "OUTBOX_PATH", os.path.join(tmp, "outbox.db")), \
+            mock.patch.object(gmail_outbox, "_outbox", None), mock.patch.object(gmail_outbox, "_workers", None):
+        try:
+            yield
+        finally:
+            gmail_outbox.stop_workers()
+
+
+def wait_for_status(outbox_id: str, status: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = gmail_service.get_outbox_status(GetOutboxStatusInput(outbox_id=outbox_id))
+        if result.status == status:
+            return result
+        time.sleep(0.02)
+    return result
+
+
+def test_send_returns_before_delivery():
+    """Test that send_email answers at local-write speed and the email is delivered in the background"""
+    print("🧪 Testing queued send...")
+
+    try:
+        fake = make_mailbox(latency=0.3)
+        with outbox_enabled():
+            started = time.perf_counter()
+            result = gmail_service.send_email(EMAIL)
+            elapsed = time.perf_counter() - started
+            status = wait_for_status(result.outbox_id, "sent")
+
+        if not result.success or not result.outbox_id or result.email_id:
+            print(f"❌ Expected a queued result: {result.message}")
+            return False
+        if elapsed > 0.15:
+            print(f"❌ send_email took {elapsed:.2f}s with a 0.3s Gmail round-trip")
+            return False
+        if status.status != "sent" or status.email_id != "sent1" or len(fake.sent) != 1:
+            print(f"❌ Email not delivered: {status.message}")
+            return False
+
+        print(f"✅ Queued in {elapsed * 1000:.1f} ms; delivered in the background as {status.email_id}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing queued send: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_retries_and_failures():
+    """Test that a 429 is retried, a rejection fails at once, a 5xx is never resent, and attempts are bounded"""
+    print("\n🧪 Testing delivery retries...")
+
+    try:
+        fake = make_mailbox()
+        with tempfile.TemporaryDirectory() as tmp:
+            outbox = Outbox(os.path.join(tmp, "outbox.db"))
+            workers = OutboxWorkers(outbox, gmail_service.send_queued_email, max_attempts=3, retry_delay=0)
+
+            fake.fail_sends = [429]
+            retried = outbox.enqueue(EMAIL)
+            workers.run_once()
+            between = outbox.get(retried)
+            workers.run_once()
+
+            fake.fail_sends = [400]
+            rejected = outbox.enqueue(EMAIL)
+            workers.run_once()
+
+            fake.fail_sends = [503]
+            ambiguous = outbox.enqueue(EMAIL)
+            while workers.run_once():
+                pass
+
+            # A 503 from the sender lookup comes before any send, so it is retried
+            gmail_profile.invalidate_profile()
+            fake.throttle = [(503, None)]
+            lookup_failed = outbox.enqueue(EMAIL)
+            workers.run_once()
+            after_lookup = outbox.get(lookup_failed)
+            workers.run_once()
+
+            fake.fail_sends = [429, 429, 429]
+            exhausted = outbox.enqueue(EMAIL)
+            while workers.run_once():
+                pass
+            rows = {name: outbox.get(i) for name, i in (("retried", retried), ("rejected", rejected),
+                                                        ("ambiguous", ambiguous), ("lookup_failed", lookup_failed),
+                                                        ("exhausted", exhausted))}
+
+        if between["status"] != "queued" or "429" not in between["error"]:
+            print(f"❌ 429 not queued for a retry: {dict(between)}")
+            return False
+        if rows["retried"]["status"] != "sent" or rows["retried"]["attempts"] != 2:
+            print(f"❌ Retry did not deliver: {dict(rows['retried'])}")
+            return False
+        if rows["rejected"]["status"] != "failed" or rows["rejected"]["attempts"] != 1:
+            print(f"❌ 400 should fail without a retry: {dict(rows['rejected'])}")
+            return False
+        if rows["ambiguous"]["status"] != "unknown" or rows["ambiguous"]["attempts"] != 1:
+            print(f"❌ 503 should be unknown without a resend: {dict(rows['ambiguous'])}")
+            return False
+        if after_lookup["status"] != "queued" or "/profile" not in after_lookup["error"]:
+            print(f"❌ A failed sender lookup should be retried: {dict(after_lookup)}")
+            return False
+        if rows["lookup_failed"]["status"] != "sent" or rows["lookup_failed"]["attempts"] != 2:
+            print(f"❌ Retry after the sender lookup did not deliver: {dict(rows['lookup_failed'])}")
+            return False
+        if rows["exhausted"]["status"] != "failed" or rows["exhausted"]["attempts"] != 3 or len(fake.sent) != 2:
+            print(f"❌ Attempts not bounded: {dict(rows['exhausted'])}")
+            return False
+        request = httpx.Request("POST", "https://gmail.googleapis.com/")
+        if not gmail_outbox.may_have_sent(httpx.ReadTimeout("timed out", request=request)) \
+                or gmail_outbox.may_have_sent(httpx.ConnectError("refused", request=request)):
+            print("❌ A read timeout may have sent the email; a refused connection cannot have")
+            return False
+
+        print("✅ 429 retried then sent; 400 failed at once; 503 left unknown; a failed sender lookup retried; "
+              "three 429s failed after 3 attempts")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing retries: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_restart_recovery():
+    """Test that a delivery cut short by a restart is not sent again, and queued emails survive"""
+    print("\n🧪 Testing restart recovery...")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "outbox.db")
+            outbox = Outbox(path)
+            in_flight = outbox.enqueue(EMAIL)
+            waiting = outbox.enqueue(EMAIL)
+            outbox.claim()
+
+            reopened = Outbox(path)
+            states = [reopened.get(i)["status"] for i in (in_flight, waiting)]
+            counts = reopened.counts()
+
+        if states != ["unknown", "queued"] or counts["queued"] != 1 or counts["unknown"] != 1:
+            print(f"❌ Unexpected states after restart: {states} {counts}")
+            return False
+
+        print("✅ In-flight email marked unknown and the waiting one still queued after reopening")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing restart recovery: {str(e)}")
+        return False
+
+
+def test_bulk_send_queues():
+    """Test that /send-bulk queues every email when the outbox is on"""
+    print("\n🧪 Testing bulk send through the outbox...")
+
+    try:
+        fake = make_mailbox()
+        with outbox_enabled():
+            with TestClient(app) as client:
+                response = client.post("/api/gmail/send-bulk", json={"emails": [EMAIL.model_dump(), EMAIL.model_dump()]})
+            body = response.json()
+            statuses = [wait_for_status(result["outbox_id"], "sent").status for result in body["results"]]
+
+        if response.status_code != 200 or not body["message"].startswith("📤 Queued 2 of 2"):
+            print(f"❌ Unexpected response: {response.status_code} {body}")
+            return False
+        if statuses != ["sent", "sent"] or any(result["email_id"] for result in body["results"]) or len(fake.sent) != 2:
+            print(f"❌ Queued emails not delivered by the outbox: {statuses}")
+            return False
+
+        print(f"✅ {body['message']}; the outbox delivered both")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing bulk send: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_outbox_endpoints():
+    """Test /send in outbox mode and /outbox/{id}"""
+    print("\n🧪 Testing outbox endpoints...")
+
+    try:
+        fake = make_mailbox()
+        with outbox_enabled(), TestClient(app) as client:
+            queued = client.post("/api/gmail/send", json=EMAIL.model_dump()).json()
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                status = client.get(f"/api/gmail/outbox/{queued['outbox_id']}").json()
+                if status["status"] == "sent":
+                    break
+                time.sleep(0.02)
+            missing = client.get("/api/gmail/outbox/nope")
+
+        if status["status"] != "sent" or status["to"] != EMAIL.to or len(fake.sent) != 1:
+            print(f"❌ Unexpected status: {status}")
+            return False
+        if missing.status_code != 400:
+            print(f"❌ Expected 400 for an unknown id, got {missing.status_code}")
+            return False
+
+        print(f"✅ /send queued {queued['outbox_id'][:8]}…; /outbox reported it sent")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing outbox endpoints: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all outbox tests"""
+    print("🚀 Starting outbox tests...\n")
+
+    tests = [
+        ("Send Returns Before Delivery", test_send_returns_before_delivery),
+        ("Retries and Failures", test_retries_and_failures),
+        ("Restart Recovery", test_restart_recovery),
+        ("Bulk Send Queues", test_bulk_send_queues),
+        ("Outbox Endpoints", test_outbox_endpoints),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script for paginated Gmail listings and cursors against the local fake
+"""
+
+import asyncio
+import os
+import tempfile
+from unittest import mock
+
+from app.schema.gmail_schema import GetEmailsInput, SearchEmailsInput
+from app.services import gmail_client, gmail_service, mail_cache
+from app.services.mail_cache import MailCache
+from fake_gmail import FakeGmail
+
+LIST = "GET /gmail/v1/users/me/messages"
+
+
+def make_mailbox(n: int) -> FakeGmail:
+    fake = FakeGmail()
+    for i in range(n):
+        fake.add_message(f"m{i}", subject=f"Subject {i}")
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    return fake
+
+
+def walk(fetch, make_input, page_size: int):
+    """Follow next_cursor until the listing ends; returns ids and page count"""
+    ids, pages, cursor = [], 0, None
+    while True:
+        result = fetch(make_input(max_results=page_size, cursor=cursor))
+        if not result.success:
+            raise RuntimeError(result.message)
+        ids.extend(e.id for e in result.emails or [])
+        pages += 1
+        cursor = result.next_cursor
+        if not cursor:
+            return ids, pages
+
+
+def test_large_max_results():
+    """Test that max_results beyond one Gmail page follows nextPageToken"""
+    print("🧪 Testing large max_results...")
+
+    try:
+        fake = make_mailbox(1300)
+        result = gmail_service.get_emails(GetEmailsInput(max_results=1200))
+        if len(result.emails) != 1200 or fake.requests.count(LIST) != 3 or not result.next_cursor:
+            print(f"❌ Expected 1200 emails from 3 pages, got {len(result.emails)} from {fake.requests.count(LIST)}")
+            return False
+
+        print("✅ 1200 emails gathered from 3 list pages, with a cursor for the rest")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing large max_results: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_cursor_walk():
+    """Test walking a mailbox and a search with cursors, sync and async"""
+    print("\n🧪 Testing cursor walk...")
+
+    try:
+        make_mailbox(1234)
+        expected = [f"m{i}" for i in reversed(range(1234))]
+
+        ids, pages = walk(gmail_service.get_emails, GetEmailsInput, 500)
+        if ids != expected or pages != 3:
+            print(f"❌ Sync walk returned {len(ids)} ids in {pages} pages")
+            return False
+
+        ids, pages = walk(lambda i: asyncio.run(gmail_service.asearch_emails(i)),
+                          lambda **kw: SearchEmailsInput(query="anything", **kw), 300)
+        if ids != expected or pages != 5:
+            print(f"❌ Async search walk returned {len(ids)} ids in {pages} pages")
+            return False
+
+        print("✅ Every message visited exactly once, in order")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing cursor walk: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_cursor_scope():
+    """Test that a cursor is rejected by a different listing"""
+    print("\n🧪 Testing cursor scope...")
+
+    try:
+        make_mailbox(30)
+        first = gmail_service.get_emails(GetEmailsInput(max_results=10))
+        other = gmail_service.get_emails(GetEmailsInput(max_results=10, label="INBOX", cursor=first.next_cursor))
+        garbage = gmail_service.search_emails(SearchEmailsInput(query="x", cursor="not-a-cursor"))
+        if other.success or garbage.success:
+            print("❌ Foreign or malformed cursor was accepted")
+            return False
+
+        print(f"✅ Rejected: {other.message}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing cursor scope: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_lazy_pages():
+    """Test that the pager only requests pages as they are consumed"""
+    print("\n🧪 Testing lazy page iteration...")
+
+    try:
+        fake = make_mailbox(1200)
+        pages = gmail_service.iter_message_pages(gmail_service.get_gmail_service(), {})
+        ids, token = next(pages)
+        if len(ids) != 500 or not token or fake.requests.count(LIST) != 1:
+            print("❌ Pager fetched more than the first page")
+            return False
+
+        print("✅ One request for the first page")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing lazy pages: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_cached_pages():
+    """Test cursor pages served from the mailbox cache"""
+    print("\n🧪 Testing cursor pages from the cache...")
+
+    try:
+        fake = make_mailbox(25)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mail.db")
+            with mock.patch.object(mail_cache, "MAIL_CACHE_PATH", path), \
+                    mock.patch.object(mail_cache, "_cache", MailCache(path)):
+                gmail_service.get_emails(GetEmailsInput(max_results=1))
+                fake.requests.clear()
+                ids, pages = walk(gmail_service.get_emails, GetEmailsInput, 10)
+
+        if ids != [f"m{i}" for i in reversed(range(25))] or pages != 3 or fake.requests:
+            print(f"❌ Cached walk returned {len(ids)} ids in {pages} pages with {len(fake.requests)} requests")
+            return False
+
+        print("✅ 3 cached pages, no requests to Gmail")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing cached pages: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all Gmail paging tests"""
+    print("🚀 Starting Gmail paging tests...\n")
+
+    tests = [
+        ("Large max_results", test_large_max_results),
+        ("Cursor Walk", test_cursor_walk),
+        ("Cursor Scope", test_cursor_scope),
+        ("Lazy Pages", test_lazy_pages),
+        ("Cached Pages", test_cached_pages),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Test script for prefetching listed emails against the local fake
+"""
+
+from contextlib import contextmanager
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import EmailRecord, GetEmailsInput, MarkAsReadInput, ReadEmailInput, SearchEmailsInput
+from app.services import gmail_client, gmail_prefetch, gmail_service
+from app.services.gmail_prefetch import Prefetcher
+from app.services.gmail_quota import TokenBucket
+from fake_gmail import FakeGmail
+
+MESSAGE = "GET /gmail/v1/users/me/messages/"
+
+
+def make_mailbox() -> FakeGmail:
+    """10 emails, m9 the newest"""
+    fake = FakeGmail()
+    for i in range(10):
+        fake.add_message(f"m{i}", subject=f"Email {i}", body=f"Body of email {i}")
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    return fake
+
+
+@contextmanager
+def prefetch_enabled(count: int = 3):
+    with mock.patch.object(gmail_prefetch, "GMAIL_PREFETCH_COUNT", count), \
+            mock.patch.object(gmail_prefetch, "_prefetcher", None):
+        yield
+
+
+def test_reads_after_listing_served():
+    """Test that reading the top emails of a listing makes no further calls"""
+    print("🧪 Testing reads after a listing...")
+
+    try:
+        fake = make_mailbox()
+        with prefetch_enabled():
+            listing = gmail_service.get_emails(GetEmailsInput(max_results=10))
+            listed = [e.id for e in listing.emails]
+            reads = [gmail_service.read_email(ReadEmailInput(email_id=email_id)) for email_id in listed[:3]]
+            single_fetches = fake.count(MESSAGE)
+            late = gmail_service.read_email(ReadEmailInput(email_id=listed[5]))
+            metrics = gmail_service.get_metrics()
+
+        if [r.email.body for r in reads] != [f"Body of email {i}" for i in (9, 8, 7)]:
+            print(f"❌ Unexpected bodies: {[r.message for r in reads]}")
+            return False
+        if single_fetches or fake.count("POST /batch/gmail/v1") != 2:
+            print(f"❌ Expected the listing batch and one prefetch batch, got {fake.requests}")
+            return False
+        if late.email.body != "Body of email 4" or fake.count(MESSAGE) != 1:
+            print(f"❌ Email past the prefetched ones not fetched: {late.message}")
+            return False
+        prefetch = metrics.prefetch
+        if (prefetch.hits, prefetch.misses, prefetch.prefetched, prefetch.hit_rate) != (3, 1, 3, 0.75):
+            print(f"❌ Unexpected metrics: {prefetch}")
+            return False
+
+        print(f"✅ Three reads with no calls after the listing; {metrics.message}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing reads after a listing: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_changes_drop_prefetched():
+    """Test that marking an email read drops the prefetched copy with the old labels"""
+    print("\n🧪 Testing prefetched emails after a change...")
+
+    try:
+        fake = make_mailbox()
+        with prefetch_enabled():
+            gmail_service.search_emails(SearchEmailsInput(query="Email", max_results=5))
+            gmail_service.mark_as_read(MarkAsReadInput(email_id="m9"))
+            read = gmail_service.read_email(ReadEmailInput(email_id="m9"))
+            held = gmail_prefetch.get_prefetcher().snapshot()["held"]
+
+        if "UNREAD" in read.email.labels or fake.count(MESSAGE + "m9") != 1:
+            print(f"❌ Stale labels served: {read.email.labels}")
+            return False
+        if held:
+            print(f"❌ {held} prefetched emails kept after the change")
+            return False
+
+        print("✅ mark_as_read dropped the prefetched emails; the read went to Gmail")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing changes: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_budget_and_busy_quota():
+    """Test the byte budget, the TTL and that prefetches wait for spare quota"""
+    print("\n🧪 Testing the byte budget and quota check...")
+
+    try:
+        headers = {"Authorization": "Bearer a"}
+
+        def fetch(ids):
+            return [EmailRecord(id=i, thread_id=i, subject="", sender="", recipient="", body="x" * 100, snippet="",
+                                date="") for i in ids]
+
+        prefetcher = Prefetcher(count=5, max_bytes=250, ttl=60)
+        prefetcher.schedule(headers, ["a", "b", "c"], fetch).result()
+        evicted = prefetcher.get(headers, "a")
+        kept = prefetcher.get(headers, "c")
+
+        prefetcher.ttl = 0
+        prefetcher.schedule(headers, ["d"], fetch).result()
+        expired = prefetcher.get(headers, "d")
+
+        with mock.patch.object(gmail_prefetch, "default_bucket", TokenBucket(rate=1, burst=1)):
+            busy = prefetcher.schedule(headers, ["e", "f"], fetch)
+        counts = prefetcher.snapshot()
+
+        if evicted is not None or kept is None or expired is not None:
+            print(f"❌ Unexpected lookups: {evicted} {kept} {expired}")
+            return False
+        if busy is not None or counts["skipped"] != 2 or counts["evicted"] != 1 or counts["expired"] != 1:
+            print(f"❌ Unexpected counters: {counts}")
+            return False
+
+        print(f"✅ Oldest evicted past 250 bytes, expired entry refused, busy bucket skipped: {counts}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing budget: {str(e)}")
+        return False
+
+
+def test_endpoints_use_prefetch():
+    """Test /get then /read on the async path, and the counters in /metrics"""
+    print("\n🧪 Testing /get, /read and /metrics...")
+
+    try:
+        fake = make_mailbox()
+        with prefetch_enabled(count=2), TestClient(app) as client:
+            listing = client.post("/api/gmail/get", json={"max_results": 5}).json()
+            read = client.post("/api/gmail/read", json={"email_id": listing["emails"][1]["id"]})
+            metrics = client.get("/api/gmail/metrics").json()
+
+        if read.status_code != 200 or read.json()["email"]["body"] != "Body of email 8":
+            print(f"❌ Unexpected read: {read.text}")
+            return False
+        if fake.count(MESSAGE) != 5 or metrics["prefetch"]["hits"] != 1:
+            print(f"❌ Read not served from the prefetch: {fake.requests} {metrics['prefetch']}")
+            return False
+
+        print(f"✅ /read served from the prefetch; /metrics: {metrics['message']}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing endpoints: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all prefetch tests"""
+    print("🚀 Starting prefetch tests...\n")
+
+    tests = [
+        ("Reads After Listing Served", test_reads_after_listing_served),
+        ("Changes Drop Prefetched", test_changes_drop_prefetched),
+        ("Budget and Busy Quota", test_budget_and_busy_quota),
+        ("Endpoints Use Prefetch", test_endpoints_use_prefetch),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Test script for the quota-aware transport layer against the local fake
+"""
+
+import asyncio
+import time
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import GetLabelsInput, SendEmailInput
+from app.services import gmail_client, gmail_labels, gmail_profile, gmail_quota, gmail_service
+from app.services.gmail_quota import AsyncQuotaTransport, QuotaStats, QuotaTransport, TokenBucket, request_cost
+from fake_gmail import FakeGmail
+
+LABELS = "GET /gmail/v1/users/me/labels"
+SEND = "POST /gmail/v1/users/me/messages/send"
+
+
+def make_mailbox(bucket=None, stats=None) -> FakeGmail:
+    """A fake mailbox behind the quota layer, as the network clients see Gmail"""
+    fake = FakeGmail()
+    fake.add_message("m1", subject="Quarterly numbers")
+    gmail_client.use_transport(QuotaTransport(fake.transport(), bucket, stats),
+                               AsyncQuotaTransport(fake.transport(), bucket, stats))
+    gmail_profile.invalidate_profile()
+    gmail_labels.invalidate_labels()
+    return fake
+
+
+def test_retry_after_honored():
+    """Test that 429s are retried after their Retry-After and counted"""
+    print("🧪 Testing Retry-After on 429...")
+
+    try:
+        stats = QuotaStats()
+        fake = make_mailbox(TokenBucket(rate=0), stats)
+        fake.throttle = [(429, "0.3"), (429, "0")]
+        with mock.patch.object(gmail_quota, "GMAIL_RETRY_BASE_DELAY", 0.01):
+            started = time.perf_counter()
+            result = gmail_service.get_labels(GetLabelsInput())
+            elapsed = time.perf_counter() - started
+
+        counts = stats.snapshot()
+        if not result.success or fake.requests.count(LABELS) != 3:
+            print(f"❌ Labels not fetched after the 429s: {result.message}")
+            return False
+        if elapsed < 0.3 or counts["throttled"] != 2 or counts["retries"] != 2 or counts["gave_up"]:
+            print(f"❌ Unexpected wait or counters: {elapsed:.2f}s {counts}")
+            return False
+
+        print(f"✅ Two 429s retried; waited {elapsed:.2f}s for a 0.3s Retry-After")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing Retry-After: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_sends_not_repeated():
+    """Test that a 5xx is retried on a read but not on a send, while a refused send is retried"""
+    print("\n🧪 Testing retries on reads and sends...")
+
+    try:
+        stats = QuotaStats()
+        fake = make_mailbox(TokenBucket(rate=0), stats)
+        email = SendEmailInput(to="bob@example.com", subject="Hi", body="Hello")
+        with mock.patch.object(gmail_quota, "GMAIL_RETRY_BASE_DELAY", 0.01):
+            fake.throttle = [(503, None)]
+            labels = gmail_service.get_labels(GetLabelsInput())
+            fake.fail_sends = [503]
+            failed_send = gmail_service.send_email(email)
+            fake.fail_sends = [429]
+            refused_send = gmail_service.send_email(email)
+
+        if not labels.success or fake.requests.count(LABELS) != 2:
+            print(f"❌ The 503 on labels.list was not retried: {labels.message}")
+            return False
+        if failed_send.success or "503" not in failed_send.message:
+            print(f"❌ Expected the 503 send to fail: {failed_send.message}")
+            return False
+        if not refused_send.success or fake.requests.count(SEND) != 3 or len(fake.sent) != 1:
+            print(f"❌ Expected one retried 429 send, got {fake.requests.count(SEND)} calls and {len(fake.sent)} sent")
+            return False
+
+        print("✅ Read retried after 503; 503 send not repeated; 429 send retried once")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing send retries: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_bucket_costs_and_fairness():
+    """Test per-method costs and first come, first served waits on a drained bucket"""
+    print("\n🧪 Testing quota costs and bucket fairness...")
+
+    try:
+        base = gmail_client.GMAIL_API_BASE
+        costs = {
+            ("GET", f"{base}/messages"): 5,
+            ("GET", f"{base}/messages/m1"): 5,
+            ("POST", f"{base}/messages/m1/modify"): 5,
+            ("POST", f"{base}/messages/send"): 100,
+            ("POST", f"{base}/messages/batchModify"): 50,
+            ("GET", f"{base}/labels"): 1,
+            ("GET", f"{base}/history"): 2,
+        }
+        for (method, url), cost in costs.items():
+            if request_cost(httpx.Request(method, url)) != cost:
+                print(f"❌ {method} {url} should cost {cost} units")
+                return False
+
+        bucket = TokenBucket(rate=100, burst=10)
+        waits = [bucket.reserve(5) for _ in range(6)]
+        if waits[:2] != [0.0, 0.0] or any(b <= a for a, b in zip(waits[1:], waits[2:])):
+            print(f"❌ Waits not in arrival order: {waits}")
+            return False
+        if abs(waits[-1] - 0.2) > 0.01:
+            print(f"❌ Last of 30 units on a 10-unit burst at 100/s should wait 0.2s, got {waits[-1]:.3f}s")
+            return False
+
+        async def drain():
+            fake = FakeGmail()
+            transport = AsyncQuotaTransport(fake.transport(), TokenBucket(rate=200, burst=5), QuotaStats())
+            async with httpx.AsyncClient(transport=transport) as client:
+                started = time.perf_counter()
+                await asyncio.gather(*(client.get(f"{base}/messages/m{i}") for i in range(20)))
+                return time.perf_counter() - started
+
+        elapsed = asyncio.run(drain())
+        if elapsed < 0.4:
+            print(f"❌ 100 units through a 200/s bucket took only {elapsed:.2f}s")
+            return False
+
+        print(f"✅ Costs match the quota table; 20 concurrent gets paced over {elapsed:.2f}s")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing the bucket: {str(e)}")
+        return False
+
+
+def test_metrics_endpoint():
+    """Test that /metrics reports the shared clients' counters, including async retries"""
+    print("\n🧪 Testing /metrics endpoint...")
+
+    try:
+        gmail_quota.default_stats.reset()
+        fake = make_mailbox()
+        fake.throttle = [(429, "0")]
+        with TestClient(app) as client:
+            listing = client.post("/api/gmail/get", json={"max_results": 1})
+            response = client.get("/api/gmail/metrics")
+
+        quota = response.json()["quota"]
+        if listing.status_code != 200 or response.status_code != 200:
+            print(f"❌ Unexpected statuses: {listing.status_code}, {response.status_code}")
+            return False
+        if quota["throttled"] != 1 or quota["retries"] != 1 or quota["requests"] != len(fake.requests):
+            print(f"❌ Unexpected counters: {quota}")
+            return False
+        if quota["units_per_second"] != gmail_quota.default_bucket.rate or quota["units"] < quota["requests"]:
+            print(f"❌ Unexpected bucket figures: {quota}")
+            return False
+
+        print(f"✅ {quota['requests']} requests, {quota['units']} units, 1 throttled and retried")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing /metrics: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+        gmail_quota.default_stats.reset()
+
+
+def test_endpoints_stay_async():
+    """Test that the send, delete, labels and mark endpoints go through the async client, never the blocking one"""
+    print("\n🧪 Testing endpoints on the async client...")
+
+    try:
+        fake = make_mailbox()
+        fake.add_message("m2", subject="Old newsletter")
+        blocking = []
+
+        def refuse(request: httpx.Request) -> httpx.Response:
+            blocking.append(f"{request.method} {request.url.path}")
+            return httpx.Response(500)
+
+        gmail_client.use_transport(httpx.MockTransport(refuse), AsyncQuotaTransport(fake.transport(), None, QuotaStats()))
+        with TestClient(app) as client:
+            responses = [
+                client.post("/api/gmail/send", json={"to": "ann@example.com", "subject": "Hi", "body": "Hello"}),
+                client.get("/api/gmail/labels"),
+                client.post("/api/gmail/mark-read", json={"email_id": "m1"}),
+                client.post("/api/gmail/mark-unread", json={"email_id": "m1"}),
+                client.request("DELETE", "/api/gmail/delete", json={"email_id": "m2"}),
+            ]
+
+        if blocking or any(response.status_code != 200 for response in responses):
+            print(f"❌ Blocking calls {blocking}; statuses {[response.status_code for response in responses]}")
+            return False
+        if len(fake.sent) != 1 or "m2" in fake.messages or "UNREAD" not in fake.messages["m1"]["labelIds"]:
+            print("❌ The changes did not reach Gmail")
+            return False
+
+        print(f"✅ {len(responses)} endpoints answered with only async calls")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing async endpoints: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all quota tests"""
+    print("🚀 Starting quota tests...\n")
+
+    tests = [
+        ("Retry-After Honored", test_retry_after_honored),
+        ("Sends Not Repeated", test_sends_not_repeated),
+        ("Bucket Costs and Fairness", test_bucket_costs_and_fairness),
+        ("Metrics Endpoint", test_metrics_endpoint),
+        ("Endpoints Stay Async", test_endpoints_stay_async),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test script for threaded replies against the local fake
+"""
+
+import base64
+import email
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import ReplyToEmailInput
+from app.services import gmail_client, gmail_profile, gmail_service
+from fake_gmail import FakeGmail
+
+LONG_BODY = "Earlier discussion line\n" * 5000
+
+
+def make_mailbox() -> FakeGmail:
+    fake = FakeGmail()
+    fake.add_message("m1", subject="Project plan", sender="alice@example.com", thread_id="t1", body=LONG_BODY)
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    gmail_profile.invalidate_profile()
+    return fake
+
+
+def sent_message(fake: FakeGmail, index: int = -1) -> email.message.Message:
+    return email.message_from_bytes(base64.urlsafe_b64decode(fake.sent[index]["raw"]))
+
+
+def test_threaded_reply():
+    """Test that a reply joins the thread and carries the threading headers, not the original body"""
+    print("🧪 Testing threaded reply...")
+
+    try:
+        fake = make_mailbox()
+        result = gmail_service.reply_to_email(ReplyToEmailInput(email_id="m1", reply_body="Looks good"))
+        message = sent_message(fake)
+
+        if not result.success or fake.sent[-1].get("threadId") != "t1":
+            print(f"❌ Reply not sent into the thread: {result.message}")
+            return False
+        if message["In-Reply-To"] != "<m1@mail.example.com>" or message["References"] != "<m1@mail.example.com>":
+            print(f"❌ Missing threading headers: {message['In-Reply-To']}, {message['References']}")
+            return False
+        if message["Subject"] != "Re: Project plan" or "Earlier discussion" in fake.sent[-1]["raw"]:
+            print("❌ Unexpected subject or the original body was inlined")
+            return False
+        if fake.downloaded > 5000:
+            print(f"❌ Reply downloaded {fake.downloaded} bytes; the body should not be fetched")
+            return False
+
+        print(f"✅ Threaded reply sent; {fake.downloaded} bytes downloaded for a {len(LONG_BODY)}-byte original")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing threaded reply: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_reply_headers_chain():
+    """Test Reply-To, an existing References chain and an existing Re: prefix"""
+    print("\n🧪 Testing reply header handling...")
+
+    try:
+        fake = make_mailbox()
+        headers = fake.messages["m1"]["payload"]["headers"]
+        for header in headers:
+            if header["name"] == "Subject":
+                header["value"] = "RE: Project plan"
+        headers.append({"name": "Reply-To", "value": "list@example.com"})
+        headers.append({"name": "References", "value": "<root@mail.example.com>"})
+
+        gmail_service.reply_to_email(ReplyToEmailInput(email_id="m1", reply_body="Agreed"))
+        message = sent_message(fake)
+        if message["To"] != "list@example.com" or message["Subject"] != "RE: Project plan":
+            print(f"❌ Unexpected recipient or subject: {message['To']}, {message['Subject']}")
+            return False
+        if message["References"] != "<root@mail.example.com> <m1@mail.example.com>":
+            print(f"❌ References chain not extended: {message['References']}")
+            return False
+
+        print("✅ Reply-To honored, References extended, subject kept")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing reply headers: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_quote_original():
+    """Test that quote_original appends the original body as a quoted block"""
+    print("\n🧪 Testing quoted reply...")
+
+    try:
+        fake = make_mailbox()
+        gmail_service.reply_to_email(ReplyToEmailInput(email_id="m1", reply_body="See below", quote_original=True))
+        text = sent_message(fake).get_payload()[0].get_payload(decode=True).decode()
+
+        if not text.startswith("See below\n\nOn ") or "alice@example.com wrote:\n> Earlier discussion line" not in text:
+            print(f"❌ Unexpected quoted body: {text[:120]!r}")
+            return False
+
+        print("✅ Original quoted below the reply")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing quoted reply: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_reply_endpoint():
+    """Test the async /reply path, including a missing original"""
+    print("\n🧪 Testing /reply endpoint...")
+
+    try:
+        fake = make_mailbox()
+        with TestClient(app) as client:
+            ok = client.post("/api/gmail/reply", json={"email_id": "m1", "reply_body": "Thanks"})
+            missing = client.post("/api/gmail/reply", json={"email_id": "nope", "reply_body": "Thanks"})
+
+        if ok.status_code != 200 or fake.sent[-1].get("threadId") != "t1":
+            print(f"❌ Endpoint reply not threaded: {ok.status_code}")
+            return False
+        if missing.status_code != 400:
+            print(f"❌ Expected 400 for a missing original, got {missing.status_code}")
+            return False
+
+        print("✅ Endpoint reply threaded; missing original answered with 400")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing /reply: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all reply tests"""
+    print("🚀 Starting reply tests...\n")
+
+    tests = [
+        ("Threaded Reply", test_threaded_reply),
+        ("Reply Headers", test_reply_headers_chain),
+        ("Quote Original", test_quote_original),
+        ("Reply Endpoint", test_reply_endpoint),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script for sending through the cached sender profile against the local fake
+"""
+
+import asyncio
+from unittest import mock
+
+from app.schema.gmail_schema import ReplyToEmailInput, SendBulkEmailsInput, SendEmailInput
+from app.services import gmail_client, gmail_profile, gmail_service
+from fake_gmail import FakeGmail
+
+PROFILE = "GET /gmail/v1/users/me/profile"
+SEND = "POST /gmail/v1/users/me/messages/send"
+
+
+def make_mailbox() -> FakeGmail:
+    fake = FakeGmail()
+    fake.add_message("m1", subject="Question", sender="alice@example.com")
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    gmail_profile.invalidate_profile()
+    return fake
+
+
+def sample(n: int):
+    return [SendEmailInput(to=f"user{i}@example.com", subject="Hello", body=f"Hi {i}") for i in range(n)]
+
+
+def test_profile_cached_across_sends():
+    """Test that send, reply and forward share one profile lookup"""
+    print("🧪 Testing profile cache across sends...")
+
+    try:
+        fake = make_mailbox()
+        gmail_service.send_email(sample(1)[0])
+        gmail_service.send_email(sample(1)[0])
+        gmail_service.reply_to_email(ReplyToEmailInput(email_id="m1", reply_body="Sure"))
+
+        if fake.count(PROFILE) != 1 or fake.count(SEND) != 3:
+            print(f"❌ Expected 1 profile lookup for 3 sends, got {fake.count(PROFILE)}")
+            return False
+
+        print("✅ 3 sends, 1 profile lookup")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing profile cache: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_profile_ttl_and_auth_invalidation():
+    """Test that expired entries and auth errors trigger a new lookup"""
+    print("\n🧪 Testing profile expiry and invalidation...")
+
+    try:
+        fake = make_mailbox()
+        with mock.patch.object(gmail_profile, "GMAIL_PROFILE_TTL", 0):
+            gmail_service.send_email(sample(1)[0])
+            gmail_service.send_email(sample(1)[0])
+        if fake.count(PROFILE) != 2:
+            print(f"❌ Expired profile was reused ({fake.count(PROFILE)} lookups)")
+            return False
+
+        fake.requests.clear()
+        gmail_service.send_email(sample(1)[0])
+        fake.fail_sends = [401]
+        failed = gmail_service.send_email(sample(1)[0])
+        gmail_service.send_email(sample(1)[0])
+        if failed.success or fake.count(PROFILE) != 2:
+            print(f"❌ 401 did not invalidate the profile ({fake.count(PROFILE)} lookups)")
+            return False
+
+        print("✅ Expired and rejected profiles were looked up again")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing profile invalidation: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_bulk_send():
+    """Test that a bulk send resolves the profile once and reports each email"""
+    print("\n🧪 Testing bulk send...")
+
+    try:
+        fake = make_mailbox()
+        fake.fail_sends = [500]  # the first send fails
+        result = gmail_service.send_emails(SendBulkEmailsInput(emails=sample(5)))
+        if fake.count(PROFILE) != 1 or result.sent != 4 or result.failed != 1 or result.results[0].success:
+            print(f"❌ Unexpected bulk result: {result.message}")
+            return False
+
+        gmail_profile.invalidate_profile()
+        fake.requests.clear()
+        result = asyncio.run(gmail_service.asend_emails(SendBulkEmailsInput(emails=sample(20))))
+        if fake.count(PROFILE) != 1 or fake.count(SEND) != 20 or result.sent != 20:
+            print(f"❌ Unexpected async bulk result: {result.message}")
+            return False
+
+        print(f"✅ {result.sent} async bulk sends with a single profile lookup")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing bulk send: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all Gmail send tests"""
+    print("🚀 Starting Gmail send tests...\n")
+
+    tests = [
+        ("Profile Cached Across Sends", test_profile_cached_across_sends),
+        ("Profile Expiry and Invalidation", test_profile_ttl_and_auth_invalidation),
+        ("Bulk Send", test_bulk_send),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
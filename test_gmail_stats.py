@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script for mailbox statistics against the local fake
+"""
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import GetMailboxStatsInput, MarkAsReadInput
+from app.services import gmail_client, gmail_labels, gmail_service
+from app.tools.gmail_tool import get_mailbox_stats_tool
+from fake_gmail import FakeGmail
+
+MESSAGES = "/gmail/v1/users/me/messages"
+
+
+def make_mailbox() -> FakeGmail:
+    """12 emails in the inbox, 5 unread, 3 of them also in a user label; two share a thread"""
+    fake = FakeGmail()
+    fake.label_names = {"Label_7": "Receipts"}
+    for i in range(12):
+        labels = ["INBOX"] + (["UNREAD"] if i < 5 else []) + (["Label_7"] if i % 4 == 0 else [])
+        fake.add_message(f"m{i}", subject=f"Email {i}", labels=labels, thread_id="t0" if i < 2 else None)
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    gmail_labels.invalidate_labels()
+    return fake
+
+
+def test_counts_without_listing():
+    """Test that counts come from labels.get in one batch, with no message listing or details"""
+    print("🧪 Testing mailbox statistics...")
+
+    try:
+        fake = make_mailbox()
+        result = gmail_service.get_mailbox_stats(GetMailboxStatsInput(labels=["INBOX", "UNREAD", "receipts"]))
+        first_calls = list(fake.requests)
+        again = gmail_service.get_mailbox_stats(GetMailboxStatsInput(labels=["UNREAD"]))
+
+        counts = {label.name: (label.messages_unread, label.messages_total, label.threads_total) for label in result.labels}
+        if not result.success or counts != {"INBOX": (5, 12, 11), "UNREAD": (5, 5, 4), "Receipts": (2, 3, 3)}:
+            print(f"❌ Unexpected counts: {counts}")
+            return False
+        if any(MESSAGES in r for r in first_calls) or first_calls.count("POST /batch/gmail/v1") != 1:
+            print(f"❌ Expected one labels.list and one batch call, got {first_calls}")
+            return False
+        if not again.success or len(fake.requests) != len(first_calls):
+            print(f"❌ Cached counters not reused: {fake.requests[len(first_calls):]}")
+            return False
+
+        print(f"✅ Three labels counted in {len(first_calls)} calls; the repeat was served from cache")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing mailbox statistics: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_own_changes_drop_counts():
+    """Test that marking an email read is reflected in the next count despite the cache"""
+    print("\n🧪 Testing counts after a change...")
+
+    try:
+        make_mailbox()
+        before = gmail_service.get_mailbox_stats(GetMailboxStatsInput(labels=["UNREAD"]))
+        gmail_service.mark_as_read(MarkAsReadInput(email_id="m0"))
+        after = gmail_service.get_mailbox_stats(GetMailboxStatsInput(labels=["UNREAD"]))
+
+        if before.labels[0].messages_total != 5 or after.labels[0].messages_total != 4:
+            print(f"❌ Unexpected unread counts: {before.labels[0]} then {after.labels[0]}")
+            return False
+
+        print("✅ Unread count went from 5 to 4 after mark_as_read")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing counts after a change: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_stats_endpoint_and_tool():
+    """Test /api/gmail/stats (concurrent labels.get calls) and the agent tool"""
+    print("\n🧪 Testing /stats endpoint and tool...")
+
+    try:
+        fake = make_mailbox()
+        with TestClient(app) as client:
+            response = client.get("/api/gmail/stats", params={"labels": ["INBOX", "Receipts"]})
+            fresh = client.get("/api/gmail/stats", params={"labels": ["INBOX"], "max_staleness_seconds": 0})
+            unknown = client.get("/api/gmail/stats", params={"labels": ["Holidays"]})
+        tool_message = get_mailbox_stats_tool.invoke({"labels": ["UNREAD"]})
+
+        labels = response.json()["labels"]
+        if response.status_code != 200 or [(l["id"], l["messages_total"]) for l in labels] != [("INBOX", 12), ("Label_7", 3)]:
+            print(f"❌ Unexpected stats: {response.status_code} {response.text}")
+            return False
+        if fresh.status_code != 200 or fake.count("GET /gmail/v1/users/me/labels/INBOX") != 2:
+            print("❌ max_staleness_seconds=0 did not fetch the counters again")
+            return False
+        if unknown.status_code != 400:
+            print(f"❌ Expected 400 for an unknown label, got {unknown.status_code}")
+            return False
+        if "UNREAD: 5 unread of 5 emails" not in tool_message:
+            print(f"❌ Unexpected tool answer: {tool_message}")
+            return False
+
+        print(f"✅ /stats answered from label counters; tool said: {tool_message.splitlines()[1]}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing /stats: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all mailbox statistics tests"""
+    print("🚀 Starting mailbox statistics tests...\n")
+
+    tests = [
+        ("Counts Without Listing", test_counts_without_listing),
+        ("Own Changes Drop Counts", test_own_changes_drop_counts),
+        ("Stats Endpoint and Tool", test_stats_endpoint_and_tool),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
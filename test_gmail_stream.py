@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test script for NDJSON streaming of Gmail listings against the local fake
+"""
+
+import asyncio
+import json
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import gmail_client, gmail_service
+from fake_gmail import FakeGmail
+
+DETAIL = "GET /gmail/v1/users/me/messages/"
+
+
+def make_mailbox(n: int) -> FakeGmail:
+    fake = FakeGmail()
+    for i in range(n):
+        fake.add_message(f"m{i}", subject=f"Subject {i}")
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    return fake
+
+
+def read_lines(response) -> list:
+    return [json.loads(line) for line in response.iter_lines() if line]
+
+
+def test_stream_get():
+    """Test one line per email followed by a summary trailer"""
+    print("🧪 Testing streamed /get...")
+
+    try:
+        make_mailbox(30)
+        with TestClient(app) as client:
+            with client.stream("POST", "/api/gmail/get?stream=true", json={"max_results": 30}) as response:
+                content_type = response.headers["content-type"]
+                lines = read_lines(response)
+
+        emails = [line["email"] for line in lines[:-1]]
+        summary = lines[-1].get("summary")
+        if not content_type.startswith("application/x-ndjson") or len(emails) != 30:
+            print(f"❌ Expected 30 NDJSON email lines, got {len(emails)} ({content_type})")
+            return False
+        if not summary or summary["count"] != 30 or not summary["success"]:
+            print(f"❌ Bad summary trailer: {lines[-1]}")
+            return False
+        if sorted(e["id"] for e in emails) != sorted(f"m{i}" for i in range(30)):
+            print("❌ Streamed emails do not match the mailbox")
+            return False
+
+        print("✅ 30 email lines and a summary trailer")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing streamed /get: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_stream_search_cursor():
+    """Test that the trailer carries a cursor for the next streamed page"""
+    print("\n🧪 Testing streamed /search with cursors...")
+
+    try:
+        make_mailbox(25)
+        seen, cursor = [], None
+        with TestClient(app) as client:
+            while True:
+                body = {"query": "anything", "max_results": 10, "cursor": cursor}
+                with client.stream("POST", "/api/gmail/search?stream=true", json=body) as response:
+                    lines = read_lines(response)
+                seen.extend(line["email"]["id"] for line in lines[:-1])
+                cursor = lines[-1]["summary"]["next_cursor"]
+                if not cursor:
+                    break
+
+        if sorted(seen) != sorted(f"m{i}" for i in range(25)):
+            print(f"❌ Streamed pages covered {len(seen)} emails")
+            return False
+
+        print("✅ 3 streamed pages covered the mailbox once")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing streamed search: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_stream_early_error():
+    """Test that a listing failing before its first email is a 400"""
+    print("\n🧪 Testing early stream errors...")
+
+    try:
+        make_mailbox(3)
+        with TestClient(app) as client:
+            response = client.post("/api/gmail/get?stream=true", json={"cursor": "bogus"})
+
+        if response.status_code != 400:
+            print(f"❌ Expected 400, got {response.status_code}")
+            return False
+
+        print("✅ Bad cursor answered with 400 before streaming")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing early stream errors: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_backpressure():
+    """Test that fetches do not run ahead of a slow consumer"""
+    print("\n🧪 Testing backpressure...")
+
+    async def consume_one(fake):
+        headers = gmail_service.get_gmail_service()
+        stream = gmail_service.astream_emails_details([f"m{i}" for i in range(100)], headers)
+        await anext(stream)
+        await asyncio.sleep(0.05)  # a stalled reader
+        started = fake.count(DETAIL)
+        await stream.aclose()
+        return started
+
+    try:
+        fake = make_mailbox(100)
+        with mock.patch.object(gmail_service, "GMAIL_MAX_CONCURRENCY", 4):
+            started = asyncio.run(consume_one(fake))
+
+        if started > 4:
+            print(f"❌ {started} fetches started for a reader that took one email")
+            return False
+
+        print(f"✅ {started} fetches started while the reader stalled")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing backpressure: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all Gmail streaming tests"""
+    print("🚀 Starting Gmail streaming tests...\n")
+
+    tests = [
+        ("Streamed Get", test_stream_get),
+        ("Streamed Search with Cursors", test_stream_search_cursor),
+        ("Early Stream Error", test_stream_early_error),
+        ("Backpressure", test_backpressure),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Test script for thread fetching and cached conversations against the local fake
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import GetThreadInput
+from app.services import gmail_client, gmail_service, mail_cache
+from app.services.mail_cache import MailCache
+from fake_gmail import FakeGmail
+
+THREAD = "GET /gmail/v1/users/me/threads/t1"
+
+
+def make_mailbox(replies: int = 20) -> FakeGmail:
+    """A conversation t1 of `replies` emails, each answering all before it, between unrelated emails"""
+    fake = FakeGmail()
+    fake.add_message("other1", subject="Unrelated")
+    ids = []
+    for i in range(replies):
+        fake.add_message(f"r{i}", subject="Re: Plans" if i else "Plans", body=f"Message {i}",
+                         thread_id="t1", replies_to=list(ids))
+        ids.append(f"r{i}")
+    fake.add_message("other2", subject="Also unrelated")
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    return fake
+
+
+@contextmanager
+def mail_cache_enabled():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mail.db")
+        cache = MailCache(path)
+        with mock.patch.object(mail_cache, "MAIL_CACHE_PATH", path), mock.patch.object(mail_cache, "_cache", cache):
+            yield cache
+
+
+def test_thread_in_one_call():
+    """Test that a 20-email conversation takes one threads.get call, and two from an email id"""
+    print("🧪 Testing thread fetch...")
+
+    try:
+        fake = make_mailbox()
+        result = gmail_service.get_thread(GetThreadInput(thread_id="t1"))
+        calls = list(fake.requests)
+        fake.requests.clear()
+        by_email = gmail_service.get_thread(GetThreadInput(email_id="r7"))
+        missing = gmail_service.get_thread(GetThreadInput(thread_id="nope"))
+
+        if not result.success or [e.id for e in result.emails] != [f"r{i}" for i in range(20)]:
+            print(f"❌ Unexpected conversation: {result.message[:200]}")
+            return False
+        if calls != [THREAD] or "Message 19" not in result.message:
+            print(f"❌ Expected a single threads.get call with bodies, got {calls}")
+            return False
+        if len(fake.requests) != 3 or by_email.thread_id != "t1" or len(by_email.emails) != 20:
+            print(f"❌ Lookup by email id took {fake.requests}")
+            return False
+        last = result.emails[-1]
+        if last.message_id != "<r19@mail.example.com>" or len(last.references) != 19:
+            print(f"❌ Threading headers not parsed: {last.message_id} {last.references}")
+            return False
+        if missing.success:
+            print("❌ Expected an unknown thread to fail")
+            return False
+
+        print("✅ 20 emails in 1 call by thread id; 2 calls starting from an email id")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing thread fetch: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_cached_thread_rebuilt():
+    """Test that a conversation read once is rebuilt from the cache with no calls"""
+    print("\n🧪 Testing cached conversations...")
+
+    try:
+        fake = make_mailbox()
+        with mail_cache_enabled() as cache:
+            first = gmail_service.get_thread(GetThreadInput(thread_id="t1"))
+            fake.requests.clear()
+            second = gmail_service.get_thread(GetThreadInput(email_id="r3", max_staleness_seconds=3600))
+            stored = cache.thread("t1")
+
+        if first.source != "remote" or second.source != "local" or fake.requests:
+            print(f"❌ Expected a local rebuild, got {second.source} with {fake.requests}")
+            return False
+        if [e.id for e in second.emails] != [e.id for e in first.emails] or second.emails[5].body != "Message 5":
+            print("❌ Rebuilt conversation differs from Gmail's")
+            return False
+        if len(stored) != 20 or stored[-1].references != first.emails[-1].references:
+            print("❌ Threading headers not kept in the cache")
+            return False
+
+        print("✅ Second read of the 20-email conversation made no requests")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing cached conversations: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_partial_cache_checks_references():
+    """Test that a cache missing an email replied to goes back to Gmail"""
+    print("\n🧪 Testing gaps in a partial cache...")
+
+    try:
+        fake = make_mailbox(replies=3)
+        with mail_cache_enabled() as cache:
+            gmail_service.get_thread(GetThreadInput(thread_id="t1"))
+            cache.set_state(complete="0")
+            fake.requests.clear()
+            whole = gmail_service.get_thread(GetThreadInput(thread_id="t1", max_staleness_seconds=3600))
+            cache.remove(["r0"])
+            gap = gmail_service.get_thread(GetThreadInput(thread_id="t1", max_staleness_seconds=3600))
+
+        if whole.source != "local" or fake.requests != [THREAD]:
+            print(f"❌ Expected a local rebuild then one fetch, got {whole.source} and {fake.requests}")
+            return False
+        if gap.source != "remote" or [e.id for e in gap.emails] != ["r0", "r1", "r2"]:
+            print(f"❌ Gap not detected: {gap.source}")
+            return False
+
+        print("✅ Complete chain rebuilt locally; a missing parent sent the read to Gmail")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing partial cache: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_thread_endpoint():
+    """Test /api/gmail/thread"""
+    print("\n🧪 Testing /thread endpoint...")
+
+    try:
+        fake = make_mailbox(replies=5)
+        with TestClient(app) as client:
+            response = client.post("/api/gmail/thread", json={"thread_id": "t1"})
+            missing = client.post("/api/gmail/thread", json={})
+
+        emails = response.json()["emails"]
+        if response.status_code != 200 or [e["id"] for e in emails] != [f"r{i}" for i in range(5)]:
+            print(f"❌ Unexpected response: {response.status_code} {response.text[:200]}")
+            return False
+        if emails[1]["references"] != ["<r0@mail.example.com>"] or fake.count(THREAD) != 1:
+            print(f"❌ Unexpected threading fields: {emails[1]}")
+            return False
+        if missing.status_code != 400:
+            print(f"❌ Expected 400 without an id, got {missing.status_code}")
+            return False
+
+        print("✅ /thread returned the 5-email conversation in one call")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing /thread: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all thread tests"""
+    print("🚀 Starting thread tests...\n")
+
+    tests = [
+        ("Thread In One Call", test_thread_in_one_call),
+        ("Cached Thread Rebuilt", test_cached_thread_rebuilt),
+        ("Partial Cache Checks References", test_partial_cache_checks_references),
+        ("Thread Endpoint", test_thread_endpoint),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
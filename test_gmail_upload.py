@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Test script for sending attachments and resumable uploads against the local fake
+"""
+
+import base64
+import email
+import hashlib
+import os
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schema.gmail_schema import SendEmailInput
+from app.services import gmail_client, gmail_profile, gmail_service, gmail_upload
+from fake_gmail import FakeGmail
+
+MB = 1024 * 1024
+
+
+def make_mailbox() -> FakeGmail:
+    fake = FakeGmail()
+    gmail_client.use_transport(fake.transport(), fake.transport())
+    gmail_profile.invalidate_profile()
+    return fake
+
+
+@contextmanager
+def upload_dir(files: dict):
+    """ATTACHMENT_UPLOAD_DIR pointed at a directory holding files (name -> size in bytes, or content)"""
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.object(gmail_upload, "ATTACHMENT_UPLOAD_DIR", tmp):
+        for name, content in files.items():
+            with open(os.path.join(tmp, name), "wb") as f:
+                if isinstance(content, bytes):
+                    f.write(content)
+                else:
+                    for _ in range(content // MB):
+                        f.write(os.urandom(MB))
+        yield tmp
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MB), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def test_small_attachment_sent_raw():
+    """Test that a small attachment goes out in a single messages.send call"""
+    print("🧪 Testing a small attachment...")
+
+    try:
+        fake = make_mailbox()
+        with upload_dir({"notes.txt": b"Agenda:\n1. Launch\n"}):
+            result = gmail_service.send_email_now(SendEmailInput(
+                to="bob@example.com", subject="Notes", body="Attached", attachments=["notes.txt"]))
+
+        if not result.success or len(fake.sent) != 1 or fake.count("POST /gmail/v1/users/me/messages/send") != 1:
+            print(f"❌ Expected one messages.send call: {result.message} {fake.requests}")
+            return False
+        message = email.message_from_bytes(base64.urlsafe_b64decode(fake.sent[0]["raw"]))
+        parts = [(part.get_filename(), part.get_payload(decode=True)) for part in message.walk() if part.get_filename()]
+        if parts != [("notes.txt", b"Agenda:\n1. Launch\n")] or message["to"] != "bob@example.com":
+            print(f"❌ Unexpected attachments: {parts}")
+            return False
+
+        print("✅ notes.txt attached and sent as a raw message")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing small attachment: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_large_send_resumes():
+    """Test that a 20 MB attachment is uploaded in chunks, resumes after a drop and keeps memory flat"""
+    print("\n🧪 Testing a resumable 20 MB upload...")
+
+    try:
+        fake = make_mailbox()
+        fake.drop_upload_at = 9 * MB + 12345
+        with upload_dir({"video.bin": 20 * MB}) as tmp, mock.patch.object(gmail_upload, "GMAIL_UPLOAD_CHUNK_BYTES", MB):
+            expected = file_digest(os.path.join(tmp, "video.bin"))
+            tracemalloc.start()
+            result = gmail_service.send_email_now(SendEmailInput(
+                to="bob@example.com", subject="Video", body="The recording", thread_id="t9", attachments=["video.bin"]))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        if not result.success or len(fake.sent) != 1 or fake.sent[0]["threadId"] != "t9":
+            print(f"❌ Upload failed: {result.message}")
+            return False
+        resumed = fake.upload_ranges.index(f"bytes */{fake.uploads['upload1']['size']}")
+        if not fake.upload_ranges[resumed + 1].startswith(f"bytes {9 * MB + 12345}-"):
+            print(f"❌ Did not resume from the dropped byte: {fake.upload_ranges[resumed - 1:resumed + 2]}")
+            return False
+        message = email.message_from_binary_file(fake.sent[0]["upload"])
+        attachment = next(part for part in message.walk() if part.get_filename() == "video.bin")
+        if hashlib.sha256(attachment.get_payload(decode=True)).hexdigest() != expected:
+            print("❌ Uploaded attachment differs from the file")
+            return False
+        if peak > 4 * MB:
+            print(f"❌ Peak Python memory {peak / MB:.1f} MB for a 20 MB attachment")
+            return False
+
+        print(f"✅ {len(fake.upload_ranges)} upload requests, resumed after the drop; peak memory {peak / MB:.1f} MB")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing resumable upload: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_attachment_paths_checked():
+    """Test that files outside the upload directory, or any file with none set, are refused"""
+    print("\n🧪 Testing attachment paths...")
+
+    try:
+        fake = make_mailbox()
+        with upload_dir({"ok.txt": b"fine"}):
+            escaped = gmail_service.send_email_now(SendEmailInput(
+                to="bob@example.com", subject="Hi", body="x", attachments=["../../etc/passwd"]))
+        disabled = gmail_service.send_email_now(SendEmailInput(
+            to="bob@example.com", subject="Hi", body="x", attachments=["ok.txt"]))
+
+        if escaped.success or "upload directory" not in escaped.message:
+            print(f"❌ Path outside the directory not refused: {escaped.message}")
+            return False
+        if disabled.success or "ATTACHMENT_UPLOAD_DIR" not in disabled.message or fake.sent:
+            print(f"❌ Attachments not disabled: {disabled.message}")
+            return False
+
+        print(f"✅ Refused: {escaped.message}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing attachment paths: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def test_send_endpoint_with_attachment():
+    """Test /api/gmail/send with an attachment, and /send-bulk on the async path"""
+    print("\n🧪 Testing /send with an attachment...")
+
+    try:
+        fake = make_mailbox()
+        with upload_dir({"report.pdf": b"%PDF-1.4 fake"}), TestClient(app) as client:
+            single = client.post("/api/gmail/send", json={
+                "to": "bob@example.com", "subject": "Report", "body": "Attached", "attachments": ["report.pdf"]})
+            bulk = client.post("/api/gmail/send-bulk", json={"emails": [
+                {"to": "carol@example.com", "subject": "Report", "body": "Attached", "attachments": ["report.pdf"]},
+                {"to": "dave@example.com", "subject": "Hi", "body": "No attachment"},
+            ]})
+
+        if single.status_code != 200 or bulk.status_code != 200 or len(fake.sent) != 3:
+            print(f"❌ Unexpected responses: {single.text} {bulk.text}")
+            return False
+        types = sorted(email.message_from_bytes(base64.urlsafe_b64decode(sent["raw"])).get_payload()[-1].get_content_type()
+                       for sent in fake.sent)
+        if types != ["application/pdf", "application/pdf", "text/plain"]:
+            print(f"❌ Unexpected last parts: {types}")
+            return False
+
+        print("✅ /send and /send-bulk attached report.pdf")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing /send with an attachment: {str(e)}")
+        return False
+    finally:
+        gmail_client.use_transport()
+
+
+def main():
+    """Run all upload tests"""
+    print("🚀 Starting upload tests...\n")
+
+    tests = [
+        ("Small Attachment Sent Raw", test_small_attachment_sent_raw),
+        ("Large Send Resumes", test_large_send_resumes),
+        ("Attachment Paths Checked", test_attachment_paths_checked),
+        ("Send Endpoint With Attachment", test_send_endpoint_with_attachment),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
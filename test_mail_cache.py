@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite mailbox cache against the local fake
+"""
+
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+
+from app.schema.gmail_schema import EmailRecord, GetEmailsInput, ReadEmailInput, SearchEmailsInput
+from app.services import gmail_client, gmail_service, mail_cache
+from app.services.mail_cache import MailCache
+from fake_gmail import FakeGmail
+
+
+@contextmanager
+def cached_mailbox(n: int, **cache_options):
+    """A fake mailbox of n messages with a fresh cache file installed"""
+    fake = FakeGmail()
+    for i in range(n):
+        fake.add_message(f"m{i}", subject=f"Subject {i}", body=f"Body {i}")
+    gmail_client.use_transport(fake.transport())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mail.db")
+        cache = MailCache(path, **cache_options)
+        with mock.patch.object(mail_cache, "MAIL_CACHE_PATH", path), mock.patch.object(mail_cache, "_cache", cache):
+            try:
+                yield fake, cache
+            finally:
+                gmail_client.use_transport()
+
+
+def test_bulk_load_and_repeat_listing():
+    """Test the paginated first sync and a repeat listing served locally"""
+    print("🧪 Testing bulk load and repeat listing...")
+
+    try:
+        with cached_mailbox(25) as (fake, cache), mock.patch.object(gmail_service, "LIST_PAGE_SIZE", 10):
+            first = gmail_service.get_emails(GetEmailsInput(max_results=5))
+            pages = fake.count("GET /gmail/v1/users/me/messages")
+            if pages != 3 or cache.stats()["messages"] != 25:
+                print(f"❌ Expected 3 list pages and 25 cached messages, got {pages} and {cache.stats()['messages']}")
+                return False
+
+            fake.requests.clear()
+            second = gmail_service.get_emails(GetEmailsInput(max_results=5))
+            if fake.requests:
+                print(f"❌ Repeat listing went to Gmail: {fake.requests}")
+                return False
+            if [e.id for e in second.emails] != ["m24", "m23", "m22", "m21", "m20"]:
+                print(f"❌ Unexpected listing order: {[e.id for e in second.emails]}")
+                return False
+            if [e.id for e in first.emails] != [e.id for e in second.emails] or second.emails[0].body is not None:
+                print("❌ Cached listing differs from the first one")
+                return False
+
+        print("✅ 25 messages loaded in 3 pages; repeat listing made no requests")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing bulk load: {str(e)}")
+        return False
+
+
+def test_incremental_sync():
+    """Test that history changes are applied with one history.list call"""
+    print("\n🧪 Testing incremental sync...")
+
+    try:
+        with cached_mailbox(5) as (fake, cache):
+            gmail_service.get_emails(GetEmailsInput(max_results=5))
+
+            # Changes made by another client
+            fake.add_message("new", subject="Fresh")
+            fake._modify("m3", {"removeLabelIds": ["UNREAD"]})
+            fake._remove("m1")
+            fake.requests.clear()
+
+            result = gmail_service.get_emails(GetEmailsInput(max_results=10, max_staleness_seconds=0))
+            ids = [e.id for e in result.emails]
+            if fake.count("GET /gmail/v1/users/me/history") != 1 or "GET /gmail/v1/users/me/messages" in fake.requests:
+                print(f"❌ Unexpected sync requests: {fake.requests}")
+                return False
+            if ids != ["new", "m4", "m3", "m2", "m0"]:
+                print(f"❌ Unexpected emails after sync: {ids}")
+                return False
+            if "UNREAD" in next(e for e in result.emails if e.id == "m3").labels:
+                print("❌ Label change was not applied")
+                return False
+
+            unread = gmail_service.get_emails(GetEmailsInput(label="UNREAD", max_staleness_seconds=60))
+            if "m3" in [e.id for e in unread.emails]:
+                print("❌ Label filter still lists the read message")
+                return False
+
+        print("✅ Added, deleted and relabeled messages applied from history")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing incremental sync: {str(e)}")
+        return False
+
+
+def test_expired_history_resync():
+    """Test that an expired historyId falls back to a full load"""
+    print("\n🧪 Testing expired history fallback...")
+
+    try:
+        with cached_mailbox(4) as (fake, cache):
+            gmail_service.get_emails(GetEmailsInput(max_results=4))
+            fake.history_floor = fake.history_id + 1
+            fake._remove("m0")
+            fake.requests.clear()
+
+            result = gmail_service.get_emails(GetEmailsInput(max_results=4, max_staleness_seconds=0))
+            if fake.count("GET /gmail/v1/users/me/profile") != 1:
+                print(f"❌ Full reload did not run: {fake.requests}")
+                return False
+            if [e.id for e in result.emails] != ["m3", "m2", "m1"] or cache.history_id != str(fake.history_id):
+                print(f"❌ Unexpected state after reload: {[e.id for e in result.emails]}")
+                return False
+
+        print("✅ 404 from history.list triggered a full reload")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing expired history: {str(e)}")
+        return False
+
+
+def test_read_and_search_from_cache():
+    """Test that bodies and search details are reused from the cache"""
+    print("\n🧪 Testing cached reads and search details...")
+
+    try:
+        with cached_mailbox(3) as (fake, cache):
+            gmail_service.get_emails(GetEmailsInput(max_results=3))
+            gmail_service.read_email(ReadEmailInput(email_id="m1"))
+            fake.requests.clear()
+
+            read = gmail_service.read_email(ReadEmailInput(email_id="m1"))
+            if fake.requests or read.email.body != "Body 1":
+                print(f"❌ Second read went to Gmail or lost the body: {fake.requests}")
+                return False
+
+            # A query the local index cannot answer, so Gmail runs it
+            search = gmail_service.search_emails(SearchEmailsInput(query="newer_than:7d"))
+            if fake.count("POST /batch") or fake.count("GET /gmail/v1/users/me/messages/"):
+                print(f"❌ Search fetched details the cache already had: {fake.requests}")
+                return False
+            if len(search.emails) != 3 or any(e.body is not None for e in search.emails):
+                print("❌ Unexpected search results")
+                return False
+
+        print("✅ Repeat read and search details made no detail requests")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing cached reads: {str(e)}")
+        return False
+
+
+def test_eviction():
+    """Test the message and body size bounds"""
+    print("\n🧪 Testing eviction...")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = MailCache(os.path.join(tmp, "mail.db"), max_messages=5, max_body_bytes=2500)
+            emails = [
+                EmailRecord(id=f"e{i}", subject="s", sender="a", recipient="b", date="", internal_date=i,
+                            labels=["INBOX"], body="x" * 1000)
+                for i in range(8)
+            ]
+            for e in emails:
+                cache.upsert([e])
+
+            stats = cache.stats()
+            if stats["messages"] != 5 or stats["body_bytes"] > 2500:
+                print(f"❌ Bounds not enforced: {stats}")
+                return False
+            kept = cache.get([e.id for e in emails])
+            if sorted(kept) != ["e3", "e4", "e5", "e6", "e7"] or kept["e7"].body is None or kept["e3"].body is not None:
+                print(f"❌ Wrong entries evicted: {sorted(kept)}")
+                return False
+
+        print(f"✅ Cache held {stats['messages']} messages and {stats['body_bytes']} body bytes")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing eviction: {str(e)}")
+        return False
+
+
+def test_async_listing_uses_cache():
+    """Test that the async API path goes through the cache"""
+    print("\n🧪 Testing async listing through the cache...")
+
+    try:
+        with cached_mailbox(3) as (fake, cache):
+            gmail_service.get_emails(GetEmailsInput(max_results=3))
+            fake.requests.clear()
+            result = asyncio.run(gmail_service.aget_emails(GetEmailsInput(max_results=3)))
+            if fake.requests or len(result.emails) != 3:
+                print(f"❌ Async listing went to Gmail: {fake.requests}")
+                return False
+
+        print("✅ Async listing served from the cache")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing async listing: {str(e)}")
+        return False
+
+
+def main():
+    """Run all mailbox cache tests"""
+    print("🚀 Starting mailbox cache tests...\n")
+
+    tests = [
+        ("Bulk Load and Repeat Listing", test_bulk_load_and_repeat_listing),
+        ("Incremental Sync", test_incremental_sync),
+        ("Expired History Resync", test_expired_history_resync),
+        ("Cached Read and Search", test_read_and_search_from_cache),
+        ("Eviction", test_eviction),
+        ("Async Listing", test_async_listing_uses_cache),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
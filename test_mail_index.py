@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Test script for local full-text search over the mailbox cache
+"""
+
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+
+from app.schema.gmail_schema import ReadEmailInput, SearchEmailsInput
+from app.services import gmail_client, gmail_service, mail_cache, mail_index
+from app.services.mail_cache import MailCache
+from fake_gmail import FakeGmail
+
+
+@contextmanager
+def indexed_mailbox():
+    fake = FakeGmail()
+    fake.add_message("a1", subject="Quarterly budget review", sender="Alice Smith <alice@example.com>",
+                     body="Numbers attached for Q3")
+    fake.add_message("b1", subject="Lunch on Friday?", sender="bob@example.org", labels=["INBOX"],
+                     body="Pizza or sushi")
+    fake.add_message("a2", subject="Budget follow-up", sender="alice@example.com", to="team@example.com",
+                     body="Please review the spreadsheet",
+                     payload={"mimeType": "multipart/mixed", "parts": [
+                         {"mimeType": "text/plain", "body": {"data": "UGxlYXNlIHJldmlldw=="}},
+                         {"mimeType": "application/pdf", "filename": "q3.pdf", "body": {"attachmentId": "x"}},
+                     ]})
+    fake.add_message("s1", subject="Budget spam", sender="spam@example.net", labels=["SPAM"])
+    gmail_client.use_transport(fake.transport(), fake.transport())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mail.db")
+        with mock.patch.object(mail_cache, "MAIL_CACHE_PATH", path), \
+                mock.patch.object(mail_cache, "_cache", MailCache(path)):
+            try:
+                yield fake, path
+            finally:
+                gmail_client.use_transport()
+
+
+def search(query: str, **kwargs):
+    result = gmail_service.search_emails(SearchEmailsInput(query=query, **kwargs))
+    if not result.success:
+        raise RuntimeError(result.message)
+    return [e.id for e in result.emails or []], result.source
+
+
+def test_parse_query():
+    """Test which queries the local index accepts"""
+    print("🧪 Testing query parsing...")
+
+    supported = ["from:alice", "subject:budget is:unread", "has:attachment review", "to:team@example.com",
+                 "label:inbox is:read", "in:sent lunch"]
+    unsupported = ['"exact phrase"', "from:alice OR from:bob", "-is:unread", "newer_than:2d",
+                   "label:Work", "subject:(a b)", "budg*", ""]
+
+    bad = [q for q in supported if mail_index.parse_query(q) is None]
+    bad += [q for q in unsupported if mail_index.parse_query(q) is not None]
+    if bad:
+        print(f"❌ Misclassified queries: {bad}")
+        return False
+
+    print(f"✅ {len(supported)} supported and {len(unsupported)} unsupported queries classified")
+    return True
+
+
+def test_local_search():
+    """Test that supported queries are answered locally and correctly"""
+    print("\n🧪 Testing local search...")
+
+    try:
+        with indexed_mailbox() as (fake, _):
+            search("newer_than:1d")  # first sync
+            fake.requests.clear()
+
+            cases = {
+                "from:alice": ["a2", "a1"],
+                "from:alice@example.com subject:budget": ["a2", "a1"],
+                "subject:budget in:spam": ["s1"],
+                "has:attachment": ["a2"],
+                "is:unread from:bob": [],
+                "to:team": ["a2"],
+            }
+            for query, expected in cases.items():
+                ids, source = search(query)
+                if ids != expected or source != "local":
+                    print(f"❌ {query!r}: got {ids} from {source}, expected {expected}")
+                    return False
+            if fake.requests:
+                print(f"❌ Local searches went to Gmail: {fake.requests}")
+                return False
+
+            # Free text can match bodies, which the sync did not fetch
+            _, source = search("pizza")
+            if source != "remote":
+                print("❌ Free text answered locally before any body was indexed")
+                return False
+            for email_id in ("a1", "b1", "a2", "s1"):
+                gmail_service.read_email(ReadEmailInput(email_id=email_id))
+            fake.requests.clear()
+            for query, expected in {"budget": ["a2", "a1"], "budget in:spam": ["s1"], "pizza": ["b1"]}.items():
+                ids, source = search(query)
+                if ids != expected or source != "local":
+                    print(f"❌ {query!r} after reading the bodies: got {ids} from {source}, expected {expected}")
+                    return False
+            if fake.requests:
+                print(f"❌ Local free-text searches went to Gmail: {fake.requests}")
+                return False
+
+            ids, source = search("newer_than:1d")
+            if source != "remote":
+                print("❌ Unsupported query was not sent to Gmail")
+                return False
+
+        print(f"✅ {len(cases)} queries answered locally without requests")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing local search: {str(e)}")
+        return False
+
+
+def test_incremental_index():
+    """Test that synced mail and read bodies are indexed"""
+    print("\n🧪 Testing incremental indexing...")
+
+    try:
+        with indexed_mailbox() as (fake, _):
+            search("from:alice")
+            fake.add_message("c1", subject="Offsite agenda", sender="carol@example.com", body="Kayaking at noon")
+
+            ids, source = search("subject:agenda", max_staleness_seconds=0)
+            if ids != ["c1"] or source != "local":
+                print(f"❌ New mail not found locally: {ids} from {source}")
+                return False
+
+            # Body words beyond the snippet are only searched locally once every body is read
+            fake.add_message("c2", subject="Notes", body="x" * 120 + " flamingo")
+            search("subject:notes", max_staleness_seconds=0)
+            before, before_source = search("flamingo")
+            gmail_service.read_email(ReadEmailInput(email_id="c2"))
+            partial_source = search("flamingo")[1]
+            for email_id in ("a1", "b1", "a2", "c1"):
+                gmail_service.read_email(ReadEmailInput(email_id=email_id))
+            after, after_source = search("flamingo")
+            if before_source != "remote" or "c2" not in before or partial_source != "remote":
+                print(f"❌ Unread bodies not sent to Gmail: {before} from {before_source}, then {partial_source}")
+                return False
+            if after != ["c2"] or after_source != "local":
+                print(f"❌ Body terms not indexed on read: {after} from {after_source}")
+                return False
+
+        print("✅ Synced mail and read bodies indexed")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing incremental indexing: {str(e)}")
+        return False
+
+
+def test_reindex_old_cache():
+    """Test that a cache without postings is reindexed when opened"""
+    print("\n🧪 Testing reindex of an older cache...")
+
+    try:
+        with indexed_mailbox() as (fake, path):
+            search("from:alice")
+            conn = sqlite3.connect(path)
+            conn.execute("DELETE FROM postings")
+            conn.execute("PRAGMA user_version = 0")
+            conn.commit()
+            conn.close()
+
+            with mock.patch.object(mail_cache, "_cache", MailCache(path)):
+                ids, source = search("from:bob")
+
+        if ids != ["b1"] or source != "local":
+            print(f"❌ Reopened cache did not rebuild its index: {ids} from {source}")
+            return False
+
+        print("✅ Postings rebuilt on open")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing reindex: {str(e)}")
+        return False
+
+
+def main():
+    """Run all mail index tests"""
+    print("🚀 Starting mail index tests...\n")
+
+    tests = [
+        ("Query Parsing", test_parse_query),
+        ("Local Search", test_local_search),
+        ("Incremental Indexing", test_incremental_index),
+        ("Reindex Old Cache", test_reindex_old_cache),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        results.append((test_name, test_func()))
+
+    print("\n📊 Test Results:")
+    print("=" * 50)
+    passed = 0
+    for test_name, result in results:
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{test_name}: {status}")
+        if result:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(results)} tests passed")
+
+
+if __name__ == "__main__":
+    main()